@@ -0,0 +1,36 @@
+"""Rendering time of the pages, including middleware and templates."""
+
+import pytest
+from django.urls import reverse
+from topobank.manager.utils import subjects_to_base64
+
+#: Registered by `conftest.py`
+WORKFLOW = "topobank.testing.test"
+
+
+def get(benchmark, client, url):
+    response = benchmark(client.get, url)
+    assert response.status_code == 200
+
+
+@pytest.mark.benchmark(group="DatasetDetailView")
+def bench_dataset_detail(benchmark, owner_client, dataset):
+    get(benchmark, owner_client, reverse("ce_ui:surface-detail", kwargs={"pk": dataset.pk}))
+
+
+@pytest.mark.benchmark(group="TopographyDetailView")
+def bench_topography_detail(benchmark, owner_client, dataset):
+    topography = dataset.topography_set.order_by("pk")[len(dataset.topography_set.all()) // 2]
+    get(benchmark, owner_client, reverse("ce_ui:topography-detail", kwargs={"pk": topography.pk}))
+
+
+@pytest.mark.benchmark(group="AnalysisDetailView")
+def bench_analysis_detail(benchmark, owner_client, dataset):
+    subjects = subjects_to_base64(list(dataset.topography_set.all()))
+    url = reverse("ce_ui:results-detail", kwargs={"slug": WORKFLOW})
+    get(benchmark, owner_client, f"{url}?subjects={subjects}")
+
+
+@pytest.mark.benchmark(group="DataSetListView")
+def bench_dataset_list(benchmark, owner_client, dataset):
+    get(benchmark, owner_client, reverse("ce_ui:select"))
@@ -0,0 +1,56 @@
+"""Time spent serializing a dataset and describing a published one."""
+
+import pytest
+from topobank.manager.models import Surface
+from topobank_publication.models import Publication
+from topobank_rest_api.manager.v1.serializers import SurfaceSerializer
+from topobank_rest_api.manager.v2.serializers import SurfaceV2Serializer
+
+from ce_ui.publication_metadata import publication_metadata
+from ce_ui.views import DatasetDetailView
+
+AUTHORS = [
+    {
+        "first_name": "Ada",
+        "last_name": "Lovelace",
+        "orcid_id": "",
+        "affiliations": [{"name": "Analytical Engine", "ror_id": ""}],
+    },
+]
+
+
+@pytest.fixture
+def owner_request(rf, owner):
+    request = rf.get("/")
+    request.user = owner
+    return request
+
+
+@pytest.mark.benchmark(group="SurfaceSerializer (v1)")
+def bench_surface_serializer_v1(benchmark, owner_request, dataset):
+    def serialize():
+        surface = Surface.objects.get(pk=dataset.pk)
+        return SurfaceSerializer(surface, context={"request": owner_request}).data
+
+    benchmark(serialize)
+
+
+@pytest.mark.benchmark(group="SurfaceV2Serializer")
+def bench_surface_serializer_v2(benchmark, owner_request, dataset):
+    # With the prefetching the dataset page does, which is what it is tuned for
+    queryset = DatasetDetailView().get_queryset()
+
+    def serialize():
+        surface = queryset.get(pk=dataset.pk)
+        return SurfaceV2Serializer(surface, context={"request": owner_request}).data
+
+    benchmark(serialize)
+
+
+@pytest.mark.benchmark(group="publication_metadata")
+def bench_publication_metadata(benchmark, settings, owner, owner_request, dataset):
+    settings.PUBLICATION_DOI_MANDATORY = False
+    publication = Publication.publish(dataset, "ccby-4.0", owner, AUTHORS)
+
+    metadata = benchmark(publication_metadata, publication.surface, owner_request)
+    assert metadata
@@ -0,0 +1,52 @@
+"""
+Session overhead per request, by session engine.
+
+Times the session middleware around a view that reads the signed-in user from
+the session and, for `changed`, the select tab state into it -- with the same
+value (`changed=False`) or a new one. The session cache is local memory under
+the test settings; point `DJANGO_SESSION_CACHE_BACKEND` and
+`DJANGO_SESSION_CACHE_LOCATION` at Redis to include the round trips.
+"""
+
+from importlib import import_module
+
+import pytest
+from django.contrib.sessions.middleware import SessionMiddleware
+from django.http import HttpResponse
+
+from ce_ui.views import DEFAULT_SELECT_TAB_STATE
+
+ENGINES = [
+    "django.contrib.sessions.backends.db",
+    "django.contrib.sessions.backends.cached_db",
+    "ce_ui.sessions",
+]
+
+
+@pytest.mark.benchmark(group="sessions")
+@pytest.mark.parametrize("changed", [False, True])
+@pytest.mark.parametrize("engine", ENGINES)
+def bench_session_middleware(benchmark, rf, owner, settings, engine, changed):
+    settings.SESSION_ENGINE = engine
+    session = import_module(engine).SessionStore()
+    session["_auth_user_id"] = str(owner.pk)
+    session["select_tab_state"] = dict(DEFAULT_SELECT_TAB_STATE)
+    session.create()
+    page_sizes = iter(range(1, 1_000_000))
+
+    def view(request):
+        request.session.get("_auth_user_id")
+        state = dict(DEFAULT_SELECT_TAB_STATE)
+        if changed:
+            state["page_size"] = next(page_sizes)
+        request.session["select_tab_state"] = state
+        return HttpResponse()
+
+    middleware = SessionMiddleware(view)
+
+    def request():
+        request = rf.get("/")
+        request.COOKIES[settings.SESSION_COOKIE_NAME] = session.session_key
+        return middleware(request)
+
+    benchmark(request)
@@ -0,0 +1,25 @@
+"""Cold start of a web worker, up to its first response."""
+
+import statistics
+
+import pytest
+
+from ce_ui.startup import run
+
+
+@pytest.mark.benchmark(group="startup")
+def bench_cold_start(benchmark):
+    # Every round needs a new interpreter. The benchmark times all of it; the
+    # phases as measured by `ce_ui.startup` go into the extra info.
+    rounds = []
+
+    def start_worker():
+        # The first request must not depend on the profiler's random sampling
+        result, _ = run(env={"REQUEST_PROFILER_DEFAULT_SAMPLING_RATE": "0"})
+        rounds.append(result["phases"])
+
+    benchmark.pedantic(start_worker, rounds=5, iterations=1)
+
+    for phase in rounds[0]:
+        benchmark.extra_info[f"{phase}_duration"] = statistics.median(r[phase]["duration"] for r in rounds)
+        benchmark.extra_info[f"{phase}_rss"] = max(r[phase]["rss"] for r in rounds)
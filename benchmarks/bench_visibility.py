@@ -0,0 +1,57 @@
+"""
+`Surface.objects.for_user` from the visibility table against the permission
+joins it replaces, on many datasets.
+
+The datasets are generated once per session, `VISIBILITY_BENCHMARK_SURFACES`
+(100 000 by default) of them, and removed afterwards. The plans of both
+queries, with `EXPLAIN ANALYZE`, and their execution times are stored in the
+extra info of the benchmarks, whether `SURFACE_VISIBILITY_INDEX` is set or not.
+"""
+
+import os
+import re
+
+import pytest
+from django.core.management import call_command
+from topobank.manager.models import Surface
+
+from ce_ui import visibility
+from ce_ui.management.commands.generate_synthetic_data import \
+    SYNTHETIC_USERNAME_PREFIX
+
+NB_SURFACES = int(os.environ.get("VISIBILITY_BENCHMARK_SURFACES", 100_000))
+
+
+@pytest.fixture(scope="session")
+def many_surfaces(django_db_setup, django_db_blocker):
+    with django_db_blocker.unblock():
+        call_command("generate_synthetic_data", users=NB_SURFACES // 100, surfaces=NB_SURFACES, measurements=0,
+                     tags=0, properties=0, share_fraction=0.2, seed=0)
+        yield
+        call_command("generate_synthetic_data", users=0, surfaces=0, clear=True)
+
+
+@pytest.fixture
+def power_user(many_surfaces, db, django_user_model):
+    # Synthetic users own about a hundred datasets each and see some more
+    return django_user_model.objects.get(username=f"{SYNTHETIC_USERNAME_PREFIX}0")
+
+
+@pytest.mark.benchmark(group="for_user")
+@pytest.mark.parametrize("lookup", ["visibility table", "permission joins"])
+def bench_for_user(benchmark, power_user, lookup):
+    joined_for_user = type(Surface.objects).for_user
+    # The original, if the indexed lookup is installed
+    joined_for_user = getattr(joined_for_user, "__wrapped__", joined_for_user)
+
+    def for_user():
+        if lookup == "visibility table":
+            return visibility.for_user(Surface.objects, power_user)
+        return joined_for_user(Surface.objects, power_user)
+
+    queryset = for_user().order_by("-creation_datetime")[:10]
+    plan = queryset.explain(analyze=True)
+    benchmark.extra_info["plan"] = plan
+    execution_time = re.search(r"Execution Time: ([\d.]+) ms", plan)
+    benchmark.extra_info["execution_ms"] = float(execution_time.group(1)) if execution_time else None
+    benchmark(lambda: list(queryset.all()))
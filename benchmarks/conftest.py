@@ -0,0 +1,79 @@
+"""
+Fixtures and configuration of the benchmarks.
+
+Results are compared against the runs stored in `baselines/` (see
+`pytest_configure`), whichever directory pytest is started from. Runs are
+stored per machine, since timings from different machines cannot be compared;
+if there is no run of this machine, `--benchmark-compare` only runs the
+benchmarks and warns about it.
+"""
+
+import os
+from pathlib import Path
+
+import pytest
+from django.contrib.auth.models import Permission
+from pytest_benchmark.utils import get_machine_id, parse_compare_fail
+from topobank.analysis.registry import register_implementation
+from topobank.testing.factories import (SurfaceFactory, Topography1DFactory,
+                                        UserFactory)
+from topobank.testing.workflows import TestImplementation
+
+# The root `conftest.py` is not loaded for the benchmarks, which load their
+# fixture plugins through `pytest.ini`
+register_implementation(TestImplementation)
+
+#: Number of measurements of the synthetic datasets
+SIZES = [10, 100]
+
+BASELINES = Path(__file__).parent / "baselines"
+
+#: Slowdown of the median, in percent, beyond which a comparison fails
+DEFAULT_TOLERANCE = float(os.environ.get("BENCHMARK_TOLERANCE", 20))
+
+
+def pytest_configure(config):
+    # Called before pytest-benchmark's own `pytest_configure`, which reads these
+    if config.getoption("benchmark_storage") == "file://./.benchmarks":
+        config.option.benchmark_storage = f"file://{BASELINES}"
+    if not config.getoption("benchmark_compare"):
+        return
+    machine = BASELINES / get_machine_id()
+    if config.getoption("benchmark_storage") == f"file://{BASELINES}" and not any(machine.glob("*.json")):
+        # pytest-benchmark would only warn, and then fail on the tolerance
+        # for want of a comparison
+        config.option.benchmark_compare = False
+        config.option.benchmark_compare_fail = None
+        config.issue_config_time_warning(
+            pytest.PytestWarning(
+                f"Benchmark comparison skipped: no baseline of this machine in {machine}; "
+                "record one with --benchmark-save=baseline."
+            ),
+            stacklevel=2,
+        )
+    elif not config.getoption("benchmark_compare_fail"):
+        config.option.benchmark_compare_fail = [
+            parse_compare_fail(f"median:{DEFAULT_TOLERANCE:g}%")
+        ]
+
+
+@pytest.fixture
+def owner(db):
+    user = UserFactory(username="benchmark")
+    user.user_permissions.add(Permission.objects.get(codename="can_skip_terms"))
+    return user
+
+
+@pytest.fixture(params=SIZES)
+def dataset(request, owner):
+    """A dataset of the owner's; every benchmark using it runs for each size."""
+    surface = SurfaceFactory(created_by=owner, name="Benchmark dataset")
+    for _ in range(request.param):
+        Topography1DFactory(surface=surface)
+    return surface
+
+
+@pytest.fixture
+def owner_client(client, owner, orcid_socialapp):
+    client.force_login(owner)
+    return client
@@ -0,0 +1,109 @@
+"""
+Process-wide cache of the anonymous user.
+
+Requests of visitors who are not signed in are made on behalf of a user in
+the database, the anonymous user, so that permissions granted to it (e.g. on
+published datasets) apply to everyone. `anonymous_user_middleware` sets it
+as the user of such requests, and `TOPOBANK_ANONYMOUS_USER_GETTER` points at
+`get_anonymous_user` for code that asks for it directly. Rather than loading
+the user (and, for permission checks, its permissions) on every request, both
+are loaded once per process; every request gets its own copy.
+
+Changes of the anonymous user or of its permissions and groups invalidate
+the cache (`invalidate`, see `ce_ui.signals`): in the process that made the
+change at once, in all other processes within `CHECK_INTERVAL` seconds,
+through a version token in the shared cache.
+"""
+
+import copy
+import time
+import uuid
+from collections import namedtuple
+
+from django.core.cache import cache
+
+#: Cache key of the version of the anonymous user, shared by all processes
+VERSION_KEY = "ce_ui.anonymous_user:version"
+
+#: Cache key of the id of the anonymous user, once loaded by any process
+ID_KEY = "ce_ui.anonymous_user:id"
+
+#: Seconds a process uses its copy of the anonymous user before checking the version
+CHECK_INTERVAL = 60
+
+_Cached = namedtuple("_Cached", ["user", "version", "checked_at"])
+
+#: The anonymous user of this process, with its version and when it was checked
+_cached = None
+
+
+def _version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        version = uuid.uuid4().hex
+        if not cache.add(VERSION_KEY, version, None):
+            version = cache.get(VERSION_KEY, version)
+    return version
+
+
+def _load():
+    from topobank_orcid.users.anonymous import get_anonymous_user
+
+    user = get_anonymous_user()
+    # Resolves and caches the permissions on the instance, and so in its copies
+    user.get_all_permissions()
+    cache.set(ID_KEY, user.pk, None)
+    return user
+
+
+def _anonymous_user():
+    global _cached
+    cached = _cached
+    now = time.monotonic()
+    if cached is not None and now - cached.checked_at < CHECK_INTERVAL:
+        return cached.user
+    version = _version()
+    if cached is None or cached.version != version:
+        cached = _Cached(_load(), version, now)
+    else:
+        cached = cached._replace(checked_at=now)
+    _cached = cached
+    return cached.user
+
+
+def get_anonymous_user():
+    """The anonymous user, from the cache of the process."""
+    # Model instances copy their state, so requests do not share related objects
+    return copy.copy(_anonymous_user())
+
+
+def anonymous_user_id():
+    """Id of the anonymous user."""
+    return _anonymous_user().pk
+
+
+def is_anonymous_user_id(user_id):
+    """Whether `user_id` is that of the anonymous user, without loading it."""
+    cached = _cached
+    if cached is not None and cached.user.pk == user_id:
+        return True
+    return cache.get(ID_KEY) == user_id
+
+
+def invalidate():
+    """Reload the anonymous user, in this process now and in others shortly."""
+    global _cached
+    cache.set(VERSION_KEY, uuid.uuid4().hex, None)
+    _cached = None
+
+
+def anonymous_user_middleware(get_response):
+    """Replace Django's `AnonymousUser` by the anonymous user in the database,
+    like `topobank_orcid.users.middleware.anonymous_user_middleware`."""
+
+    def middleware(request):
+        if request.user.is_anonymous:
+            request.user = get_anonymous_user()
+        return get_response(request)
+
+    return middleware
@@ -0,0 +1,103 @@
+"""
+Prebuilt OpenAPI schema.
+
+drf-spectacular's `SpectacularAPIView` generates the schema on every request,
+introspecting the serializers of all apps, which takes seconds. The schema
+only changes on deploy, so `manage.py build_api_schema` generates it at build
+time, as YAML and JSON, into `API_SCHEMA_ROOT`. From there `collectstatic`
+picks it up below `api/`, like any other static file, and the static files
+storage fingerprints and compresses it.
+
+`api_schema_view`, at `/api/schema/`, serves the collected snapshot with an
+ETag (in the format asked for, gzipped if the client accepts it), read once
+per process. Only if there is no snapshot does it fall back to generating the
+schema with `SpectacularAPIView`.
+"""
+
+import functools
+import gzip
+import hashlib
+import logging
+from collections import namedtuple
+
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags, quote_etag
+
+from .lazy import lazy_view
+
+_log = logging.getLogger(__name__)
+
+#: Static files of the snapshot, and their media types (those of drf-spectacular)
+FORMATS = {
+    "yaml": ("api/schema.yaml", "application/vnd.oai.openapi"),
+    "json": ("api/schema.json", "application/vnd.oai.openapi+json"),
+}
+
+Snapshot = namedtuple("Snapshot", ["content", "compressed", "etag"])
+
+_fallback = lazy_view("drf_spectacular.views.SpectacularAPIView")
+
+
+def generate():
+    """Generate the schema, as YAML and JSON, by format."""
+    from drf_spectacular.renderers import (OpenApiJsonRenderer,
+                                           OpenApiYamlRenderer)
+    from drf_spectacular.settings import spectacular_settings
+
+    generator = spectacular_settings.DEFAULT_GENERATOR_CLASS()
+    schema = generator.get_schema(request=None, public=spectacular_settings.SERVE_PUBLIC)
+    return {
+        "yaml": OpenApiYamlRenderer().render(schema, renderer_context={}),
+        "json": OpenApiJsonRenderer().render(schema, renderer_context={}),
+    }
+
+
+@functools.cache
+def snapshot(format):
+    """The collected snapshot in `format`, or None if there is none."""
+    name = FORMATS[format][0]
+    try:
+        # The fingerprinted name, if the storage keeps a manifest
+        name = staticfiles_storage.stored_name(name) if hasattr(staticfiles_storage, "stored_name") else name
+        if not staticfiles_storage.exists(name):
+            return None
+        with staticfiles_storage.open(name) as f:
+            content = f.read()
+    except (ValueError, OSError):
+        # Not in the manifest, or not collected
+        return None
+    etag = hashlib.sha256(content).hexdigest()[:32]
+    return Snapshot(content, gzip.compress(content), etag)
+
+
+def _format(request):
+    format = request.GET.get("format")
+    if format in FORMATS:
+        return format
+    if "json" in request.headers.get("Accept", ""):
+        return "json"
+    return "yaml"
+
+
+def api_schema_view(request, *args, **kwargs):
+    """Serve the OpenAPI schema from the snapshot, else generate it."""
+    format = _format(request)
+    snap = snapshot(format)
+    if snap is None:
+        return _fallback(request, *args, **kwargs)
+
+    compressed = "gzip" in request.headers.get("Accept-Encoding", "")
+    # Each representation has its own tag
+    etag = quote_etag(f"{snap.etag}-gzip" if compressed else snap.etag)
+    if etag in parse_etags(request.headers.get("If-None-Match", "")):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(snap.compressed if compressed else snap.content, content_type=FORMATS[format][1])
+        if compressed:
+            response["Content-Encoding"] = "gzip"
+    response["ETag"] = etag
+    patch_cache_control(response, public=True, no_cache=True)
+    patch_vary_headers(response, ["Accept", "Accept-Encoding"])
+    return response
@@ -12,3 +12,16 @@ class CEUIAppConfig(AppConfig):
         import ce_ui.checks  # noqa: F401
         # noinspection PyUnresolvedReferences
         import ce_ui.signals  # noqa: F401
+
+        from django.conf import settings
+
+        from ce_ui.versions import tracked_versions
+
+        # Resolved once per process; with gunicorn's `preload_app` in the
+        # master, before the workers are forked
+        tracked_versions()
+
+        if getattr(settings, "SURFACE_VISIBILITY_INDEX", False):
+            from ce_ui.visibility import install
+
+            install()
@@ -1,5 +1,6 @@
 from django.urls import reverse
-from topobank.manager.models import Topography
+
+from . import measurement_order
 
 
 def prepare_context(context):
@@ -30,16 +31,7 @@ def add_surface(context, surface):
 
 
 def add_topography(context, topography):
-    next = (
-        Topography.objects.filter(surface=topography.surface, pk__gt=topography.pk)
-        .order_by("pk")
-        .first()
-    )
-    previous = (
-        Topography.objects.filter(surface=topography.surface, pk__lt=topography.pk)
-        .order_by("pk")
-        .last()
-    )
+    position = measurement_order.position(topography)
     topography_tab = {
         "title": f"{topography.name}",
         "icon": "microscope",
@@ -47,14 +39,17 @@ def add_topography(context, topography):
         "href": reverse("ce_ui:topography-detail", kwargs=dict(pk=topography.pk)),
         "active": True,
         "login_required": False,
-        "tooltip": f"Properties of measurement '{topography.name}'",
+        "tooltip": f"Properties of measurement '{topography.name}' "
+                   f"(measurement {position.index} of {position.count})",
+        "index": position.index,
+        "count": position.count,
     }
-    if next is not None:
+    if position.next_id is not None:
         topography_tab["href_next"] = reverse(
-            "ce_ui:topography-detail", kwargs=dict(pk=next.pk)
+            "ce_ui:topography-detail", kwargs=dict(pk=position.next_id)
         )
-    if previous is not None:
+    if position.previous_id is not None:
         topography_tab["href_previous"] = reverse(
-            "ce_ui:topography-detail", kwargs=dict(pk=previous.pk)
+            "ce_ui:topography-detail", kwargs=dict(pk=position.previous_id)
         )
     add_generic(context, topography_tab)
@@ -0,0 +1,15 @@
+"""
+Collaborators, i.e. users who can view at least one common dataset.
+
+A user may view the profile of a collaborator (see `UserDetailView`). The
+check is a single `EXISTS` query over the datasets visible to both users
+(`users_share_dataset`), which the visibility table of `ce_ui.visibility`
+turns into index lookups.
+"""
+
+from topobank.manager.models import Surface
+
+
+def users_share_dataset(user_a, user_b):
+    """Return True if both users can view at least one common dataset."""
+    return Surface.objects.for_user(user_a).filter(pk__in=Surface.objects.for_user(user_b).values("pk")).exists()
@@ -1,7 +1,7 @@
 from django.conf import settings
 from django.shortcuts import reverse
 
-from . import bokehjs
+from . import bokehjs, versions
 
 HOME_URL = reverse("home")
 SEARCH_URL = reverse("ce_ui:select")
@@ -16,6 +16,15 @@ def bokehjs_processor(request):
     return {"bokehjs_version": bokehjs.VERSION}
 
 
+def versions_processor(request):
+    """Adds the URL of the versions of the tracked dependencies.
+
+    The URL contains their fingerprint and is served as immutable, see
+    `ce_ui.versions`.
+    """
+    return {"versions_url": versions.url()}
+
+
 def fixed_tabs_processor(request):
     """Adds fixed tabs.
 
@@ -0,0 +1,73 @@
+"""
+Supported file formats, as listed on the file formats page.
+
+The list comes from the reader registry of SurfaceTopography, which imports
+every reader and builds the descriptions of dozens of formats. It only
+changes with SurfaceTopography, i.e. on deploy: `reader_infos` builds it once
+per process, and `render_list` renders the list of formats once per
+SurfaceTopography version, into the cache shared by all processes. The page
+around it carries the signed-in user, their CSRF token and messages, so it is
+not cached as a whole; instead `etag` identifies it by the versions, the CSRF
+secret and what the page shows of the user, so that browsers revalidate it
+without it being rendered again (see `FileFormatsView`). Pages with messages
+have no ETag, as the messages are only shown once.
+"""
+
+import functools
+import hashlib
+from importlib.metadata import PackageNotFoundError, version
+
+from django.contrib.messages import get_messages
+from django.core.cache import cache
+from django.template.loader import render_to_string
+
+from . import __version__
+
+#: Template of the list of formats, without the page around it
+LIST_TEMPLATE = "pages/file_formats_list.html"
+
+#: Seconds the rendered list is cached; it is keyed by version, so it never
+#: becomes stale
+TIMEOUT = None
+
+
+@functools.cache
+def surface_topography_version():
+    try:
+        return version("SurfaceTopography")
+    except PackageNotFoundError:
+        return "unknown"
+
+
+@functools.cache
+def reader_infos():
+    """Name, format and description of every reader, built once per process."""
+    # Imports every file reader of SurfaceTopography
+    from topobank.manager.utils import get_reader_infos
+
+    return tuple(get_reader_infos())
+
+
+def render_list():
+    """HTML of the list of formats, rendered once per version."""
+    key = f"file_formats:{__version__}:{surface_topography_version()}"
+    html = cache.get(key)
+    if html is None:
+        html = render_to_string(LIST_TEMPLATE, {"reader_infos": reader_infos()})
+        cache.set(key, html, TIMEOUT)
+    return html
+
+
+def etag(request, *args, **kwargs):
+    """Entity tag of the page for `request`, or None if it shows messages."""
+    if len(get_messages(request)):
+        return None
+    user = request.user
+    if user.is_authenticated:
+        profile = (user.pk, getattr(user, "name", ""), user.is_staff, user.last_login)
+    else:
+        profile = None
+    # Any token rendered from the same secret is valid, so the secret is enough
+    csrf_secret = request.META.get("CSRF_COOKIE")
+    token = f"{__version__}:{surface_topography_version()}:{csrf_secret}:{profile}"
+    return hashlib.sha256(token.encode()).hexdigest()[:32]
@@ -0,0 +1,233 @@
+"""
+Gunicorn configuration for contact.engineering.
+
+Use it with
+
+    gunicorn -c python:ce_ui.gunicorn_conf ce_ui.wsgi
+
+or, for the ASGI application, with `GUNICORN_WORKER_CLASS` set to
+`uvicorn.workers.UvicornWorker` and `ce_ui.asgi` as the application. Every
+option can be overridden on the command line or through the environment
+variables below.
+
+The application can be loaded once in the master (`preload_app`), with the
+workers forked from it, so that the memory holding Python modules, Django's
+app registry and the URL configuration is shared between the workers (copy on
+write) instead of being loaded by each of them. To keep the garbage collector
+from touching, and thereby copying, these objects in every worker, they are
+moved to the permanent generation (`gc.freeze`) before the first fork.
+
+Preloading is on by default for the sync and uvicorn workers, and off for the
+gevent workers (the default worker class): gevent's worker monkey-patches the
+standard library only after the fork, when the master has already imported
+ssl (through urllib3 and boto3), psycopg, redis and module-level `threading`
+locks unpatched, which leads to `RecursionError`s in ssl and to locks that
+block the whole worker. Preloading gevent workers is supported if asked for
+with `GUNICORN_PRELOAD_APP`: this configuration then calls
+`gevent.monkey.patch_all()` itself, in the master and before the application
+is imported.
+
+Anything connected in the master would be shared by the workers, too, which
+is what a socket must not be. The master closes its database connections
+before every fork, and every new worker drops the database connections,
+Redis clients, Celery producer pool and S3 (boto) clients it inherited, so
+that it opens its own when it first needs them.
+
+Workers are not recycled after a fixed number of requests
+(`GUNICORN_MAX_REQUESTS` is off by default) but when their resident memory
+exceeds `GUNICORN_MAX_WORKER_RSS` (in MiB): the worker finishes the requests
+it is serving and exits, and the master forks a new one. Sync and gevent
+workers check their memory after every request (`post_request`). uvicorn's
+worker never calls that hook, so every worker also checks it every
+`GUNICORN_RSS_CHECK_INTERVAL` seconds from a background thread, which shuts
+the worker down gracefully with SIGTERM. Note that the resident memory
+includes the pages shared with the master, so the threshold must be well
+above the master's.
+
+Workers log their lifecycle to the gunicorn error log as `key=value` pairs:
+when they are forked, when they are ready (with the time since the fork),
+when they are recycled and when they exit (with requests served, uptime and
+resident memory).
+"""
+
+import gc
+import multiprocessing
+import os
+import signal
+import threading
+import time
+
+import environ
+
+from ce_ui.startup import rss
+
+env = environ.Env()
+
+MiB = 1024 * 1024
+
+# SERVER
+# ------------------------------------------------------------------------------
+bind = env.str("GUNICORN_BIND", default="0.0.0.0:5000")
+worker_class = env.str("GUNICORN_WORKER_CLASS", default="gevent")
+workers = env.int("GUNICORN_WORKERS", default=2 * multiprocessing.cpu_count() + 1)
+worker_connections = env.int("GUNICORN_WORKER_CONNECTIONS", default=100)
+timeout = env.int("GUNICORN_TIMEOUT", default=120)
+graceful_timeout = env.int("GUNICORN_GRACEFUL_TIMEOUT", default=60)
+keepalive = env.int("GUNICORN_KEEPALIVE", default=5)
+#: Worker classes that monkey-patch the standard library with gevent
+GEVENT_WORKER_CLASSES = ["gevent", "egg:gunicorn#gevent", "gunicorn.workers.ggevent.GeventWorker"]
+preload_app = env.bool("GUNICORN_PRELOAD_APP", default=worker_class not in GEVENT_WORKER_CLASSES)
+if preload_app and worker_class in GEVENT_WORKER_CLASSES:
+    # Gunicorn reads this file before it preloads the application, and nothing
+    # imported above uses ssl or locks that would need patching
+    from gevent import monkey
+
+    monkey.patch_all()
+accesslog = env.str("GUNICORN_ACCESSLOG", default="-")
+errorlog = env.str("GUNICORN_ERRORLOG", default="-")
+loglevel = env.str("GUNICORN_LOGLEVEL", default="info")
+
+# WORKER RECYCLING
+# ------------------------------------------------------------------------------
+# Only as a backstop; recycling is by memory, see `post_request`
+max_requests = env.int("GUNICORN_MAX_REQUESTS", default=0)
+max_requests_jitter = env.int("GUNICORN_MAX_REQUESTS_JITTER", default=0)
+#: Resident memory in MiB above which a worker is recycled; 0 turns it off
+max_worker_rss = env.int("GUNICORN_MAX_WORKER_RSS", default=1024)
+#: Seconds between the checks of the resident memory in the background, see
+#: `_watch_rss`; 0 turns them off
+rss_check_interval = env.float("GUNICORN_RSS_CHECK_INTERVAL", default=30)
+
+
+def _log_event(log, event, **values):
+    log.info(" ".join([f"event={event}", *(f"{key}={value}" for key, value in values.items())]))
+
+
+def _mib(nb_bytes):
+    return "unknown" if nb_bytes is None else f"{nb_bytes / MiB:.1f}"
+
+
+def _close_database_connections():
+    from django.db import connections
+
+    connections.close_all()
+
+
+def _reset_connections():
+    """Drop connections inherited from the master without using them."""
+    from django.core.cache import caches
+    from django.core.files.storage import storages
+    from django.db import connections
+
+    # Closing would tell the database server to end the master's session;
+    # forgetting the connection is enough
+    for connection in connections.all(initialized_only=True):
+        connection.connection = None
+        connection.close_at = None
+
+    # django-redis keeps one client per server; redis-py's connection pools
+    # reset themselves in a new process
+    for cache in caches.all(initialized_only=True):
+        client = getattr(cache, "_client", None)
+        if hasattr(client, "_clients"):
+            client._clients = [None] * len(client._clients)
+
+    # Celery's producer pool, used to send tasks to the broker
+    from celery import current_app
+
+    current_app._after_fork()
+
+    # django-storages keeps boto3 resources per thread; boto3 clients must
+    # not be shared between processes
+    for storage in storages._storages.values():
+        for attribute in ("_connections", "_unsigned_connections"):
+            if hasattr(storage, attribute):
+                setattr(storage, attribute, threading.local())
+        if hasattr(storage, "_bucket"):
+            storage._bucket = None
+
+
+def when_ready(server):
+    if preload_app:
+        # Everything allocated so far is shared with the workers
+        gc.freeze()
+    _log_event(server.log, "master_ready", pid=server.pid, rss_mib=_mib(rss()), frozen_objects=gc.get_freeze_count())
+
+
+def pre_fork(server, worker):
+    if preload_app:
+        _close_database_connections()
+    # Forking happens in the master, so this is stored in the worker's copy
+    worker.forked_at = time.monotonic()
+
+
+def post_fork(server, worker):
+    if preload_app:
+        _reset_connections()
+    worker.nb_requests = 0
+    _log_event(worker.log, "worker_forked", pid=worker.pid, age=worker.age)
+
+
+def _exceeds_max_rss(worker):
+    """Whether the worker is to be recycled for its memory; logs it if so."""
+    resident = rss()
+    if resident is None or resident <= max_worker_rss * MiB:
+        return False
+    _log_event(
+        worker.log,
+        "worker_recycled",
+        pid=worker.pid,
+        rss_mib=_mib(resident),
+        max_rss_mib=max_worker_rss,
+        requests=worker.nb_requests,
+    )
+    return True
+
+
+def _watch_rss(worker):
+    """Recycle the worker once it exceeds `max_worker_rss`, for every worker class."""
+    while worker.alive:
+        time.sleep(rss_check_interval)
+        if worker.alive and _exceeds_max_rss(worker):
+            worker.alive = False
+            # uvicorn's worker does not look at `alive`; like gunicorn's own
+            # workers, it finishes the requests in flight on SIGTERM and exits
+            os.kill(os.getpid(), signal.SIGTERM)
+
+
+def post_worker_init(worker):
+    _log_event(
+        worker.log,
+        "worker_ready",
+        pid=worker.pid,
+        boot_s=f"{time.monotonic() - worker.forked_at:.3f}",
+        rss_mib=_mib(rss()),
+    )
+    if max_worker_rss and rss_check_interval > 0:
+        threading.Thread(target=_watch_rss, args=(worker,), name="rss-watch", daemon=True).start()
+
+
+def post_request(worker, req, wsgi_environ, resp):
+    worker.nb_requests += 1
+    if max_worker_rss and worker.alive and _exceeds_max_rss(worker):
+        # Finish the requests in flight, then exit; the master replaces the worker
+        worker.alive = False
+
+
+def worker_exit(server, worker):
+    _log_event(
+        worker.log,
+        "worker_exit",
+        pid=worker.pid,
+        requests=getattr(worker, "nb_requests", 0),
+        uptime_s=f"{time.monotonic() - worker.forked_at:.0f}",
+        rss_mib=_mib(rss()),
+    )
+
+
+def worker_abort(worker):
+    _log_event(worker.log, "worker_timeout", pid=worker.pid, requests=getattr(worker, "nb_requests", 0))
+
+
+def child_exit(server, worker):
+    _log_event(server.log, "worker_reaped", pid=worker.pid, workers=len(server.WORKERS))
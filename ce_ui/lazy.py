@@ -0,0 +1,73 @@
+"""
+Deferred imports of views and URL configurations.
+
+Importing the URL configuration used to import every plugin, the API schema
+generator and the notifications app, with everything they import in turn --
+numpy, SurfaceTopography and the serializers -- before a worker could answer
+its first request, including workers that never serve those routes. The
+helpers here keep the modules named in `urls.py` unimported until they are
+actually needed:
+
+* `lazy_view` imports a view the first time a request is routed to it.
+* `lazy_include` hands Django the dotted path of a URL configuration instead of
+  the module; Django imports it the first time it resolves or reverses a URL
+  below it.
+
+Django's own `include` cannot do the latter: it imports the module right away,
+to read its `app_name`, which is therefore given explicitly here.
+"""
+
+import functools
+
+from django.utils.module_loading import import_string
+
+
+def lazy_view(dotted_path, **initkwargs):
+    """
+    View that imports the view at `dotted_path` when it is first called.
+
+    Parameters
+    ----------
+    dotted_path : str
+        Dotted path of a view function or class-based view.
+    **initkwargs
+        Passed to `as_view` of a class-based view.
+
+    Returns
+    -------
+    callable
+        View function. Note that decorators of the imported view that act on
+        the function object, like `csrf_exempt`, are not visible to the
+        middleware through it.
+    """
+
+    @functools.cache
+    def get_view():
+        view = import_string(dotted_path)
+        if hasattr(view, "as_view"):
+            view = view.as_view(**initkwargs)
+        return view
+
+    def view(request, *args, **kwargs):
+        return get_view()(request, *args, **kwargs)
+
+    # The request profiler records the view name, see `ce_ui.rollups`
+    view.__name__ = view.__qualname__ = dotted_path.rsplit(".", 1)[-1]
+    return view
+
+
+def lazy_include(module, app_name, namespace=None):
+    """
+    Argument for `path` and `re_path` that includes the URL configuration
+    `module` without importing it.
+
+    Parameters
+    ----------
+    module : str
+        Dotted path of the URL configuration.
+    app_name : str
+        Application namespace, i.e. the `app_name` of the module.
+    namespace : str, optional
+        Instance namespace. (Default: `app_name`)
+    """
+    return module, app_name, namespace or app_name
@@ -0,0 +1,250 @@
+"""
+Replay a weighted mix of requests against a running instance.
+
+Sizing the gunicorn and uvicorn workers, `CONN_MAX_AGE` and the Redis pool
+needs load that looks like production traffic: a few page views, and a lot of
+the polling that every open tab does in the background. `Endpoint` describes
+one kind of request and how often it is made; `replay` sends them from a number
+of concurrent clients for a while and returns a `Report` with throughput,
+latency percentiles and error rates per endpoint.
+
+The weights either come from the defaults of the `replay_traffic` command or
+from the request profiler, see `profiled_weights`: every endpoint is weighted
+by the number of requests to its path prefix in the profiling records, each
+record counting for the requests it was sampled from (see `ce_ui.profiling`).
+Endpoints that are never profiled, like the notification poll, keep their
+share of the default mix.
+
+Only the standard library is used, so that the load generator does not need
+anything the application does not already have.
+"""
+
+import http.cookiejar
+import logging
+import random
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+
+from django.db import connection
+
+from . import profiling
+
+_log = logging.getLogger(__name__)
+
+#: Latency percentiles in the report
+PERCENTILES = [50, 95, 99]
+
+
+class Endpoint:
+    """
+    A kind of request in the traffic mix.
+
+    Parameters
+    ----------
+    name : str
+        Name in the report.
+    paths : list of str
+        Paths (with query string) of the requests; each request picks one at
+        random, e.g. the detail pages of different datasets.
+    weight : float
+        Relative frequency of the requests.
+    prefix : str, optional
+        Path prefix under which the request profiler records these requests,
+        see `profiled_weights`. (Default: the first path without query string)
+    """
+
+    def __init__(self, name, paths, weight, prefix=None):
+        self.name = name
+        self.paths = list(paths)
+        self.weight = weight
+        self.prefix = prefix if prefix is not None else self.paths[0].split("?")[0]
+
+    def __repr__(self):
+        return f"Endpoint({self.name!r}, weight={self.weight})"
+
+
+def profiled_weights(endpoints, since):
+    """
+    Weight the endpoints by their share of the profiled traffic.
+
+    Parameters
+    ----------
+    endpoints : list of Endpoint
+        Endpoints whose `weight` is replaced. Endpoints whose prefix has a
+        sampling rate of zero are never profiled; they keep the share of their
+        (default) weight among the weights of all endpoints, and the others
+        share the rest. Endpoints without profiled requests keep a tiny
+        weight, so that they are still exercised.
+    since : datetime.datetime
+        Only consider requests after this time.
+    """
+    default_total = sum(endpoint.weight for endpoint in endpoints)
+    unprofiled = [endpoint for endpoint in endpoints if profiling.sampling_rate(endpoint.prefix) <= 0]
+    profiled = [endpoint for endpoint in endpoints if endpoint not in unprofiled]
+    unprofiled_share = 0.0
+    for endpoint in unprofiled:
+        endpoint.weight = endpoint.weight / default_total if default_total > 0 else 0.0
+        unprofiled_share += endpoint.weight
+    if not profiled:
+        return
+
+    # Each record stands for 1 / sampling_rate requests; the rate of a stored
+    # record is never zero, but a division by zero would abort the query
+    sums = ", ".join(
+        "COALESCE(SUM(CASE WHEN request_uri LIKE %s THEN 1.0 / NULLIF(sampling_rate, 0) END), 0)"
+        for _ in profiled
+    )
+    params = [endpoint.prefix.replace("%", r"\%").replace("_", r"\_") + "%" for endpoint in profiled]
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT {sums} FROM request_profiler_profilingrecord WHERE start_ts >= %s",
+            params + [since],
+        )
+        counts = [float(count) for count in cursor.fetchone()]
+    total = sum(counts)
+    for endpoint, count in zip(profiled, counts):
+        share = (1 - unprofiled_share) * count / total if total > 0 else 0.0
+        endpoint.weight = max(share, 1e-3)
+
+
+def percentile(sorted_values, p):
+    """`p`-th percentile (nearest rank) of an ascending list, or None."""
+    if not sorted_values:
+        return None
+    rank = max(1, -(-p * len(sorted_values) // 100))
+    return sorted_values[int(rank) - 1]
+
+
+class Report:
+    """Latencies and errors of the requests made during a replay."""
+
+    def __init__(self):
+        self.duration = None
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, endpoint, latency, error):
+        with self._lock:
+            self.latencies[endpoint.name].append(latency)
+            if error:
+                self.errors[endpoint.name] += 1
+
+    @property
+    def count(self):
+        return sum(len(latencies) for latencies in self.latencies.values())
+
+    def rows(self):
+        """One summary per endpoint, followed by the total, as dicts."""
+        groups = sorted(self.latencies.items())
+        groups.append(("total", [latency for _, latencies in groups for latency in latencies]))
+        rows = []
+        for name, latencies in groups:
+            latencies = sorted(latencies)
+            errors = sum(self.errors.values()) if name == "total" else self.errors[name]
+            rows.append({
+                "endpoint": name,
+                "requests": len(latencies),
+                "throughput": len(latencies) / self.duration,
+                "error_rate": errors / len(latencies) if latencies else 0.0,
+                **{f"p{p}": percentile(latencies, p) for p in PERCENTILES},
+            })
+        return rows
+
+    def format(self):
+        def ms(seconds):
+            return "-" if seconds is None else f"{1000 * seconds:.0f}"
+
+        lines = [
+            f"{self.count} requests in {self.duration:.1f} s",
+            f"{'endpoint':<24} {'requests':>9} {'req/s':>8} {'errors':>7} "
+            + " ".join(f"{f'p{p} (ms)':>9}" for p in PERCENTILES),
+        ]
+        for row in self.rows():
+            lines.append(
+                f"{row['endpoint']:<24} {row['requests']:>9} {row['throughput']:>8.1f} "
+                f"{100 * row['error_rate']:>6.1f}% "
+                + " ".join(f"{ms(row[f'p{p}']):>9}" for p in PERCENTILES)
+            )
+        return "\n".join(lines)
+
+
+def _client(base_url, cookies):
+    jar = http.cookiejar.CookieJar()
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(jar))
+    if cookies:
+        opener.addheaders.append(("Cookie", "; ".join(f"{k}={v}" for k, v in cookies.items())))
+    return opener
+
+
+def _request(opener, url, timeout):
+    """Fetch `url`; return whether it failed."""
+    try:
+        with opener.open(url, timeout=timeout) as response:
+            response.read()
+            return response.status >= 400
+    except urllib.error.HTTPError as error:
+        error.read()
+        # Client errors from the mix (e.g. a thumbnail that is gone) are
+        # failures of the replay just as much as server errors
+        return True
+    except (urllib.error.URLError, OSError):
+        return True
+
+
+def replay(base_url, endpoints, clients=10, duration=60.0, cookies=None, seed=None, timeout=30.0):
+    """
+    Send requests to the endpoints from concurrent clients.
+
+    Each client sends one request after the other, picking the endpoint at
+    random according to the weights, until `duration` seconds have passed.
+
+    Parameters
+    ----------
+    base_url : str
+        Scheme, host and port of the instance, e.g. `http://localhost:8000`.
+    endpoints : list of Endpoint
+        Traffic mix.
+    clients : int, optional
+        Number of concurrent clients. (Default: 10)
+    duration : float, optional
+        Duration of the replay in seconds. (Default: 60)
+    cookies : dict, optional
+        Cookies sent with every request, e.g. the session cookie.
+    seed : int, optional
+        Seed of the random choice of requests.
+    timeout : float, optional
+        Timeout of a single request in seconds. (Default: 30)
+
+    Returns
+    -------
+    Report
+    """
+    base_url = base_url.rstrip("/")
+    weights = [endpoint.weight for endpoint in endpoints]
+    report = Report()
+    deadline = time.monotonic() + duration
+
+    def run(client_seed):
+        rng = random.Random(client_seed)
+        opener = _client(base_url, cookies)
+        while time.monotonic() < deadline:
+            endpoint = rng.choices(endpoints, weights)[0]
+            path = rng.choice(endpoint.paths)
+            url = path if "://" in path else base_url + path
+            start = time.perf_counter()
+            error = _request(opener, url, timeout)
+            report.record(endpoint, time.perf_counter() - start, error)
+
+    seeds = random.Random(seed)
+    threads = [threading.Thread(target=run, args=(seeds.random(),), daemon=True) for _ in range(clients)]
+    start = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    report.duration = time.monotonic() - start
+    return report
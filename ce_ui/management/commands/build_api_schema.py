@@ -0,0 +1,30 @@
+import logging
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from ce_ui.api_schema import FORMATS, generate
+
+_log = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = """Generates the OpenAPI schema into `API_SCHEMA_ROOT` (see `ce_ui.api_schema`). Run before
+    `collectstatic`, which collects it as a static file.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--root', default=None,
+                            help='Directory to write the schema to. (Default: `API_SCHEMA_ROOT`)')
+
+    def handle(self, *args, **options):
+        root = str(options['root'] or settings.API_SCHEMA_ROOT)
+        os.makedirs(root, exist_ok=True)
+        for format, content in generate().items():
+            # Collected below the prefix `api/`, see `STATICFILES_DIRS`
+            path = os.path.join(root, os.path.basename(FORMATS[format][0]))
+            with open(path, 'wb') as f:
+                f.write(content)
+            self.stdout.write(f"Wrote {path}.")
+        self.stdout.write(self.style.SUCCESS("Built the API schema; run `collectstatic` to publish it."))
@@ -0,0 +1,275 @@
+"""
+Generate synthetic users, datasets and measurements for load and capacity tests.
+
+The topobank factories create one row at a time, through the models' `save`
+methods and signals, which takes hours for the volumes a load test needs. This
+command creates the same rows with `bulk_create`, in batches, and fills in
+what `save` would have done -- permission sets, the creator's permission --
+itself. Everything it creates belongs to users whose names start with
+`SYNTHETIC_USERNAME_PREFIX`, so that `--clear` can remove it again.
+
+Measurements only get data files with `--netcdf`, which writes a tiny NetCDF
+file per measurement to the default storage. That is only allowed for a
+storage on the local file system, since load tests should not fill up the
+object store.
+"""
+
+import logging
+import random
+import tempfile
+from pathlib import Path
+
+import numpy as np
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, storages
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from topobank.authorization.models import PermissionSet, UserPermission
+from topobank.manager.models import Surface, Topography
+from topobank.properties.models import Property
+
+from ce_ui import visibility
+from ce_ui.utils import get_default_group
+
+_log = logging.getLogger(__name__)
+
+SYNTHETIC_USERNAME_PREFIX = "synthetic-"
+
+BATCH_SIZE = 1000
+
+CATEGORIES = ["exp", "sim", "dum"]
+INSTRUMENTS = ["AFM", "Stylus profilometer", "White-light interferometer", "TEM"]
+NUMERICAL_PROPERTIES = [("Hardness", "GPa"), ("Load", "N"), ("Roughness", "µm")]
+CATEGORICAL_PROPERTIES = [("Material", ["Steel", "Diamond", "PDMS", "Glass"]),
+                          ("Lubricant", ["none", "oil", "water"])]
+LICENSES = ["cc0-1.0", "ccby-4.0", "ccbysa-4.0"]
+
+#: Grid points per side of the generated NetCDF files
+NETCDF_GRID_SIZE = 32
+
+
+class Command(BaseCommand):
+    help = """Generates synthetic users, datasets, measurements and publications in bulk,
+    for benchmarks and load tests. Never run this on a production database.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--seed', type=int, default=0,
+                            help='Seed of the random number generator, so that runs are reproducible.')
+        parser.add_argument('--users', type=int, default=10,
+                            help='Number of users owning the datasets.')
+        parser.add_argument('--surfaces', type=int, default=100,
+                            help='Number of datasets (surfaces).')
+        parser.add_argument('--measurements', type=int, default=10,
+                            help='Mean number of measurements (topographies) per dataset.')
+        parser.add_argument('--tags', type=int, default=20,
+                            help='Number of distinct tags; each dataset gets up to three of them.')
+        parser.add_argument('--properties', type=int, default=3,
+                            help='Number of properties per dataset.')
+        parser.add_argument('--share-fraction', type=float, default=0.2,
+                            help='Fraction of datasets shared with another synthetic user.')
+        parser.add_argument('--publications', type=int, default=0,
+                            help='Number of datasets to publish.')
+        parser.add_argument('--collections', type=int, default=0,
+                            help='Number of collections the published datasets are grouped into.')
+        parser.add_argument('--netcdf', action='store_true',
+                            help='Attach a tiny NetCDF file to every measurement (local storage only).')
+        parser.add_argument('--clear', action='store_true',
+                            help='Delete all synthetic data before generating new data.')
+
+    def handle(self, *args, **options):
+        if options['netcdf'] and not isinstance(storages["default"], FileSystemStorage):
+            raise CommandError("--netcdf writes to the default storage, which is not on the local file system.")
+        if options['collections'] > options['publications']:
+            raise CommandError("Every collection needs at least one published dataset.")
+
+        rng = random.Random(options['seed'])
+        np.random.seed(options['seed'])
+
+        if options['clear']:
+            self.clear()
+
+        start = timezone.now()
+        with transaction.atomic():
+            users = self.create_users(options['users'])
+            surfaces = self.create_surfaces(rng, users, options['surfaces'], options['share_fraction'])
+            self.tag_surfaces(rng, surfaces, options['tags'])
+            self.create_properties(rng, surfaces, options['properties'])
+            topographies = self.create_topographies(rng, surfaces, options['measurements'])
+            # Bulk creation sends no signals
+            visibility.refresh(permission_set_ids=[surface.permissions_id for surface in surfaces],
+                               user_ids=[user.pk for user in users])
+        if options['netcdf']:
+            self.attach_netcdf_files(topographies)
+        publications = self.publish(rng, surfaces, options['publications'])
+        self.create_collections(rng, publications, options['collections'])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {len(users)} users, {len(surfaces)} datasets, {len(topographies)} measurements and "
+            f"{len(publications)} publications in {(timezone.now() - start).total_seconds():.0f} s."))
+
+    def clear(self):
+        User = get_user_model()
+        users = User.objects.filter(username__startswith=SYNTHETIC_USERNAME_PREFIX)
+        surfaces = Surface.objects.filter(created_by__in=users)
+        _log.info("Deleting synthetic data..")
+        with transaction.atomic():
+            permission_set_ids = list(surfaces.values_list("permissions_id", flat=True))
+            Topography.objects.filter(surface__in=surfaces).delete()
+            surfaces.delete()
+            PermissionSet.objects.filter(pk__in=permission_set_ids).delete()
+            users.delete()
+
+    def create_users(self, nb_users):
+        User = get_user_model()
+        existing = User.objects.filter(username__startswith=SYNTHETIC_USERNAME_PREFIX).count()
+        users = []
+        for i in range(existing, existing + nb_users):
+            user = User(username=f"{SYNTHETIC_USERNAME_PREFIX}{i}", name=f"Synthetic User {i}",
+                        email=f"{SYNTHETIC_USERNAME_PREFIX}{i}@example.org")
+            user.set_unusable_password()
+            users.append(user)
+        users = User.objects.bulk_create(users, batch_size=BATCH_SIZE)
+        # What `ensure_default_group` does for regular users
+        group = get_default_group()
+        User.groups.through.objects.bulk_create(
+            [User.groups.through(user_id=user.id, group_id=group.id) for user in users], batch_size=BATCH_SIZE)
+        return users
+
+    def create_surfaces(self, rng, users, nb_surfaces, share_fraction):
+        # `Surface.save` creates a permission set and grants the creator full
+        # access; bulk creation skips it, so do the same here
+        permission_sets = PermissionSet.objects.bulk_create(
+            [PermissionSet() for _ in range(nb_surfaces)], batch_size=BATCH_SIZE)
+        now = timezone.now()
+        surfaces = []
+        user_permissions = []
+        for i, permissions in enumerate(permission_sets):
+            owner = rng.choice(users)
+            surfaces.append(Surface(
+                name=f"Synthetic dataset {i}",
+                description=f"Synthetic dataset {i} for load tests.",
+                category=rng.choice(CATEGORIES),
+                created_by=owner,
+                updated_by=owner,
+                permissions=permissions,
+                creation_datetime=now,
+                modification_datetime=now,
+            ))
+            user_permissions.append(UserPermission(parent=permissions, user=owner, allow="full"))
+            if len(users) > 1 and rng.random() < share_fraction:
+                collaborator = rng.choice([user for user in users if user != owner])
+                user_permissions.append(
+                    UserPermission(parent=permissions, user=collaborator, allow=rng.choice(["view", "edit"])))
+        UserPermission.objects.bulk_create(user_permissions, batch_size=BATCH_SIZE)
+        return Surface.objects.bulk_create(surfaces, batch_size=BATCH_SIZE)
+
+    def tag_surfaces(self, rng, surfaces, nb_tags):
+        if nb_tags == 0:
+            return
+        tag_model = Surface.tags.tag_model
+        tags = [tag_model.objects.get_or_create(name=f"synthetic/tag-{i}")[0] for i in range(nb_tags)]
+        # The through model of a tagulous field has one foreign key to either side
+        through = Surface.tags.through
+        surface_field = next(f.name for f in through._meta.get_fields()
+                             if f.is_relation and f.related_model is Surface)
+        tag_field = next(f.name for f in through._meta.get_fields()
+                         if f.is_relation and f.related_model is tag_model)
+        rows = []
+        counts = {tag.pk: 0 for tag in tags}
+        for surface in surfaces:
+            for tag in rng.sample(tags, rng.randint(0, min(3, nb_tags))):
+                rows.append(through(**{f"{surface_field}_id": surface.pk, f"{tag_field}_id": tag.pk}))
+                counts[tag.pk] += 1
+        through.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+        # Tagulous keeps the usage count of each tag, which bulk creation bypasses
+        for pk, count in counts.items():
+            tag_model.objects.filter(pk=pk).update(count=count)
+
+    def create_properties(self, rng, surfaces, nb_properties):
+        properties = []
+        for surface in surfaces:
+            for i in range(nb_properties):
+                if i % 2 == 0:
+                    name, unit = NUMERICAL_PROPERTIES[(i // 2) % len(NUMERICAL_PROPERTIES)]
+                    properties.append(Property(surface=surface, name=name, value=rng.uniform(0.1, 100), unit=unit))
+                else:
+                    name, values = CATEGORICAL_PROPERTIES[(i // 2) % len(CATEGORICAL_PROPERTIES)]
+                    properties.append(Property(surface=surface, name=name, value=rng.choice(values)))
+        Property.objects.bulk_create(properties, batch_size=BATCH_SIZE)
+
+    def create_topographies(self, rng, surfaces, mean_nb_measurements):
+        topographies = []
+        for surface in surfaces:
+            # Most datasets are small, a few are very large
+            nb_measurements = max(1, round(rng.expovariate(1 / mean_nb_measurements))) \
+                if mean_nb_measurements > 0 else 0
+            for j in range(nb_measurements):
+                size = rng.choice([1, 5, 10, 50, 100])
+                topographies.append(Topography(
+                    surface=surface,
+                    name=f"Measurement {j} of {surface.name}",
+                    description="Synthetic measurement.",
+                    created_by=surface.created_by,
+                    updated_by=surface.created_by,
+                    # Measurements share the permissions of their dataset
+                    permissions=surface.permissions,
+                    measurement_date=surface.creation_datetime.date(),
+                    instrument_name=rng.choice(INSTRUMENTS),
+                    size_x=size,
+                    size_y=size,
+                    resolution_x=NETCDF_GRID_SIZE,
+                    resolution_y=NETCDF_GRID_SIZE,
+                    unit="µm",
+                ))
+        return Topography.objects.bulk_create(topographies, batch_size=BATCH_SIZE)
+
+    def attach_netcdf_files(self, topographies):
+        from SurfaceTopography import Topography as STTopography
+        from topobank.files.models import Manifest
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            filename = Path(tmpdir) / "synthetic.nc"
+            for topography in topographies:
+                heights = np.random.standard_normal((NETCDF_GRID_SIZE, NETCDF_GRID_SIZE))
+                STTopography(heights, (topography.size_x, topography.size_y), unit=topography.unit).to_netcdf(
+                    filename)
+                manifest = Manifest.objects.create(permissions=topography.permissions, filename="synthetic.nc",
+                                                   kind="raw")
+                manifest.file.save(f"synthetic/{topography.pk}.nc", ContentFile(filename.read_bytes()))
+                topography.datafile = manifest
+                topography.datafile_format = "nc"
+        Topography.objects.bulk_update(topographies, ["datafile", "datafile_format"], batch_size=BATCH_SIZE)
+
+    def publish(self, rng, surfaces, nb_publications):
+        if nb_publications == 0:
+            return []
+        # Publishing copies the dataset and its files, which is not worth
+        # reimplementing in bulk for the few publications a test needs
+        from topobank_publication.models import Publication
+
+        publications = []
+        for surface in rng.sample(surfaces, min(nb_publications, len(surfaces))):
+            owner = surface.created_by
+            authors = [{"first_name": "Synthetic", "last_name": owner.name.split()[-1], "orcid_id": "",
+                        "affiliations": [{"name": "Synthetic Institute", "ror_id": ""}]}]
+            publications.append(Publication.publish(surface, rng.choice(LICENSES), owner, authors))
+        return publications
+
+    def create_collections(self, rng, publications, nb_collections):
+        if nb_collections == 0:
+            return
+        from topobank_publication.models import PublicationCollection
+
+        publications = list(publications)
+        rng.shuffle(publications)
+        for i in range(nb_collections):
+            members = publications[i::nb_collections]
+            collection = PublicationCollection.objects.create(
+                title=f"Synthetic collection {i}",
+                description="Synthetic collection for load tests.",
+                publisher=members[0].publisher,
+            )
+            collection.publications.set(members)
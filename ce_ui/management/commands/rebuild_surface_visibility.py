@@ -0,0 +1,17 @@
+import logging
+
+from django.core.management.base import BaseCommand
+
+from ce_ui.visibility import rebuild
+
+_log = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = """Rebuilds the materialized visibility of all datasets from their permissions (see `ce_ui.visibility`),
+    e.g. after permissions were changed in bulk.
+    """
+
+    def handle(self, *args, **options):
+        nb_rows = rebuild()
+        self.stdout.write(self.style.SUCCESS(f"Rebuilt visibility of datasets: {nb_rows} rows."))
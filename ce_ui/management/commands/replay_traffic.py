@@ -0,0 +1,114 @@
+import datetime
+import logging
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.utils import timezone
+from topobank.analysis.models import WorkflowResult
+from topobank.manager.models import Surface, Topography
+from topobank.manager.utils import subjects_to_base64
+
+from ce_ui.loadtest import Endpoint, profiled_weights, replay
+
+_log = logging.getLogger(__name__)
+
+#: Workflow whose analysis card is requested
+DEFAULT_WORKFLOW = "topobank_statistics.power_spectral_density"
+
+#: Analyses per task-state poll, as batched by the analysis cards
+TASK_POLL_BATCH_SIZE = 10
+
+
+class Command(BaseCommand):
+    help = """Replays a weighted mix of requests against a running instance from concurrent clients,
+    and reports throughput, latency percentiles and error rates. Requests are made as the given user,
+    who must have accepted the terms and conditions, on the datasets that user can see.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('user', type=str,
+                            help='Username of the user the requests are made as.')
+        parser.add_argument('--base-url', type=str, default='http://localhost:8000',
+                            help='URL of the instance under load.')
+        parser.add_argument('--clients', type=int, default=10,
+                            help='Number of concurrent clients.')
+        parser.add_argument('--duration', type=float, default=60,
+                            help='Duration of the replay in seconds.')
+        parser.add_argument('--datasets', type=int, default=50,
+                            help='Number of the user\'s datasets the requests are spread over.')
+        parser.add_argument('--workflow', type=str, default=DEFAULT_WORKFLOW,
+                            help='Workflow whose analysis card is requested.')
+        parser.add_argument('--profile-days', type=int, default=None,
+                            help='Weight the requests like the profiled requests of this many past days, '
+                                 'instead of using the default mix.')
+        parser.add_argument('--seed', type=int, default=None,
+                            help='Seed of the random choice of requests.')
+
+    def handle(self, *args, **options):
+        try:
+            user = get_user_model().objects.get(username=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f"There is no user '{options['user']}'.")
+
+        endpoints = self.endpoints(user, options['datasets'], options['workflow'])
+        if options['profile_days'] is not None:
+            profiled_weights(endpoints, timezone.now() - datetime.timedelta(days=options['profile_days']))
+        for endpoint in endpoints:
+            self.stdout.write(f"{endpoint.name}: weight {endpoint.weight:g}, {len(endpoint.paths)} paths")
+
+        self.stdout.write(f"Replaying for {options['duration']:g} s with {options['clients']} clients..")
+        report = replay(
+            options['base_url'],
+            endpoints,
+            clients=options['clients'],
+            duration=options['duration'],
+            cookies=self.session_cookies(user),
+            seed=options['seed'],
+        )
+        self.stdout.write(report.format())
+
+    def session_cookies(self, user):
+        # A session in the instance's session store, as if the user had signed
+        # in; ORCID sign-in cannot be scripted
+        client = Client()
+        client.force_login(user)
+        return {settings.SESSION_COOKIE_NAME: client.cookies[settings.SESSION_COOKIE_NAME].value}
+
+    def endpoints(self, user, nb_datasets, workflow):
+        """The default traffic mix, roughly that of a day on contact.engineering."""
+        surfaces = list(Surface.objects.for_user(user).order_by('-pk')[:nb_datasets])
+        if not surfaces:
+            raise CommandError(f"User '{user.username}' cannot see any datasets.")
+        thumbnails = [
+            topography.thumbnail.file.url
+            for topography in Topography.objects.filter(surface__in=surfaces, thumbnail__isnull=False)
+            .select_related('thumbnail')[:10 * nb_datasets]
+        ]
+        # Polling analyses the user cannot see would only measure permission errors
+        analysis_ids = list(
+            WorkflowResult.objects.for_user(user).order_by('-pk').values_list('pk', flat=True)[:100]
+        )
+
+        endpoints = [
+            Endpoint('dataset list', ['/ui/dataset-list/'], 5),
+            Endpoint('dataset detail', [f'/ui/dataset-detail/{s.pk}/' for s in surfaces], 10,
+                     prefix='/ui/dataset-detail/'),
+            Endpoint('analysis card',
+                     [f'/analysis/api/card/series/{workflow}?subjects={subjects_to_base64([s])}' for s in surfaces],
+                     10, prefix='/analysis/api/card/'),
+            # Every open tab polls for notifications
+            Endpoint('notification poll', ['/inbox/notifications/api/unread_list/'], 40),
+        ]
+        if thumbnails:
+            # Presigned URLs point at the object store, not the instance; the
+            # prefix is what the instance served them under, if it did
+            endpoints.append(Endpoint('thumbnail', thumbnails, 20, prefix='/media/'))
+        if analysis_ids:
+            batches = [analysis_ids[i:i + TASK_POLL_BATCH_SIZE]
+                       for i in range(0, len(analysis_ids), TASK_POLL_BATCH_SIZE)]
+            endpoints.append(Endpoint('task-state poll',
+                                      [f'/analysis/v2/results/?ids={",".join(map(str, ids))}' for ids in batches],
+                                      20, prefix='/analysis/v2/results/'))
+        return endpoints
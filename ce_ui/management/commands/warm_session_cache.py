@@ -0,0 +1,48 @@
+import logging
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from ce_ui.sessions import SessionStore
+
+_log = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = """Copies the unexpired sessions in the database to the session cache, so that the switch
+    to the `ce_ui.sessions` engine does not send the first request of every signed-in user to the database.
+    Sessions that are in the cache already are left alone.
+    """
+
+    def add_arguments(self, parser):
+        parser.add_argument('--delete', action='store_true',
+                            help='Delete the copied sessions from the database.')
+        parser.add_argument('--batch-size', type=int, default=1000,
+                            help='Number of sessions read from the database at a time.')
+
+    def handle(self, *args, **options):
+        if settings.SESSION_ENGINE != 'ce_ui.sessions':
+            raise CommandError(f"SESSION_ENGINE is '{settings.SESSION_ENGINE}', not 'ce_ui.sessions'.")
+
+        store = SessionStore()
+        nb_copied = nb_present = 0
+        copied_keys = []
+        sessions = Session.objects.filter(expire_date__gt=timezone.now())
+        for session in sessions.iterator(chunk_size=options['batch_size']):
+            # Sessions in the cache may have changed since the switch
+            if store.copy_to_cache(session, overwrite=False):
+                nb_copied += 1
+            else:
+                nb_present += 1
+            copied_keys.append(session.session_key)
+
+        if options['delete']:
+            for i in range(0, len(copied_keys), options['batch_size']):
+                Session.objects.filter(session_key__in=copied_keys[i:i + options['batch_size']]).delete()
+
+        _log.info(f"Copied {nb_copied} sessions to the cache, {nb_present} were there already.")
+        self.stdout.write(self.style.SUCCESS(
+            f"Copied {nb_copied} sessions to the cache ({nb_present} were there already)"
+            + (f", deleted {len(copied_keys)} from the database." if options['delete'] else ".")))
@@ -0,0 +1,98 @@
+"""
+Order of the measurements within a dataset.
+
+The measurement detail page links to the previous and next measurement of
+the dataset (see `breadcrumb.add_topography`) and shows where the measurement
+is within it. Rather than asking the database for the neighbours on every
+page view, the ids of all measurements of a dataset are loaded with one query,
+in the order the dataset page lists them (the default ordering of
+`Topography`, ties broken by id), and cached. Neighbours and position are then
+dictionary lookups.
+
+The cached order of a dataset is invalidated when measurements are added to
+or deleted from it, or when a field it is ordered by changes (see
+`ce_ui.signals`). Bulk operations send no signals; call `invalidate` after
+those. A measurement missing from a stale order reloads it.
+"""
+
+from collections import namedtuple
+
+from django.core.cache import cache
+from topobank.manager.models import Topography
+
+#: Seconds the order of a dataset is cached
+TIMEOUT = 24 * 3600
+
+#: Ids of the measurements of a dataset in order, and the position of each id
+MeasurementOrder = namedtuple("MeasurementOrder", ["ids", "positions"])
+
+#: Position of a measurement within its dataset, with its neighbours (or None)
+Position = namedtuple("Position", ["index", "count", "previous_id", "next_id"])
+
+
+def ordering():
+    """Fields the measurements of a dataset are ordered by."""
+    fields = list(Topography._meta.ordering)
+    if "pk" not in fields and "id" not in fields:
+        fields.append("pk")
+    return fields
+
+
+def ordering_fields():
+    """Names of the model fields in `ordering`, which reorder when changed."""
+    return {field.lstrip("-") for field in ordering()} - {"pk", "id"}
+
+
+def _cache_key(surface_id):
+    return f"measurement_order:{surface_id}"
+
+
+def invalidate(surface_id):
+    """Drop the cached order of a dataset."""
+    cache.delete(_cache_key(surface_id))
+
+
+def _load(surface_id):
+    ids = tuple(Topography.objects.filter(surface_id=surface_id).order_by(*ordering()).values_list("pk", flat=True))
+    order = MeasurementOrder(ids, {pk: index for index, pk in enumerate(ids)})
+    cache.set(_cache_key(surface_id), order, TIMEOUT)
+    return order
+
+
+def measurement_order(surface_id):
+    """Ordered ids of the measurements of a dataset, from the cache if possible."""
+    order = cache.get(_cache_key(surface_id))
+    if order is None:
+        order = _load(surface_id)
+    return order
+
+
+def position(topography):
+    """
+    Position of a measurement within its dataset.
+
+    Parameters
+    ----------
+    topography : topobank.manager.models.Topography
+        The measurement.
+
+    Returns
+    -------
+    Position
+        One-based index of the measurement, number of measurements in the
+        dataset and ids of the previous and next measurement (None at either
+        end).
+    """
+    order = measurement_order(topography.surface_id)
+    index = order.positions.get(topography.pk)
+    if index is None:
+        # Added since the order was cached, without a signal
+        order = _load(topography.surface_id)
+        index = order.positions[topography.pk]
+    ids = order.ids
+    return Position(
+        index + 1,
+        len(ids),
+        ids[index - 1] if index > 0 else None,
+        ids[index + 1] if index + 1 < len(ids) else None,
+    )
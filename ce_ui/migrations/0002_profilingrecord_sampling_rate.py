@@ -0,0 +1,32 @@
+from django.db import migrations
+
+# The probability with which a profiling record was kept, see `ce_ui.profiling`.
+# Like the index in 0001, this is a database-only addition to a table owned by
+# `request_profiler`: its model does not know the column, so its INSERTs leave
+# it at the default and `ce_ui.profiling.store_sampling_rate` fills it in for
+# records that were sampled. Records written before sampling was introduced were
+# all kept, so the default of 1 describes them correctly.
+#
+# Since Postgres 11, adding a column with a constant default only touches the
+# catalog and does not rewrite the (large) table.
+ADD_COLUMN = """
+ALTER TABLE request_profiler_profilingrecord
+ADD COLUMN IF NOT EXISTS sampling_rate double precision NOT NULL DEFAULT 1.0;
+"""
+
+DROP_COLUMN = """
+ALTER TABLE request_profiler_profilingrecord
+DROP COLUMN IF EXISTS sampling_rate;
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("ce_ui", "0001_profilingrecord_start_ts_date_idx"),
+        ("request_profiler", "0005_alter_profilingrecord_id_alter_ruleset_id"),
+    ]
+
+    operations = [
+        # No state_operations, for the same reason as in 0001
+        migrations.RunSQL(sql=ADD_COLUMN, reverse_sql=DROP_COLUMN),
+    ]
@@ -0,0 +1,151 @@
+import datetime
+
+from django.conf import settings
+from django.db import migrations, transaction
+
+from ce_ui import partitioning
+
+# Converts `request_profiler_profilingrecord` into a table partitioned by day on
+# `start_ts`, see `ce_ui.partitioning`. As with 0001 and 0002 the table belongs
+# to `request_profiler`, so this only touches the database and leaves Django's
+# migration state alone.
+#
+# A table cannot be partitioned in place. The old one is renamed, the
+# partitioned one takes over its name -- both in one short transaction, after
+# which the profiler writes into the new table -- and the records within the
+# retention window are copied over afterwards. Records older than that would be
+# deleted by the next retention run anyway and are not copied.
+#
+# The primary key of a partitioned table has to contain the partition key, so
+# it becomes (id, start_ts). Nothing references the table, and `id` stays unique
+# in practice since it is drawn from an identity sequence.
+TABLE = partitioning.TABLE
+OLD_TABLE = f"{TABLE}_unpartitioned"
+
+# Columns as left by request_profiler's migration 0005 and our 0002
+COLUMNS = (
+    "id, session_key, start_ts, end_ts, duration, http_method, request_uri, "
+    "remote_addr, http_user_agent, view_func_name, response_status_code, "
+    "response_content_length, user_id, http_referer, query_string, query_count, "
+    "sampling_rate"
+)
+
+# From 0001; the partitioned table does not need it, but the plain one that the
+# backwards migration restores is expected to have it
+START_TS_DATE_INDEX = "request_profiler_profilingrecord_start_ts_date_idx"
+
+
+def _copy_foreign_keys(cursor, source, target):
+    """Recreate the foreign keys of `source` on `target`."""
+    cursor.execute(
+        "SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = to_regclass(%s) AND contype = 'f'",
+        [source],
+    )
+    for name, definition in cursor.fetchall():
+        cursor.execute(f'ALTER TABLE {target} ADD CONSTRAINT "{name}" {definition}')
+
+
+def _swap_in(cursor, source, partitioned):
+    """Rename `TABLE` to `source` and create its replacement under `TABLE`."""
+    cursor.execute(f"ALTER TABLE {TABLE} RENAME TO {source}")
+    # Index names are unique per schema, so the renamed table's primary key
+    # must make way for that of the new one
+    cursor.execute(
+        f"ALTER TABLE {source} RENAME CONSTRAINT {TABLE}_pkey TO {source}_pkey"
+    )
+    cursor.execute(
+        f"CREATE TABLE {TABLE} (LIKE {source})"
+        + (" PARTITION BY RANGE (start_ts)" if partitioned else "")
+    )
+    cursor.execute(
+        f"ALTER TABLE {TABLE} ALTER COLUMN id ADD GENERATED BY DEFAULT AS IDENTITY"
+    )
+    cursor.execute(
+        f"ALTER TABLE {TABLE} ALTER COLUMN sampling_rate SET DEFAULT 1.0"
+    )
+    cursor.execute(
+        f"ALTER TABLE {TABLE} ADD PRIMARY KEY "
+        + ("(id, start_ts)" if partitioned else "(id)")
+    )
+    # Left unnamed, so Postgres picks a name that does not clash with the index
+    # of the table being replaced
+    cursor.execute(f"CREATE INDEX ON {TABLE} (user_id)")
+    _copy_foreign_keys(cursor, source, TABLE)
+    # Continue the numbering of the old table
+    cursor.execute(
+        f"SELECT setval(pg_get_serial_sequence('{TABLE}', 'id'), "
+        f"(SELECT coalesce(max(id), 0) + 1 FROM {source}), false)"
+    )
+
+
+def partition(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+
+    today = partitioning.today()
+    first_day = today - datetime.timedelta(
+        days=settings.REQUEST_PROFILER_LOG_TRUNCATION_DAYS
+    )
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        if not partitioning.is_partitioned(cursor):
+            _swap_in(cursor, OLD_TABLE, partitioned=True)
+            cursor.execute(
+                f"CREATE TABLE {partitioning.DEFAULT_PARTITION} "
+                f"PARTITION OF {TABLE} DEFAULT"
+            )
+    # The retention window, so the copied records have somewhere to go, and
+    # the days ahead
+    partitioning.create_partitions(first_day, today)
+    partitioning.maintain_partitions(today)
+
+    # Outside of the transaction, so that profiled requests are not held up
+    # while the records are copied. Rerunnable if interrupted.
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT to_regclass(%s)", [OLD_TABLE])
+        if cursor.fetchone()[0] is not None:
+            cursor.execute(
+                f"INSERT INTO {TABLE} ({COLUMNS}) "
+                f"SELECT {COLUMNS} FROM {OLD_TABLE} WHERE start_ts >= %s "
+                "ON CONFLICT DO NOTHING",
+                [partitioning._midnight(first_day)],
+            )
+            cursor.execute(f"DROP TABLE {OLD_TABLE}")
+
+
+def unpartition(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != "postgresql":
+        return
+
+    partitioned_table = f"{TABLE}_partitioned"
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        if not partitioning.is_partitioned(cursor):
+            return
+        _swap_in(cursor, partitioned_table, partitioned=False)
+        # Before copying: the copied rows leave deferred foreign key checks
+        # pending, and no index can be created while they are
+        cursor.execute(
+            f"CREATE INDEX {START_TS_DATE_INDEX} ON {TABLE} "
+            f"(((start_ts AT TIME ZONE '{settings.TIME_ZONE}')::date))"
+        )
+        cursor.execute(
+            f"INSERT INTO {TABLE} ({COLUMNS}) SELECT {COLUMNS} FROM {partitioned_table}"
+        )
+        # Drops the partitions along with it
+        cursor.execute(f"DROP TABLE {partitioned_table}")
+
+
+class Migration(migrations.Migration):
+    # The migration manages its own transactions, see above
+    atomic = False
+
+    dependencies = [
+        ("ce_ui", "0002_profilingrecord_sampling_rate"),
+        ("request_profiler", "0005_alter_profilingrecord_id_alter_ruleset_id"),
+    ]
+
+    operations = [
+        migrations.RunPython(partition, reverse_code=unpartition),
+    ]
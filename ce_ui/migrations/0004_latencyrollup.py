@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 02:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ce_ui', '0003_partition_profilingrecord'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LatencyRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hour', models.DateTimeField()),
+                ('route', models.CharField(max_length=100)),
+                ('method', models.CharField(max_length=10)),
+                ('num_records', models.PositiveIntegerField()),
+                ('count', models.FloatField()),
+                ('error_count', models.FloatField()),
+                ('p50', models.FloatField(null=True)),
+                ('p95', models.FloatField(null=True)),
+                ('p99', models.FloatField(null=True)),
+                ('sketch', models.JSONField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('hour', 'route', 'method'), name='unique_latency_rollup')],
+            },
+        ),
+    ]
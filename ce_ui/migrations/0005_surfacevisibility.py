@@ -0,0 +1,32 @@
+# Generated by Django 5.2.18 on 2026-10-19 09:12
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ce_ui', '0004_latencyrollup'),
+        ('manager', '__first__'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SurfaceVisibility',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('level', models.PositiveSmallIntegerField()),
+                ('surface', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+',
+                                              to='manager.surface')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+',
+                                           to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['user', 'level', 'surface'], name='surface_visibility_lookup_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'surface'), name='unique_surface_visibility')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-19 16:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ce_ui', '0006_selection'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='selection',
+            name='last_used_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
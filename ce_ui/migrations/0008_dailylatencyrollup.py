@@ -0,0 +1,29 @@
+# Generated by Django 5.2.18 on 2026-10-19 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ce_ui', '0007_selection_last_used_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyLatencyRollup',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('route', models.CharField(blank=True, max_length=100)),
+                ('method', models.CharField(blank=True, max_length=10)),
+                ('num_records', models.PositiveIntegerField()),
+                ('count', models.FloatField()),
+                ('error_count', models.FloatField()),
+                ('sketch', models.JSONField()),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'route', 'method'), name='unique_daily_latency_rollup')],
+            },
+        ),
+    ]
@@ -0,0 +1,121 @@
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+
+class LatencyRollup(models.Model):
+    """
+    Latency of one route over one hour, aggregated from profiling records.
+
+    Profiling records are only kept for `REQUEST_PROFILER_LOG_TRUNCATION_DAYS`
+    and are sampled (see `ce_ui.profiling`); these rollups are kept for much
+    longer and count every record for the requests it stands for. See
+    `ce_ui.rollups`.
+    """
+
+    #: Start of the hour, in UTC
+    hour = models.DateTimeField()
+    #: Name of the view that served the requests, which is what
+    #: `request_profiler` records instead of the URL pattern
+    route = models.CharField(max_length=100)
+    method = models.CharField(max_length=10)
+
+    #: Number of profiling records aggregated
+    num_records = models.PositiveIntegerField()
+    #: Estimated number of requests, i.e. records weighted by their inverse
+    #: sampling rate
+    count = models.FloatField()
+    #: Estimated number of requests that failed with a server error
+    error_count = models.FloatField()
+
+    #: Percentiles of the duration in seconds, read off the sketch
+    p50 = models.FloatField(null=True)
+    p95 = models.FloatField(null=True)
+    p99 = models.FloatField(null=True)
+
+    #: `ce_ui.sketch.DDSketch` of the durations, for percentiles across hours
+    #: and routes
+    sketch = models.JSONField()
+
+    class Meta:
+        constraints = [
+            # Also serves the range queries on `hour`
+            models.UniqueConstraint(
+                fields=["hour", "route", "method"], name="unique_latency_rollup"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.method} {self.route} at {self.hour}"
+
+
+class DailyLatencyRollup(models.Model):
+    """
+    Latency of one route over one day, merged from its `LatencyRollup`s, so
+    that the dashboard reads one row per route and day for long periods. The
+    rollup with an empty route and method stands for all routes together.
+    See `ce_ui.rollups`.
+    """
+
+    #: Day, in UTC
+    day = models.DateField()
+    route = models.CharField(max_length=100, blank=True)
+    method = models.CharField(max_length=10, blank=True)
+
+    num_records = models.PositiveIntegerField()
+    count = models.FloatField()
+    error_count = models.FloatField()
+    sketch = models.JSONField()
+
+    class Meta:
+        constraints = [
+            # Also serves the range queries on `day`
+            models.UniqueConstraint(
+                fields=["day", "route", "method"], name="unique_daily_latency_rollup"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.method or 'all'} {self.route or 'routes'} on {self.day}"
+
+
+class SurfaceVisibility(models.Model):
+    """
+    Highest level of access of a user to a dataset, materialized from the
+    permissions for `Surface.objects.for_user`. See `ce_ui.visibility`.
+    """
+
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    surface = models.ForeignKey("manager.Surface", on_delete=models.CASCADE, related_name="+")
+    #: Rank of the level of access: 1 for view, 2 for edit, 3 for full access
+    level = models.PositiveSmallIntegerField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["user", "surface"], name="unique_surface_visibility")
+        ]
+        indexes = [
+            # Answers `for_user` from the index alone
+            models.Index(fields=["user", "level", "surface"], name="surface_visibility_lookup_idx"),
+        ]
+
+    def __str__(self):
+        return f"User {self.user_id} has level {self.level} on dataset {self.surface_id}"
+
+
+class Selection(models.Model):
+    """
+    Subjects of an analysis, saved to be addressed by a short handle instead
+    of the whole list of subjects in URLs. See `ce_ui.selections`.
+    """
+
+    #: Hash of the subjects, so the same selection always has the same handle
+    handle = models.CharField(max_length=16, unique=True)
+    #: Lists of ids by kind of subject, in canonical order
+    subjects = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    #: Updated at most daily; unused selections are deleted, see `ce_ui.selections.delete_unused`
+    last_used_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f"Selection {self.handle}"
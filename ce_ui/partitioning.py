@@ -0,0 +1,198 @@
+"""
+Daily range partitions for the request profiler's table.
+
+Retention used to be a daily `DELETE` over `request_profiler_profilingrecord`, a
+table of around a gigabyte in production: it needed an expression index to find
+the rows at all (migration 0001), and every run left a day's worth of dead rows
+for vacuum to clean up. Migration 0003 turns the table into one partitioned by
+range on `start_ts`, one partition per day in `settings.TIME_ZONE`, so that
+retention drops whole partitions. Dropping a table is a catalog operation and
+costs the same whatever the number of rows in it.
+
+Partitions are created ahead of time by the same beat task that drops expired
+ones (`ce_ui.tasks.maintain_request_profiler_partitions`). A default partition
+catches rows for which no partition exists, so that a profiled request never
+fails because beat fell behind; its rows are moved into the proper partition
+once that is created.
+"""
+
+import datetime
+import logging
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+
+_log = logging.getLogger(__name__)
+
+TABLE = "request_profiler_profilingrecord"
+DEFAULT_PARTITION = f"{TABLE}_default"
+
+_PARTITION_NAME_REGEX = re.compile(rf"^{TABLE}_p(\d{{8}})$")
+
+
+def partition_name(day):
+    """Name of the partition holding the records started on `day`."""
+    return f"{TABLE}_p{day:%Y%m%d}"
+
+
+def _midnight(day):
+    """Start of `day` in the current time zone, as an ISO 8601 literal."""
+    start = datetime.datetime.combine(day, datetime.time())
+    return timezone.make_aware(start).isoformat()
+
+
+def today():
+    """The current date in `settings.TIME_ZONE`."""
+    return timezone.localdate()
+
+
+def is_partitioned(cursor):
+    """Return True if the profiler's table is partitioned."""
+    if connection.vendor != "postgresql":
+        return False
+    cursor.execute(
+        "SELECT EXISTS (SELECT 1 FROM pg_partitioned_table "
+        "WHERE partrelid = to_regclass(%s))",
+        [TABLE],
+    )
+    return cursor.fetchone()[0]
+
+
+def existing_partitions(cursor):
+    """
+    Return the days for which a partition exists.
+
+    Returns
+    -------
+    dict
+        Maps each day to the name of its partition. The default partition is
+        not included.
+    """
+    cursor.execute(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = to_regclass(%s)",
+        [TABLE],
+    )
+    partitions = {}
+    for (name,) in cursor.fetchall():
+        match = _PARTITION_NAME_REGEX.match(name)
+        if match is not None:
+            day = datetime.datetime.strptime(match.group(1), "%Y%m%d").date()
+            partitions[day] = name
+    return partitions
+
+
+def create_partition(cursor, day):
+    """
+    Create the partition for `day`.
+
+    The partition is created standalone and then attached, with the rows that
+    ended up in the default partition for lack of it moved over in between.
+    Attaching a partition has to check that the default partition holds no rows
+    for its range, which is quick because there are none left, and normally
+    none to begin with.
+
+    Must be called inside a transaction.
+    """
+    name = partition_name(day)
+    start = _midnight(day)
+    end = _midnight(day + datetime.timedelta(days=1))
+    cursor.execute(f"CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS)")
+    cursor.execute(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} "
+        "WHERE start_ts >= %s AND start_ts < %s RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved",
+        [start, end],
+    )
+    if cursor.rowcount:
+        _log.warning(
+            "Moved %d profiling records from the default partition to %s.",
+            cursor.rowcount,
+            name,
+        )
+    cursor.execute(
+        f"ALTER TABLE {TABLE} ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{start}') TO ('{end}')"
+    )
+
+
+def create_partitions(first_day, last_day):
+    """
+    Create the partitions for all days from `first_day` to `last_day`.
+
+    Days that already have a partition are skipped.
+
+    Returns
+    -------
+    list of str
+        Names of the partitions created.
+    """
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        existing = existing_partitions(cursor)
+        day = first_day
+        while day <= last_day:
+            if day not in existing:
+                create_partition(cursor, day)
+                created.append(partition_name(day))
+            day += datetime.timedelta(days=1)
+    return created
+
+
+def drop_partitions(before_day):
+    """
+    Drop the partitions of all days before `before_day`.
+
+    Returns
+    -------
+    list of str
+        Names of the partitions dropped.
+    """
+    dropped = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for day, name in sorted(existing_partitions(cursor).items()):
+            if day < before_day:
+                cursor.execute(f"DROP TABLE {name}")
+                dropped.append(name)
+        # Rows only land here while their partition is missing; once it is
+        # past retention, it will never be created to take them over.
+        cursor.execute(
+            f"DELETE FROM {DEFAULT_PARTITION} WHERE start_ts < %s",
+            [_midnight(before_day)],
+        )
+    return dropped
+
+
+def maintain_partitions(day=None):
+    """
+    Create upcoming partitions and drop expired ones.
+
+    Keeps the partitions from `REQUEST_PROFILER_LOG_TRUNCATION_DAYS` days
+    before `day` onwards, which is what the `truncate_request_profiler_logs`
+    command of `request_profiler` retains, and creates partitions for
+    `REQUEST_PROFILER_PARTITIONS_AHEAD` days after it.
+
+    Parameters
+    ----------
+    day : datetime.date, optional
+        The day to count from. (Default: today)
+
+    Returns
+    -------
+    tuple of list of str
+        Names of the partitions created and dropped.
+    """
+    if day is None:
+        day = today()
+    ahead = datetime.timedelta(days=settings.REQUEST_PROFILER_PARTITIONS_AHEAD)
+    created = create_partitions(day, day + ahead)
+    dropped = []
+    if settings.REQUEST_PROFILER_LOG_TRUNCATION_DAYS > 0:
+        retention = datetime.timedelta(
+            days=settings.REQUEST_PROFILER_LOG_TRUNCATION_DAYS
+        )
+        dropped = drop_partitions(day - retention)
+    return created, dropped
@@ -0,0 +1,176 @@
+"""
+Request-scoped memo of permission levels.
+
+Every `has_permission` check on a dataset or measurement ends in
+`PermissionSet.get_for_user`, which queries the user permissions (and the
+organization permissions) of the permission set. The views check the object
+they show, and the serializers check it again, and every related object, for
+the same user. `PermissionMemoMiddleware` keeps the level of every
+(user, permission set) pair asked for during a request, so that each pair is
+queried once per request, and `prime` resolves the levels for many objects at
+once: from the permissions prefetched with `permissions__user_permissions__user`
+if they are, else with one query for all of them.
+
+The memo lives only as long as the request; changes of the permissions during
+the request evict the permission set concerned (see `ce_ui.signals`). Outside
+of a request, e.g. in Celery tasks, `get_for_user` queries as before.
+"""
+
+import contextvars
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+from topobank.authorization.models import (PERMISSION_CHOICES, PermissionSet,
+                                           UserPermission)
+
+_log = logging.getLogger(__name__)
+
+#: Permission levels, from lowest to highest
+LEVELS = [level for level, _ in PERMISSION_CHOICES]
+
+#: Memo of the current request, if any
+_current = contextvars.ContextVar("permission_memo", default=None)
+
+_installed = False
+
+
+def _rank(level):
+    return LEVELS.index(level)
+
+
+class PermissionMemo:
+    """Permission levels of the (user, permission set) pairs seen so far."""
+
+    def __init__(self):
+        #: Level (or None) by user id and permission set id
+        self._levels = {}
+        self._anonymous_user_id = None
+
+    def __contains__(self, key):
+        return key in self._levels
+
+    def __getitem__(self, key):
+        return self._levels[key]
+
+    @property
+    def anonymous_user_id(self):
+        # What is granted to the anonymous user is granted to everyone
+        if self._anonymous_user_id is None:
+            self._anonymous_user_id = import_string(settings.TOPOBANK_ANONYMOUS_USER_GETTER)().pk
+        return self._anonymous_user_id
+
+    def forget(self, permission_set_id):
+        """Evict a permission set, for all users."""
+        for key in [key for key in self._levels if key[1] == permission_set_id]:
+            del self._levels[key]
+
+    def prime(self, user, objects):
+        """
+        Resolve the levels of `user` for many objects at once.
+
+        Parameters
+        ----------
+        user : topobank.users.models.User
+            The user.
+        objects : iterable
+            Permission sets, or objects with a `permissions` foreign key to one,
+            like datasets and measurements. Permission sets whose user
+            permissions are prefetched are resolved without querying them.
+        """
+        user_ids = {user.pk, self.anonymous_user_id}
+        granted = defaultdict(list)
+        missing = set()
+        queried = set()
+        for obj in objects:
+            permission_set_id, permission_set = _permission_set(obj)
+            if permission_set_id is None or (user.pk, permission_set_id) in self._levels:
+                continue
+            missing.add(permission_set_id)
+            prefetched = getattr(permission_set, "_prefetched_objects_cache", {})
+            if "user_permissions" in prefetched:
+                for permission in prefetched["user_permissions"]:
+                    if permission.user_id in user_ids:
+                        granted[permission_set_id].append(permission.allow)
+            else:
+                queried.add(permission_set_id)
+        if not missing:
+            return
+
+        if queried:
+            granted_to_users = UserPermission.objects.filter(parent_id__in=queried, user_id__in=user_ids)
+            for permission_set_id, allow in granted_to_users.values_list("parent_id", "allow"):
+                granted[permission_set_id].append(allow)
+        if hasattr(PermissionSet, "organization_permissions"):
+            # Organization permissions are never prefetched by the views
+            OrganizationPermission = PermissionSet.organization_permissions.rel.related_model
+            granted_to_organizations = OrganizationPermission.objects.filter(
+                parent_id__in=missing, organization__group__in=user.groups.all()
+            )
+            for permission_set_id, allow in granted_to_organizations.values_list("parent_id", "allow"):
+                granted[permission_set_id].append(allow)
+
+        for permission_set_id in missing:
+            self._levels[user.pk, permission_set_id] = max(granted[permission_set_id], key=_rank, default=None)
+
+
+def _permission_set(obj):
+    """Id of the permission set of `obj`, and the permission set if loaded."""
+    if isinstance(obj, PermissionSet):
+        return obj.pk, obj
+    permission_set_id = obj.permissions_id
+    if type(obj).permissions.is_cached(obj):
+        return permission_set_id, obj.permissions
+    return permission_set_id, None
+
+
+def prime(user, objects):
+    """Resolve the permission levels for `objects` now, if in a request."""
+    memo = _current.get()
+    if memo is not None and user is not None:
+        memo.prime(user, objects)
+
+
+def forget(permission_set_id):
+    """Evict a permission set from the memo, if in a request."""
+    memo = _current.get()
+    if memo is not None:
+        memo.forget(permission_set_id)
+
+
+def _memoized(get_for_user):
+    def wrapper(self, user):
+        memo = _current.get()
+        if memo is None or self.pk is None or user is None or user.pk is None:
+            return get_for_user(self, user)
+        if (user.pk, self.pk) not in memo:
+            memo.prime(user, [self])
+        return memo[user.pk, self.pk]
+
+    wrapper.__wrapped__ = get_for_user
+    return wrapper
+
+
+def install():
+    """Answer `PermissionSet.get_for_user` from the memo; idempotent."""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    PermissionSet.get_for_user = _memoized(PermissionSet.get_for_user)
+
+
+class PermissionMemoMiddleware:
+    """Memoize the permission levels looked up while handling a request."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        install()
+
+    def __call__(self, request):
+        token = _current.set(PermissionMemo())
+        try:
+            return self.get_response(request)
+        finally:
+            _current.reset(token)
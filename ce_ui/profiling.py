@@ -0,0 +1,117 @@
+"""
+Sampling for the request profiler.
+
+`request_profiler` records every request that its rules match, which on this
+instance is every request: the profiling table grew to a gigabyte of rows
+nobody looks at individually. What the records are used for is the latency
+distribution per route, and a few percent of the traffic describes that just as
+well -- provided each record knows how likely it was to be kept, so that counts
+and percentiles can be reweighted.
+
+The decision is made when the response is ready, because that is when
+`request_profiler` consults `REQUEST_PROFILER_GLOBAL_EXCLUDE_FUNC` (see
+`settings/base.py`, which delegates to `should_profile` below). At that point the
+duration is known, so slow requests are always kept regardless of the sampling
+rate of their route. A route with a rate of zero -- health checks, the
+notification poll -- is never recorded, not even when it is slow.
+
+The sampling rate is stored in the `sampling_rate` column, which migration 0002
+adds to the profiler's table. It defaults to 1, so only records that were kept
+with a smaller probability need writing, see `store_sampling_rate`.
+"""
+
+import logging
+import random
+
+from django.conf import settings
+from django.db import connection
+
+_log = logging.getLogger(__name__)
+
+#: Column added to `request_profiler_profilingrecord` by migration 0002.
+SAMPLING_RATE_COLUMN = "sampling_rate"
+
+
+def sampling_rate(path):
+    """
+    Return the probability with which a request to `path` is profiled.
+
+    Parameters
+    ----------
+    path : str
+        Path of the request.
+
+    Returns
+    -------
+    float
+        Rate of the longest prefix in `REQUEST_PROFILER_SAMPLING_RATES` that
+        `path` starts with, or `REQUEST_PROFILER_DEFAULT_SAMPLING_RATE` if
+        there is none.
+    """
+    rates = getattr(settings, "REQUEST_PROFILER_SAMPLING_RATES", {})
+    matches = [prefix for prefix in rates if path.startswith(prefix)]
+    if not matches:
+        return getattr(settings, "REQUEST_PROFILER_DEFAULT_SAMPLING_RATE", 1.0)
+    return rates[max(matches, key=len)]
+
+
+def should_profile(request):
+    """
+    Decide whether the profiling record of `request` is kept.
+
+    Called by `request_profiler` once the response has been generated. The
+    rate the record was kept with is attached to the running profiler, from
+    where `store_sampling_rate` picks it up once the record is saved.
+
+    Parameters
+    ----------
+    request : HttpRequest
+        The request, carrying its running profiler as `request.profiler`.
+
+    Returns
+    -------
+    bool
+        True if the record should be saved.
+    """
+    rate = sampling_rate(request.path)
+    if rate <= 0:
+        return False
+
+    profiler = getattr(request, "profiler", None)
+    threshold = getattr(settings, "REQUEST_PROFILER_SLOW_REQUEST_THRESHOLD", None)
+    if (
+        profiler is not None
+        and threshold is not None
+        and profiler.is_running
+        and profiler.elapsed >= threshold
+    ):
+        # Every slow request is kept, so it is kept with certainty
+        rate = 1.0
+    elif rate < 1 and random.random() >= rate:
+        return False
+
+    if profiler is not None:
+        profiler.sampling_rate = rate
+    return True
+
+
+def store_sampling_rate(record):
+    """
+    Write the sampling rate of a freshly saved profiling record.
+
+    `ProfilingRecord` belongs to `request_profiler` and does not know the
+    column, so its INSERT leaves it at the default of 1. Records kept with a
+    smaller probability are updated here; at sampling rates of a few percent
+    that is one extra statement for a few percent of the traffic.
+    """
+    rate = getattr(record, "sampling_rate", 1.0)
+    if rate == 1.0:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"UPDATE request_profiler_profilingrecord SET {SAMPLING_RATE_COLUMN} = %s "
+            # The table is partitioned on start_ts, see `ce_ui.partitioning`;
+            # naming it confines the update to the partition holding the record
+            "WHERE id = %s AND start_ts = %s",
+            [rate, record.pk, record.start_ts],
+        )
@@ -0,0 +1,302 @@
+"""
+Hourly latency rollups from the request profiler.
+
+Profiling records answer questions about individual requests, but they are
+sampled (see `ce_ui.profiling`) and deleted after
+`REQUEST_PROFILER_LOG_TRUNCATION_DAYS`. What staff want to know over longer
+periods -- how fast is a route, and is it getting slower -- is condensed here
+into one `LatencyRollup` per route, method and hour, which is kept for
+`REQUEST_PROFILER_ROLLUP_RETENTION_DAYS`.
+
+Each record counts for `1 / sampling_rate` requests, so counts are estimates of
+the actual traffic and percentiles are not skewed by slow requests, which are
+always profiled while the others are sampled.
+
+The hourly rollups of each day are merged into a `DailyLatencyRollup` per
+route and method, and one for all routes together, whenever hours of that day
+are rolled up. Summaries over more than a few days read those, so that the
+staff dashboard reads a row per day rather than per hour, and the sketches of
+the busiest routes only (`latency_summary`).
+"""
+
+import datetime
+import logging
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Max, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyLatencyRollup, LatencyRollup
+from .sketch import DDSketch
+
+_log = logging.getLogger(__name__)
+
+ONE_HOUR = datetime.timedelta(hours=1)
+ONE_DAY = datetime.timedelta(days=1)
+
+#: Route and method of the daily rollups of all routes together
+ALL_ROUTES = ("", "")
+
+#: Percentiles stored with each rollup
+PERCENTILES = {"p50": 0.5, "p95": 0.95, "p99": 0.99}
+
+# `sampling_rate` is not known to the `ProfilingRecord` model, see
+# `ce_ui.profiling`, so the records are read without the ORM
+_RECORDS_SQL = """
+SELECT view_func_name, http_method, duration, response_status_code, sampling_rate
+FROM request_profiler_profilingrecord
+WHERE start_ts >= %s AND start_ts < %s
+"""
+
+_HOURS_SQL = """
+SELECT DISTINCT date_trunc('hour', start_ts, 'UTC')
+FROM request_profiler_profilingrecord
+WHERE start_ts >= %s AND start_ts < %s
+ORDER BY 1
+"""
+
+
+def _start_of_hour(dt):
+    return dt.astimezone(datetime.timezone.utc).replace(
+        minute=0, second=0, microsecond=0
+    )
+
+
+class _Aggregate:
+    """Running aggregate of the records of one route and method."""
+
+    def __init__(self):
+        self.num_records = 0
+        self.error_count = 0.0
+        self.sketch = DDSketch()
+
+    def add(self, duration, status_code, sampling_rate):
+        weight = 1 / sampling_rate
+        self.num_records += 1
+        if status_code >= 500:
+            self.error_count += weight
+        self.sketch.add(duration, weight)
+
+
+def rollup_hour(hour):
+    """
+    Aggregate the profiling records of the hour starting at `hour`.
+
+    Replaces the rollups of that hour, so an hour can be rolled up again.
+
+    Returns
+    -------
+    list of LatencyRollup
+        The rollups created, one per route and method that had requests.
+    """
+    hour = _start_of_hour(hour)
+    aggregates = defaultdict(_Aggregate)
+    with connection.cursor() as cursor:
+        cursor.execute(_RECORDS_SQL, [hour, hour + ONE_HOUR])
+        while rows := cursor.fetchmany(10000):
+            for route, method, duration, status_code, sampling_rate in rows:
+                aggregates[route, method].add(duration, status_code, sampling_rate)
+
+    rollups = []
+    for (route, method), aggregate in aggregates.items():
+        sketch = aggregate.sketch
+        rollups.append(
+            LatencyRollup(
+                hour=hour,
+                route=route,
+                method=method,
+                num_records=aggregate.num_records,
+                count=sketch.count,
+                error_count=aggregate.error_count,
+                sketch=sketch.to_dict(),
+                **{name: sketch.quantile(q) for name, q in PERCENTILES.items()},
+            )
+        )
+    with transaction.atomic():
+        LatencyRollup.objects.filter(hour=hour).delete()
+        LatencyRollup.objects.bulk_create(rollups)
+    return rollups
+
+
+def rollup_day(day):
+    """
+    Merge the hourly rollups of `day`, a date in UTC, into daily ones.
+
+    Replaces the daily rollups of that day, so a day can be rolled up again
+    as more of its hours are.
+
+    Returns
+    -------
+    list of DailyLatencyRollup
+        The rollups created, one per route and method and one for all routes.
+    """
+    start = datetime.datetime.combine(day, datetime.time(), tzinfo=datetime.timezone.utc)
+    aggregates = defaultdict(lambda: [DDSketch(), 0, 0.0])
+    rollups = LatencyRollup.objects.filter(hour__gte=start, hour__lt=start + ONE_DAY).values_list(
+        "route", "method", "num_records", "error_count", "sketch"
+    )
+    for route, method, num_records, error_count, sketch in rollups.iterator():
+        sketch = DDSketch.from_dict(sketch)
+        for key in ((route, method), ALL_ROUTES):
+            aggregate = aggregates[key]
+            aggregate[0].merge(sketch)
+            aggregate[1] += num_records
+            aggregate[2] += error_count
+
+    daily = [
+        DailyLatencyRollup(
+            day=day,
+            route=route,
+            method=method,
+            num_records=num_records,
+            count=sketch.count,
+            error_count=error_count,
+            sketch=sketch.to_dict(),
+        )
+        for (route, method), (sketch, num_records, error_count) in aggregates.items()
+    ]
+    with transaction.atomic():
+        DailyLatencyRollup.objects.filter(day=day).delete()
+        DailyLatencyRollup.objects.bulk_create(daily)
+    return daily
+
+
+def _days_without_daily_rollups():
+    days = LatencyRollup.objects.annotate(day=TruncDate("hour", tzinfo=datetime.timezone.utc))
+    return set(days.values_list("day", flat=True).distinct()) - set(
+        DailyLatencyRollup.objects.values_list("day", flat=True).distinct()
+    )
+
+
+def rollup_pending_hours(now=None):
+    """
+    Roll up every complete hour with requests since the last one rolled up,
+    and then the days of these hours (and any day that has hourly rollups but
+    no daily ones, e.g. from before there were daily rollups).
+
+    Hours whose records have already been deleted are not attempted, which
+    bounds the work of the first run and of runs after an outage. Hours
+    without records have nothing to roll up and are skipped, so an idle
+    instance does not scan the same empty hours again on every run.
+
+    Returns
+    -------
+    int
+        Number of hours rolled up.
+    """
+    if now is None:
+        now = timezone.now()
+    end = _start_of_hour(now)
+    start = end - datetime.timedelta(days=settings.REQUEST_PROFILER_LOG_TRUNCATION_DAYS)
+    last = LatencyRollup.objects.aggregate(last=Max("hour"))["last"]
+    if last is not None:
+        start = max(start, last + ONE_HOUR)
+    with connection.cursor() as cursor:
+        cursor.execute(_HOURS_SQL, [start, end])
+        hours = [hour for hour, in cursor.fetchall()]
+    for hour in hours:
+        rollup_hour(hour)
+    days = {_start_of_hour(hour).date() for hour in hours} | _days_without_daily_rollups()
+    for day in sorted(days):
+        rollup_day(day)
+    return len(hours)
+
+
+def delete_expired_rollups(now=None):
+    """Delete the rollups older than `REQUEST_PROFILER_ROLLUP_RETENTION_DAYS`."""
+    if now is None:
+        now = timezone.now()
+    cutoff = now - datetime.timedelta(days=settings.REQUEST_PROFILER_ROLLUP_RETENTION_DAYS)
+    deleted, _ = LatencyRollup.objects.filter(hour__lt=cutoff).delete()
+    # Days that are partly expired go with their last hour
+    deleted_days, _ = DailyLatencyRollup.objects.filter(day__lt=_start_of_hour(cutoff).date()).delete()
+    return deleted + deleted_days
+
+
+def _summary(sketch, error_count, **kwargs):
+    return {
+        **kwargs,
+        "count": sketch.count,
+        "error_count": error_count,
+        **{name: sketch.quantile(q) for name, q in PERCENTILES.items()},
+    }
+
+
+def latency_summary(since, route=None, method=None, bucket=ONE_HOUR, max_routes=None):
+    """
+    Latencies since `since`, per route and over time.
+
+    Parameters
+    ----------
+    since : datetime.datetime
+        Start of the period.
+    route, method : str, optional
+        Restrict the time series to this route and method. (Default: all
+        routes taken together)
+    bucket : datetime.timedelta, optional
+        Resolution of the time series; must be a whole number of hours, or of
+        days, in which case the daily rollups are read and the period starts
+        at the beginning of the day of `since`. (Default: one hour)
+    max_routes : int, optional
+        Summarize this many of the busiest routes only. (Default: all)
+
+    Returns
+    -------
+    dict
+        `routes` lists the percentiles, count and error count of each route
+        and method over the whole period, busiest first; `series` lists the
+        same for each bucket of the period.
+    """
+    epoch = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+    if bucket >= ONE_DAY:
+        rollups = DailyLatencyRollup.objects.filter(day__gte=_start_of_hour(since).date())
+        per_route = rollups.exclude(route=ALL_ROUTES[0], method=ALL_ROUTES[1])
+        all_routes = rollups.filter(route=ALL_ROUTES[0], method=ALL_ROUTES[1])
+        time_field = "day"
+    else:
+        rollups = per_route = all_routes = LatencyRollup.objects.filter(hour__gte=since)
+        time_field = "hour"
+
+    # Counted by the database, so that only the sketches of the routes shown
+    # are read
+    busiest = per_route.values("route", "method").annotate(total=Sum("count")).order_by("-total")
+    if max_routes is not None:
+        busiest = busiest[:max_routes]
+    selected = Q(pk__in=[])
+    for key in busiest:
+        selected |= Q(route=key["route"], method=key["method"])
+    routes = defaultdict(lambda: [DDSketch(), 0.0])
+    for rollup_route, rollup_method, error_count, sketch in (
+        per_route.filter(selected).values_list("route", "method", "error_count", "sketch").iterator()
+    ):
+        totals = routes[rollup_route, rollup_method]
+        totals[0].merge(DDSketch.from_dict(sketch))
+        totals[1] += error_count
+
+    series = defaultdict(lambda: [DDSketch(), 0.0])
+    series_rollups = all_routes if route is None else per_route.filter(route=route, method=method)
+    for period, error_count, sketch in series_rollups.values_list(time_field, "error_count", "sketch").iterator():
+        if time_field == "day":
+            period = datetime.datetime.combine(period, datetime.time(), tzinfo=datetime.timezone.utc)
+        start = epoch + (period - epoch) // bucket * bucket
+        totals = series[start]
+        totals[0].merge(DDSketch.from_dict(sketch))
+        totals[1] += error_count
+
+    return {
+        "routes": sorted(
+            (
+                _summary(sketch, error_count, route=r, method=m)
+                for (r, m), (sketch, error_count) in routes.items()
+            ),
+            key=lambda summary: summary["count"],
+            reverse=True,
+        ),
+        "series": [
+            _summary(sketch, error_count, start=start.isoformat())
+            for start, (sketch, error_count) in sorted(series.items())
+        ],
+    }
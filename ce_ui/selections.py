@@ -0,0 +1,209 @@
+"""
+Saved selections of analysis subjects.
+
+The analysis pages and card APIs receive their subjects as the `subjects`
+parameter, a base64-encoded dictionary of ids (see `ce_ui.subjects`), which
+grows with the selection: a few hundred measurements make URLs kilobytes long,
+beyond what some proxies accept, and every request decodes and
+permission-checks the whole list again. Instead, a selection can be saved
+(`save`, or `POST /ui/api/selection/` from the frontend) and addressed by a
+short handle, the `selection` parameter. The handle is a hash of the
+subjects, so saving the same selection twice yields the same handle and the
+URLs of a selection can be cached.
+
+The subjects of a handle are cached (they never change), and so are the
+subjects each user may view, under the `ce_ui.visibility.generation` so that
+permission changes take effect. `SelectionMiddleware` expands the `selection`
+parameter into the `subjects` parameter for views that only know the latter,
+like the card APIs of topobank; the `subjects` parameter keeps working.
+
+Anyone, signed in or not, may save selections, as anyone may open analyses of
+public datasets. Saving is throttled per user, and per address for anonymous
+visitors (`SelectionRateThrottle`, `SELECTION_THROTTLE_RATE`), and selections
+that have not been used for `SELECTION_RETENTION_DAYS` are deleted by a beat
+task (`delete_unused`), so that the table cannot grow without bounds.
+"""
+
+import base64
+import datetime
+import hashlib
+import json
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+from rest_framework.throttling import SimpleRateThrottle
+
+from . import subjects as _subjects
+from . import anonymous, visibility
+from .models import Selection
+
+_log = logging.getLogger(__name__)
+
+#: Characters of the hash in a handle
+HANDLE_LENGTH = 12
+
+#: Largest number of subjects a selection may have
+MAX_SUBJECTS = 10_000
+
+#: Seconds the subjects of a selection, and those visible to a user, are cached
+TIMEOUT = 3600
+
+#: How often the last use of a selection is recorded
+TOUCH_INTERVAL = datetime.timedelta(days=1)
+
+
+def canonical(subjects):
+    """Subjects in canonical order, without duplicates or empty kinds."""
+    return {
+        kind: sorted(set(ids)) if kind in _subjects.MODELS else ids
+        for kind, ids in sorted(subjects.items())
+        if ids
+    }
+
+
+def handle_for(subjects):
+    """Handle of a (canonical) selection: a prefix of the hash of its subjects."""
+    digest = hashlib.sha256(json.dumps(subjects, sort_keys=True, separators=(",", ":")).encode()).digest()
+    return base64.urlsafe_b64encode(digest).decode()[:HANDLE_LENGTH]
+
+
+def _subjects_key(handle):
+    return f"selection:{handle}"
+
+
+def save(subjects):
+    """
+    Save a selection; returns its handle.
+
+    Parameters
+    ----------
+    subjects : dict
+        Lists of ids by kind of subject, e.g. `{"surface": [3, 5]}`.
+
+    Raises
+    ------
+    ValueError
+        If `subjects` is not a dictionary of lists of ids, or too large.
+    """
+    subjects = canonical(_subjects.validate(subjects))
+    if sum(len(ids) for ids in subjects.values()) > MAX_SUBJECTS:
+        raise ValueError(f"Selections are limited to {MAX_SUBJECTS} subjects.")
+    handle = handle_for(subjects)
+    selection, created = Selection.objects.get_or_create(handle=handle, defaults={"subjects": subjects})
+    if not created:
+        _touch(selection)
+    cache.set(_subjects_key(handle), subjects, TIMEOUT)
+    return handle
+
+
+def load(handle):
+    """Subjects of a saved selection; raises `Selection.DoesNotExist` for unknown handles."""
+    subjects = cache.get(_subjects_key(handle))
+    if subjects is None:
+        selection = Selection.objects.get(handle=handle)
+        _touch(selection)
+        subjects = selection.subjects
+        cache.set(_subjects_key(handle), subjects, TIMEOUT)
+    return subjects
+
+
+def _touch(selection):
+    # Selections are read from the database at least once per `TIMEOUT` while
+    # they are used, so this keeps them from being deleted
+    now = timezone.now()
+    if selection.last_used_at < now - TOUCH_INTERVAL:
+        Selection.objects.filter(pk=selection.pk).update(last_used_at=now)
+
+
+def retention_days():
+    """Days after their last use that selections are deleted."""
+    return getattr(settings, "SELECTION_RETENTION_DAYS", 90)
+
+
+def delete_unused():
+    """Delete selections not used for `retention_days`; returns how many were deleted."""
+    unused = Selection.objects.filter(last_used_at__lt=timezone.now() - datetime.timedelta(days=retention_days()))
+    handles = list(unused.values_list("handle", flat=True))
+    num_deleted, _ = unused.delete()
+    cache.delete_many([_subjects_key(handle) for handle in handles])
+    _log.info(f"Deleted {num_deleted} unused selection(s).")
+    return num_deleted
+
+
+class SelectionRateThrottle(SimpleRateThrottle):
+    """
+    Limit the rate at which selections are saved, to `SELECTION_THROTTLE_RATE`
+    (e.g. "100/hour") per user, or per address for anonymous visitors, who all
+    share the anonymous user of django-guardian.
+    """
+
+    scope = "selection"
+
+    def get_rate(self):
+        return getattr(settings, "SELECTION_THROTTLE_RATE", "100/hour")
+
+    def get_cache_key(self, request, view):
+        user = request.user
+        ident = self.get_ident(request) if user.is_anonymous or anonymous.is_anonymous_user_id(user.pk) else user.pk
+        return self.cache_format % {"scope": self.scope, "ident": ident}
+
+
+def resolve(handle, user):
+    """
+    Subjects of a saved selection that `user` may view, see
+    `ce_ui.subjects.resolve`; raises `Selection.DoesNotExist` for unknown
+    handles.
+
+    The ids of the subjects are cached per user, until the permissions of the
+    user change.
+    Later requests load the subjects by id without checking permissions again.
+    """
+    key = f"selection:{handle}:{visibility.generation(user)}:{user.pk}"
+    visible = cache.get(key)
+    if visible is not None:
+        return _subjects.load(visible)
+    subjects = load(handle)
+    resolved = _subjects.subjects_from_dict(subjects, user)
+    if set(subjects).issubset(_subjects.MODELS):
+        visible = {kind: [] for kind in subjects}
+        for subject in resolved:
+            visible[subject._meta.model_name].append(subject.pk)
+        cache.set(key, visible, TIMEOUT)
+    return resolved
+
+
+def visible_ids(handle, user):
+    """
+    Ids of the subjects of a saved selection that `user` may view, by kind,
+    see `resolve`; raises `Selection.DoesNotExist` for unknown handles.
+    """
+    visible = {kind: [] for kind in load(handle) if kind in _subjects.MODELS}
+    for subject in resolve(handle, user):
+        visible.setdefault(subject._meta.model_name, []).append(subject.pk)
+    return {kind: sorted(ids) for kind, ids in visible.items()}
+
+
+class SelectionMiddleware:
+    """
+    Expand the `selection` parameter into the `subjects` parameter, for views
+    that only know the latter. Unknown handles are left alone.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        handle = request.GET.get("selection")
+        if handle and "subjects" not in request.GET:
+            try:
+                subjects = load(handle)
+            except Selection.DoesNotExist:
+                pass
+            else:
+                query = request.GET.copy()
+                query["subjects"] = _subjects.encode(subjects)
+                query._mutable = False
+                request.GET = query
+        return self.get_response(request)
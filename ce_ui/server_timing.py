@@ -0,0 +1,220 @@
+"""
+`Server-Timing` header with a breakdown of where a request spent its time.
+
+Browser devtools show how long a response took, but not why. This middleware
+measures the time spent in SQL queries, cache operations, storage calls,
+serializers and template rendering, and reports it in a `Server-Timing` header,
+which the network panel of the devtools displays next to the request, e.g.
+
+    Server-Timing: sql;dur=312.4;desc="57 queries", cache;dur=4.1;desc="9 ops,
+        7 hits", storage;dur=0.0;desc="0 calls", serializer;dur=402.7,
+        template;dur=18.9, total;dur=811.0
+
+The header is added for staff users (`SERVER_TIMING_FOR_STAFF`, on by default)
+or for everyone (`SERVER_TIMING_ENABLED`, meant for development). If neither is
+set, the middleware removes itself from the stack at startup.
+
+SQL queries are timed with `connection.execute_wrapper`, installed only for the
+requests being timed. Cache, storage, serializers and templates have no such
+hook; their methods are wrapped once per process, and the wrappers only check a
+context variable unless the current request is being timed. Calls nested in a
+call of the same kind (a serializer serializing another one, a template
+including another one) are counted once. Different kinds do overlap: a cache
+lookup inside a serializer counts towards both.
+
+The wrapping (`install`) patches classes, so it affects the whole process, not
+only the middleware:
+
+* the `CACHE_METHODS` of the backend class of every cache in `CACHES`,
+* the `STORAGE_METHODS` of the backend class of every storage in `STORAGES`,
+* the `data` property of Django REST framework's `Serializer` and
+  `ListSerializer`, and so of every serializer, and
+* `render` of the templates of Django's template backend.
+
+It happens when the middleware is set up, i.e. at startup, and cannot be
+undone while the process runs. To turn it off, set both
+`SERVER_TIMING_ENABLED` and `SERVER_TIMING_FOR_STAFF` to false (e.g. the
+environment variables of the same names): the middleware then removes itself
+before patching anything. Removing the middleware from `MIDDLEWARE` has the
+same effect.
+"""
+
+import contextvars
+import functools
+import logging
+import time
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.utils.module_loading import import_string
+
+_log = logging.getLogger(__name__)
+
+#: Methods of the cache backends that are timed. `get_or_set` and friends are
+#: implemented on top of these.
+CACHE_METHODS = [
+    "get", "get_many", "set", "set_many", "add", "delete", "delete_many",
+    "touch", "incr", "decr", "has_key",
+]
+
+#: Methods of the storage backends that are timed
+STORAGE_METHODS = [
+    "open", "save", "delete", "exists", "listdir", "size", "url",
+    "get_modified_time",
+]
+
+# Timing of the request currently being handled, if it is being timed
+_current = contextvars.ContextVar("server_timing", default=None)
+
+_installed = False
+
+
+class Timing:
+    """Time spent and number of calls per metric, for one request."""
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.durations = {}
+        self.counts = {}
+        self.cache_hits = 0
+        # Metrics with a call in progress, see `_timed`
+        self._active = set()
+
+    def add(self, metric, duration, count=1):
+        self.durations[metric] = self.durations.get(metric, 0.0) + duration
+        self.counts[metric] = self.counts.get(metric, 0) + count
+
+    def sql_wrapper(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add("sql", time.perf_counter() - start)
+
+    def header(self):
+        """Value of the `Server-Timing` header."""
+
+        def entry(metric, desc=None):
+            value = f"{metric};dur={1000 * self.durations.get(metric, 0.0):.1f}"
+            return value if desc is None else f'{value};desc="{desc}"'
+
+        return ", ".join(
+            [
+                entry("sql", f"{self.counts.get('sql', 0)} queries"),
+                entry(
+                    "cache",
+                    f"{self.counts.get('cache', 0)} ops, {self.cache_hits} hits",
+                ),
+                entry("storage", f"{self.counts.get('storage', 0)} calls"),
+                entry("serializer"),
+                entry("template"),
+                f"total;dur={1000 * (time.perf_counter() - self.start):.1f}",
+            ]
+        )
+
+
+def _timed(func, metric, on_result=None):
+    """Wrap `func` so that its calls count towards `metric`."""
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        timing = _current.get()
+        if timing is None or metric in timing._active:
+            return func(*args, **kwargs)
+        timing._active.add(metric)
+        start = time.perf_counter()
+        try:
+            result = func(*args, **kwargs)
+        finally:
+            timing._active.discard(metric)
+            timing.add(metric, time.perf_counter() - start)
+        if on_result is not None:
+            on_result(timing, result, args, kwargs)
+        return result
+
+    wrapper._server_timing = True
+    return wrapper
+
+
+def _count_cache_hits(timing, result, args, kwargs):
+    # `args` starts with the backend instance; a miss returns the default
+    if isinstance(result, dict):  # get_many
+        timing.cache_hits += len(result)
+    elif result is not kwargs.get("default", args[2] if len(args) > 2 else None):
+        timing.cache_hits += 1
+
+
+def _wrap_methods(cls, names, metric, on_result=None):
+    for name in names:
+        method = getattr(cls, name, None)
+        if method is None or getattr(method, "_server_timing", False):
+            continue
+        hook = on_result if name in ("get", "get_many") else None
+        setattr(cls, name, _timed(method, metric, hook))
+
+
+def install():
+    """Wrap cache, storage, serializer and template methods; idempotent."""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+
+    for config in settings.CACHES.values():
+        _wrap_methods(
+            import_string(config["BACKEND"]), CACHE_METHODS, "cache", _count_cache_hits
+        )
+    for config in getattr(settings, "STORAGES", {}).values():
+        _wrap_methods(import_string(config["BACKEND"]), STORAGE_METHODS, "storage")
+
+    # The top-level `data` of a serializer is what views call; nested
+    # serializers go through `to_representation` and are counted with it
+    from rest_framework.serializers import ListSerializer, Serializer
+
+    for cls in (Serializer, ListSerializer):
+        cls.data = property(_timed(cls.data.fget, "serializer"))
+
+    from django.template.backends.django import Template
+
+    Template.render = _timed(Template.render, "template")
+
+
+class ServerTimingMiddleware:
+    """
+    Add a `Server-Timing` header to the responses to staff users, or to all
+    responses if `SERVER_TIMING_ENABLED` is set.
+
+    Must come after the authentication middleware.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = getattr(settings, "SERVER_TIMING_ENABLED", False)
+        self.for_staff = getattr(settings, "SERVER_TIMING_FOR_STAFF", True)
+        if not (self.enabled or self.for_staff):
+            raise MiddlewareNotUsed()
+        install()
+
+    def is_timed(self, request):
+        if self.enabled:
+            return True
+        user = getattr(request, "user", None)
+        return user is not None and user.is_staff
+
+    def __call__(self, request):
+        if not self.is_timed(request):
+            return self.get_response(request)
+
+        timing = Timing()
+        token = _current.set(timing)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(timing.sql_wrapper))
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        response["Server-Timing"] = timing.header()
+        return response
@@ -0,0 +1,186 @@
+"""
+Session engine that keeps sessions in Redis, with the database as fallback.
+
+With Django's database engine, every authenticated request reads its session
+from `django_session`, and every request that touches the session writes it
+back, even if nothing changed: assigning a value marks the session modified,
+whether or not the value is new. `set_default_select_tab_state` assigns the
+same select tab state at every login, for instance.
+
+This engine (`SESSION_ENGINE = "ce_ui.sessions"`) stores sessions in the cache
+named by `SESSION_CACHE_ALIAS`, which should be a Redis cache that neither
+ignores errors nor evicts keys, and writes a session only if its serialized
+data differs from what was loaded or last saved.
+
+The database remains the fallback:
+
+* If the cache raises, the session is read from or written to the database.
+  A session written to the database drops its copy in the cache, which is
+  older, so that it is read from the database from then on. If even that
+  fails, the process remembers the copy as stale, does not read it, and
+  drops it as soon as the cache answers again.
+* A session missing from the cache is looked up in the database, and copied
+  to the cache if found. Sessions created before the switch to this engine
+  therefore stay valid and move to Redis on first use;
+  `manage.py warm_session_cache` moves all of them at once.
+* Deleting a session deletes it from both. If it cannot be deleted from the
+  cache, the error propagates: the session would otherwise stay valid after
+  logging out.
+
+Switching back to the database engine ends the sessions that exist only in
+Redis; their users have to sign in again.
+"""
+
+import logging
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.sessions.backends.base import CreateError, UpdateError
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.core.cache import caches
+
+_log = logging.getLogger(__name__)
+
+KEY_PREFIX = "ce_ui.sessions:"
+
+#: Cache keys of sessions whose copy in the cache is older than the one in the
+#: database, and could not be dropped yet
+_stale_keys = set()
+
+
+def _drop_stale(cache):
+    """Drop the stale copies in the cache; raises if the cache does."""
+    for key in list(_stale_keys):
+        cache.delete(key)
+        _stale_keys.discard(key)
+
+
+class SessionStore(DBStore):
+    """Redis sessions with database fallback and write coalescing."""
+
+    cache_key_prefix = KEY_PREFIX
+
+    def __init__(self, session_key=None):
+        self._cache = caches[settings.SESSION_CACHE_ALIAS]
+        #: Serialized data as last loaded or saved, None if neither happened
+        self._stored = None
+        super().__init__(session_key)
+
+    def _cache_key(self, session_key):
+        return self.cache_key_prefix + session_key
+
+    def _serialize(self, data):
+        return self.serializer().dumps(data)
+
+    def load(self):
+        data = None
+        if self.session_key is not None:
+            try:
+                _drop_stale(self._cache)
+                data = self._cache.get(self._cache_key(self.session_key))
+            except Exception:
+                _log.warning("Cannot read session from cache, reading it from the database.", exc_info=True)
+        if data is None:
+            session = self._get_session_from_db()
+            if session is None:
+                data = {}
+            else:
+                data = self.decode(session.session_data)
+                try:
+                    self.copy_to_cache(session)
+                except Exception:
+                    _log.warning("Cannot write session to cache.", exc_info=True)
+        self._stored = self._serialize(data)
+        return data
+
+    def copy_to_cache(self, session, overwrite=True):
+        """
+        Copy a session from the database to the cache.
+
+        Parameters
+        ----------
+        session : django.contrib.sessions.models.Session
+            The session.
+        overwrite : bool, optional
+            Overwrite the session if it is in the cache already. (Default: True)
+
+        Returns
+        -------
+        bool
+            Whether the session was written to the cache.
+        """
+        key = self._cache_key(session.session_key)
+        data = self.decode(session.session_data)
+        timeout = self.get_expiry_age(expiry=session.expire_date)
+        if overwrite:
+            self._cache.set(key, data, timeout)
+            return True
+        return self._cache.add(key, data, timeout)
+
+    def exists(self, session_key):
+        if not session_key:
+            return False
+        # Only used to pick keys for new sessions, which go to the cache
+        try:
+            return self._cache_key(session_key) in self._cache
+        except Exception:
+            _log.warning("Cannot look up session in cache.", exc_info=True)
+            return super().exists(session_key)
+
+    def save(self, must_create=False):
+        if self.session_key is None:
+            return self.create()
+        data = self._get_session(no_load=must_create)
+        serialized = self._serialize(data)
+        if not must_create and serialized == self._stored:
+            # Modified, but not changed
+            return
+        key = self._cache_key(self.session_key)
+        try:
+            if must_create:
+                if not self._cache.add(key, data, self.get_expiry_age()):
+                    raise CreateError
+            else:
+                self._cache.set(key, data, self.get_expiry_age())
+        except CreateError:
+            raise
+        except Exception:
+            _log.warning("Cannot write session to cache, writing it to the database.", exc_info=True)
+            try:
+                super().save(must_create=must_create)
+            except UpdateError:
+                # The session has so far only been in the cache
+                super().save(must_create=True)
+            # The copy in the cache is older now
+            try:
+                self._cache.delete(key)
+            except Exception:
+                _log.warning("Cannot drop stale session from cache.", exc_info=True)
+                _stale_keys.add(key)
+        self._stored = serialized
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            if self.session_key is None:
+                return
+            session_key = self.session_key
+        # Sessions written before the switch to this engine, or while the
+        # cache was unavailable
+        super().delete(session_key)
+        # Raises if the cache does: a session left in the cache stays valid
+        self._cache.delete(self._cache_key(session_key))
+        _stale_keys.discard(self._cache_key(session_key))
+
+    # The database engine's asynchronous methods would bypass the cache
+
+    async def aload(self):
+        return await sync_to_async(self.load)()
+
+    async def aexists(self, session_key):
+        return await sync_to_async(self.exists)(session_key)
+
+    async def asave(self, must_create=False):
+        return await sync_to_async(self.save)(must_create=must_create)
+
+    async def adelete(self, session_key=None):
+        return await sync_to_async(self.delete)(session_key)
@@ -2,6 +2,7 @@
 Base settings to build other settings files upon.
 """
 
+import os
 import random
 import string
 from datetime import timedelta
@@ -89,7 +90,25 @@ CACHES = {
             # Connection pooling for better performance
             "CONNECTION_POOL_KWARGS": {"max_connections": 50},
         },
-    }
+    },
+    # Sessions, see `ce_ui.sessions`. Errors must reach the session engine, so
+    # it can fall back to the database, and the Redis database should not be
+    # subject to eviction.
+    "sessions": {
+        "BACKEND": env.str(
+            "DJANGO_SESSION_CACHE_BACKEND", default="django_redis.cache.RedisCache"
+        ),
+        "LOCATION": env.str(
+            "DJANGO_SESSION_CACHE_LOCATION", default="redis://redis:6379/1"
+        ),
+        "OPTIONS": {
+            "CLIENT_CLASS": "django_redis.client.DefaultClient",
+            "IGNORE_EXCEPTIONS": False,
+            "SOCKET_CONNECT_TIMEOUT": 2,
+            "SOCKET_TIMEOUT": 2,
+            "CONNECTION_POOL_KWARGS": {"max_connections": 50},
+        },
+    },
     # 'default': {
     #     'BACKEND': 'django_redis.cache.RedisCache',
     #     'LOCATION': env('REDIS_URL'),
@@ -102,6 +121,15 @@ CACHES = {
     # }
 }
 
+# SESSIONS
+# ------------------------------------------------------------------------------
+# Redis with the database as fallback; `django.contrib.sessions.backends.db`
+# goes back to the database only
+# https://docs.djangoproject.com/en/dev/ref/settings/#session-engine
+SESSION_ENGINE = env.str("DJANGO_SESSION_ENGINE", default="ce_ui.sessions")
+# https://docs.djangoproject.com/en/dev/ref/settings/#session-cache-alias
+SESSION_CACHE_ALIAS = "sessions"
+
 # URLS
 # ------------------------------------------------------------------------------
 # https://docs.djangoproject.com/en/dev/ref/settings/#root-urlconf
@@ -188,7 +216,13 @@ AUTHENTICATION_BACKENDS = [
 AUTH_USER_MODEL = "users.User"
 TOPOBANK_PERMISSION_MODEL = "authorization.PermissionSet"
 TOPOBANK_ORGANIZATION_MODEL = "organizations.Organization"
-TOPOBANK_ANONYMOUS_USER_GETTER = "topobank_orcid.users.anonymous.get_anonymous_user"
+# Cached per process; loads `topobank_orcid.users.anonymous.get_anonymous_user`
+TOPOBANK_ANONYMOUS_USER_GETTER = "ce_ui.anonymous.get_anonymous_user"
+# Answer `Surface.objects.for_user` from the materialized visibility table,
+# see `ce_ui.visibility`. The table is kept up to date either way; enable this
+# once `benchmarks/bench_visibility.py` shows it faster than topobank's joins
+# on a database of production size (see "Benchmarks" in README.rst)
+SURFACE_VISIBILITY_INDEX = env.bool("SURFACE_VISIBILITY_INDEX", default=False)
 # https://docs.djangoproject.com/en/dev/ref/settings/#login-redirect-url
 LOGIN_REDIRECT_URL = "home"
 # https://docs.djangoproject.com/en/dev/ref/settings/#login-url
@@ -230,14 +264,23 @@ MIDDLEWARE = [
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    # Needs the user to decide whether to time the request, and should wrap as
+    # much of the rest as possible
+    "ce_ui.server_timing.ServerTimingMiddleware",
     # Request profiler needs to be after authentication middleware to be able to log
     # user info
     "request_profiler.middleware.ProfilingMiddleware",
     # Allauth
     "allauth.account.middleware.AccountMiddleware",
-    "termsandconditions.middleware.TermsAndConditionsRedirectMiddleware",
+    # Same as `termsandconditions.middleware.TermsAndConditionsRedirectMiddleware`, from the cache
+    "ce_ui.terms.TermsAndConditionsRedirectMiddleware",
     # we need an anonymous user with a user id for API calls
-    "topobank_orcid.users.middleware.anonymous_user_middleware",
+    # (same as `topobank_orcid.users.middleware.anonymous_user_middleware`, cached per process)
+    "ce_ui.anonymous.anonymous_user_middleware",
+    # Memoizes permission checks for the (possibly anonymous) user
+    "ce_ui.permissions.PermissionMemoMiddleware",
+    # Lets views that take the `subjects` parameter take a `selection` handle
+    "ce_ui.selections.SelectionMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -275,6 +318,7 @@ TEMPLATES = [
                 "django.template.context_processors.tz",
                 "django.contrib.messages.context_processors.messages",
                 "ce_ui.context_processors.bokehjs_processor",
+                "ce_ui.context_processors.versions_processor",
                 "ce_ui.context_processors.fixed_tabs_processor",
             ],
         },
@@ -475,6 +519,13 @@ if STATICFILES_DIR is None:
     STATICFILES_DIRS = []
 else:
     STATICFILES_DIRS = [STATICFILES_DIR]
+# The OpenAPI schema, as generated by `manage.py build_api_schema` before
+# `collectstatic`; it is served from the static files, see `ce_ui.api_schema`
+API_SCHEMA_ROOT = env.str(
+    "DJANGO_API_SCHEMA_ROOT", default=(APPS_DIR - 2).path("api-schema")
+)
+if os.path.isdir(str(API_SCHEMA_ROOT)):
+    STATICFILES_DIRS.append(("api", str(API_SCHEMA_ROOT)))
 
 # https://docs.djangoproject.com/en/dev/ref/contrib/staticfiles/#staticfiles-finders
 STATICFILES_FINDERS = [
@@ -714,32 +765,107 @@ TABNAV_DISPLAY_HOME_TAB = True
 
 # REQUEST PROFILER
 # ------------------------------------------------------------------------------
-# Default configuration is to ignore staff users, we override this here to log
-# all requests. High-frequency polling endpoints are excluded: each profiled
-# request is an INSERT into a large table, and the notification poll runs
-# continuously from every open tab of every logged-in user without ever being
-# the request whose timing anyone investigates.
+# Default configuration is to ignore staff users, we override this here to
+# sample all requests instead, see `ce_ui.profiling`. The function is called
+# once the response is ready; returning False discards the record.
 def REQUEST_PROFILER_GLOBAL_EXCLUDE_FUNC(request):
-    return not request.path.startswith("/inbox/notifications/")
+    # Imported here because the settings are loaded before the apps
+    from ce_ui.profiling import should_profile
+
+    return should_profile(request)
+
+
+# Probability with which a request is profiled, by path prefix (the longest
+# matching prefix wins). Each profiled request is an INSERT into a large table,
+# and what the records are used for -- latency per route -- is described just as
+# well by a few percent of the traffic. Health checks and the notification poll,
+# which runs continuously from every open tab of every logged-in user, are never
+# the request whose timing anyone investigates and are not profiled at all.
+REQUEST_PROFILER_SAMPLING_RATES = {
+    "/watchman/": 0.0,
+    "/robots.txt": 0.0,
+    "/inbox/notifications/": 0.0,
+    # Polled by every running analysis card and task-status row
+    "/analysis/api/": env.float("REQUEST_PROFILER_ANALYSIS_API_SAMPLING_RATE", default=0.01),
+}
+REQUEST_PROFILER_DEFAULT_SAMPLING_RATE = env.float(
+    "REQUEST_PROFILER_DEFAULT_SAMPLING_RATE", default=0.05
+)
+# Requests taking longer than this (in seconds) are profiled regardless of the
+# sampling rate of their route, unless that rate is zero
+REQUEST_PROFILER_SLOW_REQUEST_THRESHOLD = env.float(
+    "REQUEST_PROFILER_SLOW_REQUEST_THRESHOLD", default=1.0
+)
 
 
 # Keep records for a month
 REQUEST_PROFILER_LOG_TRUNCATION_DAYS = 30
+# The profiler's table is partitioned by day (see `ce_ui.partitioning`), and
+# partitions are created this many days ahead. The slack means a few missed
+# runs of the beat task below do not matter; records for which there is no
+# partition land in a default partition rather than being lost.
+REQUEST_PROFILER_PARTITIONS_AHEAD = 7
+
+# Hourly latency rollups of the profiling records (see `ce_ui.rollups`), which
+# outlive the records themselves
+REQUEST_PROFILER_ROLLUP_RETENTION_DAYS = 365
 
 # Nothing in request_profiler enforces the retention above on its own, so
-# schedule the truncation ourselves. Registered through the extension hook that
-# topobank.taskapp.celeryapp reads, which merges into its own beat schedule.
-# Pinned to an off-peak time rather than a plain 24h interval, which would drift
-# to whenever beat happened to start: the delete still rewrites a day's worth of
-# rows per run, so it should not land during peak traffic.
+# schedule it ourselves: the task drops expired partitions and creates upcoming
+# ones. Registered through the extension hook that topobank.taskapp.celeryapp
+# reads, which merges into its own beat schedule. Pinned to an off-peak time
+# rather than a plain 24h interval, which would drift to whenever beat happened
+# to start.
 TOPOBANK_CELERY_BEAT_SCHEDULE_EXTRA = {
-    "truncate-request-profiler-logs": {
-        "task": "ce_ui.tasks.truncate_request_profiler_logs",
+    "maintain-request-profiler-partitions": {
+        "task": "ce_ui.tasks.maintain_request_profiler_partitions",
         "schedule": crontab(hour=3, minute=30),
         "options": {"queue": TOPOBANK_MANAGER_QUEUE},
     },
+    # A few minutes past the hour, so that the records of requests that were
+    # still running when the hour ended have been written
+    "rollup-request-latencies": {
+        "task": "ce_ui.tasks.rollup_request_latencies",
+        "schedule": crontab(minute=5),
+        "options": {"queue": TOPOBANK_MANAGER_QUEUE},
+    },
+}
+
+# STATISTICS
+# ------------------------------------------------------------------------------
+# Seconds between refreshes of the statistics of the home page, see
+# `ce_ui.statistics`; browsers may cache them as long
+STATISTICS_REFRESH_INTERVAL = env.int("STATISTICS_REFRESH_INTERVAL", default=300)
+TOPOBANK_CELERY_BEAT_SCHEDULE_EXTRA["refresh-statistics"] = {
+    "task": "ce_ui.tasks.refresh_statistics",
+    "schedule": STATISTICS_REFRESH_INTERVAL,
+    "options": {"queue": TOPOBANK_MANAGER_QUEUE},
 }
 
+# SELECTIONS
+# ------------------------------------------------------------------------------
+# Saved selections of analysis subjects, see `ce_ui.selections`: how often a
+# user (or an anonymous visitor's address) may save one, and how many days
+# after their last use they are deleted
+SELECTION_THROTTLE_RATE = env.str("SELECTION_THROTTLE_RATE", default="100/hour")
+SELECTION_RETENTION_DAYS = env.int("SELECTION_RETENTION_DAYS", default=90)
+TOPOBANK_CELERY_BEAT_SCHEDULE_EXTRA["delete-unused-selections"] = {
+    "task": "ce_ui.tasks.delete_unused_selections",
+    "schedule": crontab(hour=4, minute=0),
+    "options": {"queue": TOPOBANK_MANAGER_QUEUE},
+}
+
+# SERVER TIMING
+# ------------------------------------------------------------------------------
+# Breakdown of the time spent on SQL, cache, storage, serializers and templates
+# in a `Server-Timing` header, see `ce_ui.server_timing`. Staff get it on every
+# response; enabling it for everyone is meant for development. Unless both are
+# off, the middleware wraps the methods of the cache and storage backends, DRF
+# serializers and templates for the whole process; turning both off leaves
+# them alone.
+SERVER_TIMING_ENABLED = env.bool("SERVER_TIMING_ENABLED", default=False)
+SERVER_TIMING_FOR_STAFF = env.bool("SERVER_TIMING_FOR_STAFF", default=True)
+
 # Upload method
 UPLOAD_METHOD = env("TOPOBANK_UPLOAD_METHOD", default="POST")
 
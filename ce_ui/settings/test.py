@@ -25,7 +25,14 @@ CACHES = {
     "default": {
         "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
         "LOCATION": "",
-    }
+    },
+    # Can be pointed at Redis to benchmark sessions, see `benchmarks/bench_sessions.py`
+    "sessions": {
+        "BACKEND": env.str(
+            "DJANGO_SESSION_CACHE_BACKEND", default="django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": env.str("DJANGO_SESSION_CACHE_LOCATION", default="sessions"),
+    },
 }
 
 # PASSWORDS
@@ -152,3 +159,19 @@ STORAGES = {
 # URL of the SPA (not used in testing)
 WEBAPP_URL = "http://localhost:5173/"
 TESTING_WEBAPP_URL = "http://localhost:5173/"
+
+# VISIBILITY
+# ------------------------------------------------------------------------------
+# Off by default; the tests check the indexed lookup against topobank's
+SURFACE_VISIBILITY_INDEX = True
+
+# STARTUP BUDGETS
+# ------------------------------------------------------------------------------
+# Checked by `ce_ui/tests/test_startup_budget.py` on a worker booted with these
+# settings, up to and including the URL configuration and the app shell template.
+# Total time spent importing modules, in seconds, as reported by `-X importtime`
+STARTUP_IMPORT_TIME_BUDGET = env.float("STARTUP_IMPORT_TIME_BUDGET", default=4.0)
+# Resident memory of the worker, in MiB
+STARTUP_RSS_BUDGET = env.float("STARTUP_RSS_BUDGET", default=400)
+# Number of modules (and packages) listed when a budget is exceeded
+STARTUP_BUDGET_REPORT_LENGTH = env.int("STARTUP_BUDGET_REPORT_LENGTH", default=15)
@@ -1,10 +1,21 @@
 import logging
 
 from allauth.account.signals import user_logged_in
-from django.db.models.signals import post_save
+from django.contrib.auth.models import Group
+from django.db.models.signals import (m2m_changed, post_delete, post_migrate,
+                                      post_save)
 from django.dispatch import receiver
+from request_profiler.models import ProfilingRecord
+from termsandconditions.models import (TermsAndConditions,
+                                       UserTermsAndConditions)
+from topobank.authorization.models import PermissionSet, UserPermission
+from topobank.manager.models import Surface, Topography
 from topobank_orcid.users.models import User
 
+from . import (anonymous, measurement_order, permissions, terms, visibility,
+               workflows)
+from .models import SurfaceVisibility
+from .profiling import store_sampling_rate
 from .utils import get_default_group
 from .views import DEFAULT_SELECT_TAB_STATE
 
@@ -21,3 +32,152 @@ def set_default_select_tab_state(request, user, **kwargs):
 def add_to_default_group(sender, instance, created, **kwargs):
     if created:
         instance.groups.add(get_default_group())
+
+
+@receiver(post_save, sender=User)
+def forget_terms_state_of_user(sender, instance, **kwargs):
+    """A user may have become a superuser, see `ce_ui.terms`."""
+    terms.forget_user(instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def forget_anonymous_user(sender, instance, **kwargs):
+    """The anonymous user is cached by every process, see `ce_ui.anonymous`."""
+    if anonymous.is_anonymous_user_id(instance.pk):
+        anonymous.invalidate()
+
+
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=User.groups.through)
+def forget_anonymous_user_permissions(sender, instance, action, reverse, pk_set, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        user_ids = (pk_set or []) if reverse else [instance.pk]
+        if reverse and action == "post_clear" or any(anonymous.is_anonymous_user_id(pk) for pk in user_ids):
+            anonymous.invalidate()
+
+
+@receiver(m2m_changed, sender=Group.permissions.through)
+def forget_anonymous_group_permissions(sender, action, **kwargs):
+    """The anonymous user may be a member of the group."""
+    if action in ("post_add", "post_remove", "post_clear"):
+        anonymous.invalidate()
+
+
+@receiver(post_save, sender=UserTermsAndConditions)
+@receiver(post_delete, sender=UserTermsAndConditions)
+def forget_accepted_terms(sender, instance, **kwargs):
+    terms.forget_user(instance.user_id)
+
+
+@receiver(post_save, sender=TermsAndConditions)
+@receiver(post_delete, sender=TermsAndConditions)
+def forget_active_terms(sender, instance, **kwargs):
+    """Terms were added, e.g. by `manage.py import_terms`, or changed."""
+    terms.forget_active_terms()
+
+
+@receiver(m2m_changed, sender=User.user_permissions.through)
+@receiver(m2m_changed, sender=User.groups.through)
+def forget_terms_state_of_members(sender, instance, action, reverse, pk_set, **kwargs):
+    """Permissions decide whether users are exempt from the terms."""
+    if action in ("post_add", "post_remove", "post_clear"):
+        user_ids = (pk_set or []) if reverse else [instance.pk]
+        for user_id in user_ids:
+            terms.forget_user(user_id)
+
+
+@receiver(post_save, sender=ProfilingRecord)
+def record_profiler_sampling_rate(sender, instance, created, **kwargs):
+    """Persist the rate a profiling record was sampled with, see `ce_ui.profiling`."""
+    if created:
+        store_sampling_rate(instance)
+
+
+@receiver(post_save, sender=UserPermission)
+@receiver(post_delete, sender=UserPermission)
+def forget_memoized_permissions(sender, instance, **kwargs):
+    """Permissions changed during a request must not be answered from the memo, see `ce_ui.permissions`."""
+    permissions.forget(instance.parent_id)
+
+
+@receiver(post_save, sender=UserPermission)
+@receiver(post_delete, sender=UserPermission)
+def refresh_surface_visibility(sender, instance, **kwargs):
+    """Keep the materialized visibility of the datasets up to date, see `ce_ui.visibility`."""
+    visibility.refresh(permission_set_ids=[instance.parent_id])
+
+
+if hasattr(PermissionSet, "organization_permissions"):
+    for signal in (post_save, post_delete):
+        signal.connect(forget_memoized_permissions, sender=PermissionSet.organization_permissions.rel.related_model)
+        signal.connect(refresh_surface_visibility, sender=PermissionSet.organization_permissions.rel.related_model)
+
+
+@receiver(post_save, sender=Surface)
+def add_surface_visibility(sender, instance, created, **kwargs):
+    """Datasets may get their permission set after permissions were granted on it."""
+    if created:
+        visibility.refresh(permission_set_ids=[instance.permissions_id])
+
+
+@receiver(post_save, sender=Topography)
+def reorder_measurements_on_save(sender, instance, created, update_fields=None, **kwargs):
+    """Measurements added to a dataset, or moved within it, change its order, see `ce_ui.measurement_order`."""
+    if created or update_fields is None or measurement_order.ordering_fields().intersection(update_fields):
+        measurement_order.invalidate(instance.surface_id)
+
+
+@receiver(post_delete, sender=Topography)
+def reorder_measurements_on_delete(sender, instance, **kwargs):
+    measurement_order.invalidate(instance.surface_id)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def refresh_member_visibility(sender, instance, action, reverse, pk_set, **kwargs):
+    """Organization permissions are granted to the members of the organization's group."""
+    if action == "pre_clear" and reverse:
+        # `pk_set` is None on clear; these are the members about to be removed
+        instance._visibility_user_ids = list(instance.user_set.values_list("pk", flat=True))
+    elif action in ("post_add", "post_remove", "post_clear"):
+        if not reverse:
+            user_ids = [instance.pk]
+        elif action == "post_clear":
+            user_ids = getattr(instance, "_visibility_user_ids", [])
+        else:
+            user_ids = pk_set
+        visibility.refresh(user_ids=user_ids)
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def forget_workflow_groups(sender, instance, action, reverse, pk_set, **kwargs):
+    """The workflows a user may run depend on the user's groups, see `ce_ui.workflows`."""
+    if action in ("post_add", "post_remove", "post_clear"):
+        if not reverse:
+            workflows.forget_user(instance.pk)
+        elif action == "post_clear":
+            workflows.forget_organizations()
+        else:
+            for user_id in pk_set:
+                workflows.forget_user(user_id)
+
+
+@receiver(post_delete, sender=Group)
+def forget_workflow_organizations(sender, **kwargs):
+    """Organizations make workflows available to the members of their groups."""
+    workflows.forget_organizations()
+
+
+if hasattr(PermissionSet, "organization_permissions"):
+    _OrganizationPermission = PermissionSet.organization_permissions.rel.related_model
+    _Organization = _OrganizationPermission._meta.get_field("organization").related_model
+    # Organizations make plugins, and so their workflows, available
+    post_save.connect(forget_workflow_organizations, sender=_Organization)
+    post_delete.connect(forget_workflow_organizations, sender=_Organization)
+
+
+@receiver(post_migrate)
+def build_surface_visibility(sender, **kwargs):
+    """Build the materialized visibility the first time it is migrated."""
+    if sender.name == "ce_ui" and not SurfaceVisibility.objects.exists() and Surface.objects.exists():
+        visibility.rebuild()
@@ -0,0 +1,108 @@
+"""
+A mergeable quantile sketch for latencies.
+
+Percentiles cannot be combined: the p95 of a day is not a function of the p95s
+of its hours. The latency rollups (see `ce_ui.rollups`) therefore store a
+sketch of the distribution instead, from which the percentiles of any
+combination of hours and routes can be read off after merging.
+
+This is the DDSketch of Masson, Rim and Lee (VLDB 2019), reduced to what the
+rollups need. Values are counted in logarithmically spaced bins, so that every
+quantile is returned with a bounded *relative* error, and merging two sketches
+adds up their bins. Weights need not be integers, which is what lets sampled
+profiling records count for the requests they stand for.
+"""
+
+import math
+
+#: Values below this (in seconds) are counted as zero
+MIN_VALUE = 1e-6
+
+
+class DDSketch:
+    """
+    Distribution of positive values with quantiles of bounded relative error.
+
+    Parameters
+    ----------
+    relative_accuracy : float, optional
+        Relative error of the quantiles. (Default: 0.01)
+    bins : dict, optional
+        Weight per bin index, as returned by `to_dict`.
+    zero_weight : float, optional
+        Weight of the values below `MIN_VALUE`.
+    """
+
+    def __init__(self, relative_accuracy=0.01, bins=None, zero_weight=0.0):
+        self.relative_accuracy = relative_accuracy
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self.gamma)
+        self.bins = {int(index): weight for index, weight in (bins or {}).items()}
+        self.zero_weight = zero_weight
+
+    @property
+    def count(self):
+        """Total weight of the values added."""
+        return self.zero_weight + sum(self.bins.values())
+
+    def add(self, value, weight=1.0):
+        """Add `value`, counting it `weight` times."""
+        if value < MIN_VALUE:
+            self.zero_weight += weight
+        else:
+            index = math.ceil(math.log(value) / self._log_gamma)
+            self.bins[index] = self.bins.get(index, 0.0) + weight
+
+    def merge(self, other):
+        """Add the values of sketch `other` to this one."""
+        if other.relative_accuracy != self.relative_accuracy:
+            raise ValueError("Cannot merge sketches of different accuracy.")
+        for index, weight in other.bins.items():
+            self.bins[index] = self.bins.get(index, 0.0) + weight
+        self.zero_weight += other.zero_weight
+
+    def quantile(self, q):
+        """
+        Return the `q`-quantile of the values added.
+
+        Parameters
+        ----------
+        q : float
+            Quantile between 0 and 1.
+
+        Returns
+        -------
+        float or None
+            The quantile, or None if the sketch is empty.
+        """
+        total = self.count
+        if total <= 0:
+            return None
+        rank = q * total
+        cumulative = self.zero_weight
+        if cumulative > 0 and cumulative >= rank:
+            return 0.0
+        for index in sorted(self.bins):
+            cumulative += self.bins[index]
+            if cumulative >= rank:
+                # Midpoint of the bin, in the sense of the relative error
+                return 2 * self.gamma**index / (self.gamma + 1)
+        return 2 * self.gamma ** max(self.bins) / (self.gamma + 1)
+
+    def to_dict(self):
+        """JSON-serializable representation, see `from_dict`."""
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "zero_weight": self.zero_weight,
+            # JSON objects only have string keys
+            "bins": {str(index): weight for index, weight in self.bins.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        """Recreate a sketch from the output of `to_dict`."""
+        return cls(
+            relative_accuracy=d["relative_accuracy"],
+            bins=d["bins"],
+            zero_weight=d["zero_weight"],
+        )
@@ -0,0 +1,164 @@
+"""
+Measure the start of a web worker, phase by phase.
+
+Run as `python -m ce_ui.startup` with `DJANGO_SETTINGS_MODULE` set. Prints a
+JSON object with the time (in seconds) each phase took and the resident memory
+(in bytes) after each phase:
+
+* `setup`: `django.setup()`, i.e. settings, apps and models
+* `urls`: import of the URL configuration, with what it imports
+* `templates`: loading the app shell template
+* `first_request`: the first request through the full middleware stack, which
+  resolves and reverses URLs and therefore imports the lazily included URL
+  configurations (see `ce_ui.lazy`)
+
+With `--no-request`, it stops before the first request.
+
+This is the subject of the startup benchmark in `benchmarks/` and of the
+startup budget tests in `ce_ui/tests/test_startup_budget.py`. It has to be
+measured in a fresh interpreter, which is why it is a script; `run` starts
+it in one, optionally with `-X importtime`, whose report `parse_importtime`
+reads.
+"""
+
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import namedtuple
+from pathlib import Path
+
+#: Requested by the `first_request` phase; needs no database and reverses URLs
+FIRST_REQUEST_PATH = "/robots.txt"
+
+#: A line of the `-X importtime` report: self and cumulative time in
+#: microseconds, then the module, indented by two spaces per nesting level
+_IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$")
+
+#: Time spent importing a module, in seconds, as reported by `-X importtime`
+Import = namedtuple("Import", ["module", "self", "cumulative", "depth"])
+
+
+def rss():
+    """Resident memory of this process in bytes, or None if unknown."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Not Linux; the peak is the best there is
+        import resource
+
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == "darwin" else 1024 * maxrss
+
+
+def measure(path=FIRST_REQUEST_PATH):
+    """
+    Start Django phase by phase; return the durations and memory.
+
+    Parameters
+    ----------
+    path : str, optional
+        Path of the first request, or None to stop before it.
+        (Default: `FIRST_REQUEST_PATH`)
+    """
+    phases = {}
+
+    def phase(name, func):
+        start = time.perf_counter()
+        result = func()
+        phases[name] = {"duration": time.perf_counter() - start, "rss": rss()}
+        return result
+
+    phases["interpreter"] = {"duration": 0.0, "rss": rss()}
+
+    import django
+
+    phase("setup", django.setup)
+
+    from django.urls import get_resolver
+
+    phase("urls", lambda: get_resolver().url_patterns)
+
+    from django.template.loader import get_template
+
+    phase("templates", lambda: get_template("app.html"))
+
+    if path is None:
+        return {"phases": phases, "status_code": None}
+
+    from django.test import Client
+
+    response = phase("first_request", lambda: Client().get(path))
+    return {"phases": phases, "status_code": response.status_code}
+
+
+def parse_importtime(report):
+    """
+    Imports listed in the report written by `python -X importtime`.
+
+    Parameters
+    ----------
+    report : str
+        Standard error of the interpreter. Lines that are not part of the
+        report are skipped.
+
+    Returns
+    -------
+    list of Import
+        In the order of the report, i.e. every module after the modules it
+        imported.
+    """
+    imports = []
+    for line in report.splitlines():
+        match = _IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            imports.append(Import(module, int(self_us) / 1e6, int(cumulative_us) / 1e6, len(indent) // 2))
+    return imports
+
+
+def run(*args, importtime=False, settings="ce_ui.settings.test", env=None):
+    """
+    Run this script in a new interpreter.
+
+    Parameters
+    ----------
+    *args : str
+        Command line arguments of the script.
+    importtime : bool, optional
+        Run the interpreter with `-X importtime`. (Default: False)
+    settings : str, optional
+        Settings module. (Default: "ce_ui.settings.test")
+    env : dict, optional
+        Additional environment variables.
+
+    Returns
+    -------
+    result : dict
+        What `measure` returned.
+    imports : list of Import
+        The imports, if `importtime` is true, else an empty list.
+    """
+    options = ["-X", "importtime"] if importtime else []
+    process = subprocess.run(
+        [sys.executable, *options, "-m", "ce_ui.startup", *args],
+        # The directory `ce_ui` is in, so that `-m` finds it
+        cwd=Path(__file__).resolve().parent.parent,
+        env={**os.environ, "DJANGO_SETTINGS_MODULE": settings, **(env or {})},
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return json.loads(process.stdout), parse_importtime(process.stderr)
+
+
+if __name__ == "__main__":
+    arguments = sys.argv[1:]
+    if "--no-request" in arguments:
+        result = measure(None)
+    else:
+        result = measure(*arguments)
+    json.dump(result, sys.stdout)
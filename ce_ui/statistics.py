@@ -0,0 +1,191 @@
+"""
+Precomputed statistics of the home page.
+
+The home page shows signed-in users how many datasets, measurements and
+analyses they have, and how many datasets are shared with them; topobank's
+statistics endpoints count these over the whole dataset, measurement and
+analysis tables on every visit. `refresh`, run by Celery beat every
+`STATISTICS_REFRESH_INTERVAL` seconds, counts them for all users at once,
+with a handful of grouped queries, into a snapshot in the cache:
+
+* the totals, which also identify the snapshot, and
+* per user with anything to count, the user's counts.
+
+Users without an entry have no datasets, measurements or analyses of their
+own, and see the public datasets as shared with them. `HomeView` inlines the
+counts of the user into the page, and the statistics endpoints of
+`ce_ui.views` serve them with a `Cache-Control` header for the interval. If
+there is no snapshot, e.g. after the cache was flushed, the first request
+computes one, under a lock: requests that arrive meanwhile are served the
+last totals, kept without expiry, or zeros if there never were any.
+"""
+
+import logging
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import Count, F
+from django.utils import timezone
+from topobank.analysis.models import WorkflowResult
+from topobank.manager.models import Surface, Topography
+
+from . import anonymous, visibility
+from .models import SurfaceVisibility
+
+_log = logging.getLogger(__name__)
+
+#: Cache key of the totals of the current snapshot
+TOTALS_KEY = "statistics:totals"
+
+#: Cache key of the totals of the latest snapshot, which does not expire
+LAST_TOTALS_KEY = "statistics:last-totals"
+
+#: Cache key of the lock taken by requests that refresh the snapshot
+LOCK_KEY = "statistics:refreshing"
+
+#: Totals served while the first snapshot is computed
+EMPTY_TOTALS = {
+    "snapshot": None,
+    "computed_at": None,
+    "nb_users": 0,
+    "nb_surfaces": 0,
+    "nb_topographies": 0,
+    "nb_analyses": 0,
+    "nb_public_surfaces": 0,
+}
+
+#: Counts of a user, and their value for users without an entry (the shared
+#: datasets are added to the public ones)
+USER_COUNTS = {
+    "nb_surfaces_of_user": 0,
+    "nb_topographies_of_user": 0,
+    "nb_analyses_of_user": 0,
+    "nb_surfaces_shared_with_user": 0,
+}
+
+
+def refresh_interval():
+    """Seconds between refreshes, and for which responses may be cached."""
+    return getattr(settings, "STATISTICS_REFRESH_INTERVAL", 300)
+
+
+def _timeout():
+    # Outlives a few missed refreshes
+    return 3 * refresh_interval()
+
+
+def _user_key(snapshot, user_id):
+    return f"statistics:{snapshot}:user:{user_id}"
+
+
+def _counts_by(queryset, field):
+    return dict(queryset.values_list(field).annotate(n=Count("pk", distinct=True)).order_by())
+
+
+def _analyses_by_user():
+    if not hasattr(WorkflowResult, "permissions"):
+        return {}
+    # Analyses belong to the users they are shared with
+    return _counts_by(WorkflowResult.objects.all(), "permissions__user_permissions__user")
+
+
+def refresh():
+    """Count everything into a new snapshot; returns its totals."""
+    anonymous_user_id = anonymous.anonymous_user_id()
+    view = visibility.rank("view")
+    public_ids = SurfaceVisibility.objects.filter(user_id=anonymous_user_id, level__gte=view).values("surface_id")
+    nb_public = Surface.objects.filter(pk__in=public_ids).count()
+
+    counts = {
+        "nb_surfaces_of_user": _counts_by(Surface.objects.all(), "created_by"),
+        "nb_topographies_of_user": _counts_by(Topography.objects.all(), "surface__created_by"),
+        "nb_analyses_of_user": _analyses_by_user(),
+        # Shared explicitly, and not public (those are counted below)
+        "nb_surfaces_shared_with_user": _counts_by(
+            SurfaceVisibility.objects.filter(level__gte=view)
+            .exclude(surface__created_by=F("user_id"))
+            .exclude(surface_id__in=public_ids),
+            "user_id",
+        ),
+    }
+    public_of_user = _counts_by(Surface.objects.filter(pk__in=public_ids), "created_by")
+
+    users = {}
+    for name, by_user in counts.items():
+        for user_id, n in by_user.items():
+            if user_id is not None:
+                users.setdefault(user_id, dict(USER_COUNTS))[name] = n
+    for user_id, n in public_of_user.items():
+        users.setdefault(user_id, dict(USER_COUNTS))["nb_surfaces_shared_with_user"] -= n
+    for user_counts in users.values():
+        user_counts["nb_surfaces_shared_with_user"] += nb_public
+
+    snapshot = uuid.uuid4().hex
+    totals = {
+        "snapshot": snapshot,
+        "computed_at": timezone.now().isoformat(),
+        "nb_users": get_user_model().objects.exclude(pk=anonymous_user_id).count(),
+        "nb_surfaces": Surface.objects.count(),
+        "nb_topographies": Topography.objects.count(),
+        "nb_analyses": WorkflowResult.objects.count(),
+        "nb_public_surfaces": nb_public,
+    }
+    timeout = _timeout()
+    cache.set_many({_user_key(snapshot, user_id): c for user_id, c in users.items()}, timeout)
+    # The totals last, so that the snapshot is complete once it is current
+    cache.set(TOTALS_KEY, totals, timeout)
+    cache.set(LAST_TOTALS_KEY, totals, None)
+    _log.info(f"Refreshed statistics of {len(users)} user(s).")
+    return totals
+
+
+def totals():
+    """
+    Totals of the current snapshot, refreshing it if there is none and no
+    other request is refreshing it already; else the last totals.
+    """
+    result = cache.get(TOTALS_KEY)
+    if result is not None:
+        return result
+    # Expires in case the refresh dies with its process
+    if cache.add(LOCK_KEY, True, refresh_interval()):
+        try:
+            return refresh()
+        finally:
+            cache.delete(LOCK_KEY)
+    return cache.get(LAST_TOTALS_KEY) or EMPTY_TOTALS
+
+
+def for_user(user):
+    """Totals and the counts of `user`, as of the current snapshot."""
+    result = totals()
+    counts = None
+    if result["snapshot"] is not None and user.pk is not None:
+        counts = cache.get(_user_key(result["snapshot"], user.pk))
+    if counts is None:
+        counts = dict(USER_COUNTS, nb_surfaces_shared_with_user=result["nb_public_surfaces"])
+    return {**result, **counts}
+
+
+def manager_statistics(user):
+    """Statistics of datasets and measurements, as served by `/manager/api/statistics`."""
+    stats = for_user(user)
+    return {
+        key: stats[key]
+        for key in (
+            "nb_users",
+            "nb_surfaces",
+            "nb_topographies",
+            "nb_surfaces_of_user",
+            "nb_topographies_of_user",
+            "nb_surfaces_shared_with_user",
+        )
+    }
+
+
+def analysis_statistics(user):
+    """Statistics of analyses, as served by `/analysis/api/statistics`."""
+    stats = for_user(user)
+    return {key: stats[key] for key in ("nb_analyses", "nb_analyses_of_user")}
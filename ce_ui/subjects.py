@@ -0,0 +1,117 @@
+"""
+Resolution of the subjects of an analysis page in bulk.
+
+The analysis pages receive their selection as the `subjects` parameter, a
+base64-encoded JSON dictionary of ids by kind of subject, e.g.
+`{"surface": [3, 5], "topography": [17]}` (see `subjectsToBase64` in
+`frontend/utils/api.ts`). `topobank.manager.utils.subjects_from_base64`
+resolves and checks every subject separately, and the breadcrumb then loads
+the dataset of every measurement. `resolve` loads all datasets and all
+measurements of a selection with one query each, the measurements together
+with their datasets, and checks the permissions of all of them in the same
+queries, through `Surface.objects.for_user`.
+
+Selections with other kinds of subjects are handed to topobank.
+"""
+
+import base64
+import binascii
+import json
+
+from topobank.manager.models import Surface, Topography
+
+#: Kinds of subjects resolved here, with the models they refer to
+MODELS = {"surface": Surface, "topography": Topography}
+
+
+def encode(subjects):
+    """The `subjects` parameter for a dictionary of subject ids."""
+    return base64.urlsafe_b64encode(json.dumps(subjects).encode()).decode()
+
+
+def validate(subjects):
+    """
+    Check a dictionary of subject ids, as decoded or posted; returns it with
+    the ids of datasets and measurements as integers. Raises `ValueError` if
+    it is not a dictionary of lists of ids.
+    """
+    if not isinstance(subjects, dict) or not all(isinstance(ids, list) for ids in subjects.values()):
+        raise ValueError("Subjects must be a dictionary of lists of ids.")
+    try:
+        return {kind: [int(pk) for pk in ids] if kind in MODELS else ids for kind, ids in subjects.items()}
+    except (TypeError, ValueError) as exc:
+        raise ValueError(f"Subject ids must be integers: {exc}") from exc
+
+
+def decode(encoded):
+    """
+    Dictionary of subject ids from the `subjects` parameter.
+
+    Accepts both the standard and the URL-safe base64 alphabet, with or
+    without padding; raises `ValueError` if `encoded` is not a dictionary of
+    lists of ids.
+    """
+    encoded = encoded.strip().translate(str.maketrans("+/", "-_"))
+    try:
+        subjects = json.loads(base64.urlsafe_b64decode(encoded + "=" * (-len(encoded) % 4)))
+    except (binascii.Error, UnicodeDecodeError) as exc:
+        raise ValueError(f"Subjects are not base64-encoded JSON: {exc}") from exc
+    return validate(subjects)
+
+
+def _in_bulk(subjects, querysets):
+    resolved = []
+    for kind, ids in subjects.items():
+        if not ids:
+            continue
+        by_id = querysets[kind].in_bulk(ids)
+        resolved += [by_id[pk] for pk in dict.fromkeys(ids) if pk in by_id]
+    return resolved
+
+
+def load(subjects):
+    """Datasets and measurements by id, like `resolve` but without checking
+    permissions; for ids that were checked before."""
+    return _in_bulk(subjects, {
+        "surface": Surface.objects.select_related("permissions"),
+        "topography": Topography.objects.select_related("surface", "permissions"),
+    })
+
+
+def resolve(subjects, user):
+    """
+    Datasets and measurements of a selection that `user` may view.
+
+    Parameters
+    ----------
+    subjects : dict
+        Lists of ids by kind of subject, as returned by `decode`.
+    user : topobank.users.models.User
+        The user looking at the selection.
+
+    Returns
+    -------
+    list
+        Subjects in the order of the selection, leaving out those that do not
+        exist or that `user` may not view. Measurements come with their
+        dataset.
+    """
+    visible = Surface.objects.for_user(user)
+    return _in_bulk(subjects, {
+        "surface": visible.select_related("permissions"),
+        "topography": Topography.objects.filter(surface__in=visible).select_related("surface", "permissions"),
+    })
+
+
+def subjects_from_dict(subjects, user):
+    """Resolve a dictionary of subject ids, in bulk if it only selects datasets and measurements."""
+    if not set(subjects).issubset(MODELS):
+        from topobank.manager.utils import subjects_from_base64
+
+        return subjects_from_base64(encode(subjects), user=user)
+    return resolve(subjects, user)
+
+
+def subjects_from_base64(encoded, user):
+    """Resolve the `subjects` parameter, see `subjects_from_dict`."""
+    return subjects_from_dict(decode(encoded), user)
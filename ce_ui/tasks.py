@@ -1,8 +1,12 @@
 import logging
 
 from django.core.management import call_command
+from django.db import connection
 from topobank.taskapp.celeryapp import app
 
+from . import partitioning, selections, statistics
+from .rollups import delete_expired_rollups, rollup_pending_hours
+
 _log = logging.getLogger(__name__)
 
 
@@ -14,6 +18,58 @@ def truncate_request_profiler_logs():
     Celery beat cannot invoke a management command directly, so this wraps the
     one shipped by `request_profiler`. Note that the command only reports what it
     would delete unless `--commit` is passed, hence passing it explicitly here.
+
+    Only needed while the profiler's table is not partitioned, see
+    `maintain_request_profiler_partitions`.
     """
     _log.info("Truncating request profiler logs.")
     call_command("truncate_request_profiler_logs", "--commit")
+
+
+@app.task
+def maintain_request_profiler_partitions():
+    """
+    Enforce REQUEST_PROFILER_LOG_TRUNCATION_DAYS by dropping expired partitions
+    of the profiler's table, and create the partitions for the coming days.
+
+    Falls back to deleting rows if the table is not partitioned, i.e. on a
+    database other than Postgres.
+    """
+    with connection.cursor() as cursor:
+        partitioned = partitioning.is_partitioned(cursor)
+    if not partitioned:
+        truncate_request_profiler_logs()
+        return
+    created, dropped = partitioning.maintain_partitions()
+    _log.info(
+        "Request profiler partitions: created %s, dropped %s.",
+        ", ".join(created) or "none",
+        ", ".join(dropped) or "none",
+    )
+
+
+@app.task
+def rollup_request_latencies():
+    """
+    Aggregate the profiling records of the past hours into latency rollups and
+    delete rollups past REQUEST_PROFILER_ROLLUP_RETENTION_DAYS.
+    """
+    num_hours = rollup_pending_hours()
+    num_deleted = delete_expired_rollups()
+    _log.info(
+        "Rolled up request latencies of %d hour(s), deleted %d expired rollup(s).",
+        num_hours,
+        num_deleted,
+    )
+
+
+@app.task
+def refresh_statistics():
+    """Recount the statistics of the home page, see `ce_ui.statistics`."""
+    statistics.refresh()
+
+
+@app.task
+def delete_unused_selections():
+    """Delete saved selections past SELECTION_RETENTION_DAYS, see `ce_ui.selections`."""
+    selections.delete_unused()
@@ -0,0 +1,121 @@
+"""
+Cached state of the terms and conditions.
+
+`termsandconditions.middleware.TermsAndConditionsRedirectMiddleware` asks
+on every request of a signed-in user which of the active terms the user has
+not accepted yet: a permission check for users exempt from the terms, and a
+query over the active terms and the user's acceptances, cached for only
+`TERMS_CACHE_SECONDS`. `TermsAndConditionsRedirectMiddleware` here does the
+same from two cached values:
+
+* the active terms (the latest active version of every slug), cached until
+  terms are added or changed, e.g. by `manage.py import_terms`, or until the
+  next version becomes active, and
+* per user, whether the user is exempt from the terms and which terms the
+  user accepted, cached until the user accepts terms or the user's
+  permissions change (see `ce_ui.signals`), or at most `TIMEOUT` seconds,
+  since permissions may also change through the groups of the user.
+
+Once both are cached, checking the terms takes no queries.
+"""
+
+import math
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Min
+from django.utils import timezone
+from termsandconditions.middleware import is_path_protected
+from termsandconditions.models import (TermsAndConditions,
+                                       UserTermsAndConditions)
+from termsandconditions.pipeline import redirect_to_terms_accept
+
+#: Cache key of the active terms
+ACTIVE_TERMS_KEY = "ce_ui.terms:active"
+
+#: Seconds the state of a user is cached at most
+TIMEOUT = 3600
+
+
+def _user_key(user_id):
+    return f"ce_ui.terms:user:{user_id}"
+
+
+def active_terms():
+    """Latest active terms of every slug, ordered by slug."""
+    terms = cache.get(ACTIVE_TERMS_KEY)
+    if terms is None:
+        now = timezone.now()
+        latest = {}
+        for t in TermsAndConditions.objects.filter(date_active__lte=now).order_by("date_active"):
+            latest[t.slug] = t
+        terms = [latest[slug] for slug in sorted(latest)]
+        # Terms that become active later replace the cached ones then
+        upcoming = TermsAndConditions.objects.filter(date_active__gt=now).aggregate(Min("date_active"))
+        upcoming = upcoming["date_active__min"]
+        timeout = None if upcoming is None else max(1, math.ceil((upcoming - now).total_seconds()))
+        cache.set(ACTIVE_TERMS_KEY, terms, timeout)
+    return terms
+
+
+def _user_state(user):
+    """Whether `user` is exempt from the terms, and the ids of the terms the user accepted."""
+    key = _user_key(user.pk)
+    state = cache.get(key)
+    if state is None:
+        permission = getattr(settings, "TERMS_EXCLUDE_USERS_WITH_PERM", None)
+        # `has_perm` is True for superusers, which are not exempt by permission
+        exempt = permission is not None and user.has_perm(permission) and not user.is_superuser
+        accepted = frozenset(UserTermsAndConditions.objects.filter(user=user).values_list("terms_id", flat=True))
+        state = (exempt, accepted)
+        cache.set(key, state, TIMEOUT)
+    return state
+
+
+def accepted_terms_ids(user):
+    """Ids of the terms `user` accepted, of any version."""
+    return _user_state(user)[1]
+
+
+def not_agreed_terms(user):
+    """
+    Active terms `user` has not accepted yet, like
+    `TermsAndConditions.get_active_terms_not_agreed_to` but from the cache.
+    """
+    if not user.is_authenticated:
+        return active_terms()
+    if getattr(settings, "TERMS_EXCLUDE_SUPERUSERS", None) and user.is_superuser:
+        return []
+    exempt, accepted = _user_state(user)
+    if exempt:
+        return []
+    return [terms for terms in active_terms() if terms.pk not in accepted]
+
+
+def forget_active_terms():
+    """Drop the cached active terms."""
+    cache.delete(ACTIVE_TERMS_KEY)
+
+
+def forget_user(user_id):
+    """Drop the cached state of a user."""
+    cache.delete(_user_key(user_id))
+
+
+class TermsAndConditionsRedirectMiddleware:
+    """
+    Redirect signed-in users to the terms they have not accepted yet, like
+    `termsandconditions.middleware.TermsAndConditionsRedirectMiddleware`,
+    from the cached state of the terms.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        path = request.META["PATH_INFO"]
+        if request.user.is_authenticated and is_path_protected(path):
+            for terms in not_agreed_terms(request.user):
+                query = request.META["QUERY_STRING"]
+                return redirect_to_terms_accept(f"{path}?{query}" if query else path, terms.slug)
+        return self.get_response(request)
@@ -8,13 +8,19 @@ Two behaviours matter here beyond the pages rendering at all:
   raising, since the parameter travels in URLs that get shared and edited.
 """
 
+import base64
+import json
+
 import pytest
 from django.contrib.auth.models import Permission
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from topobank.analysis.models import Workflow
 from topobank.manager.utils import subjects_to_base64
 from topobank.testing.factories import SurfaceFactory, Topography1DFactory
 
+from ce_ui.subjects import decode
 from ce_ui.views import (_safe_subjects_from_request,
                          extra_tabs_if_single_item_selected)
 
@@ -160,6 +166,43 @@ def test_a_missing_parameter_selects_nothing(rf, analyst):
     assert _safe_subjects_from_request(request) == []
 
 
+def test_subjects_encoded_by_the_frontend_are_decoded():
+    # `btoa` uses the standard alphabet, topobank the URL-safe one
+    encoded = base64.b64encode(json.dumps({"surface": [3, 5], "topography": [1023]}).encode()).decode()
+
+    assert decode(encoded) == {"surface": [3, 5], "topography": [1023]}
+    assert decode(encoded.rstrip("=")) == {"surface": [3, 5], "topography": [1023]}
+
+
+@pytest.mark.django_db
+def test_subjects_the_user_may_not_view_are_left_out(rf, analyst):
+    own = Topography1DFactory(surface=SurfaceFactory(created_by=analyst))
+    foreign = Topography1DFactory(surface=SurfaceFactory())
+    request = rf.get(
+        "/ui/analysis-list/",
+        {"subjects": subjects_to_base64([foreign.surface, own.surface, foreign, own])},
+    )
+    request.user = analyst
+
+    assert _safe_subjects_from_request(request) == [own.surface, own]
+
+
+@pytest.mark.django_db
+def test_selections_are_resolved_with_a_constant_number_of_queries(rf, analyst):
+    def nb_queries(nb_topographies):
+        surface = SurfaceFactory(created_by=analyst)
+        topographies = [Topography1DFactory(surface=surface) for _ in range(nb_topographies)]
+        request = rf.get("/ui/analysis-list/", {"subjects": subjects_to_base64([surface, *topographies])})
+        request.user = analyst
+        with CaptureQueriesContext(connection) as queries:
+            context = {}
+            extra_tabs_if_single_item_selected(context, _safe_subjects_from_request(request))
+        assert tab_titles(context) == [surface.label]
+        return len(queries)
+
+    assert nb_queries(2) == nb_queries(20)
+
+
 #
 # The pages
 #
@@ -244,7 +287,7 @@ def test_an_unknown_workflow_is_not_found(client, analyst):
 
 @pytest.mark.django_db
 def test_a_workflow_the_user_may_not_run_is_forbidden(client, analyst, monkeypatch):
-    monkeypatch.setattr("ce_ui.views.get_workflow_names", lambda user=None: [])
+    monkeypatch.setattr("ce_ui.workflows.visible_names", lambda user: frozenset())
 
     response = client.get(
         reverse("ce_ui:results-detail", kwargs={"slug": WORKFLOW})
@@ -1,9 +1,15 @@
 import pytest
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import Permission
+from django.db import connection
 from django.shortcuts import reverse
+from django.test.utils import CaptureQueriesContext
 from django.utils import timezone
 from termsandconditions.models import TermsAndConditions
 from topobank.testing.utils import assert_in_content
 
+from ce_ui import anonymous
+
 #
 # The code in this library relies on a middleware which replaces
 # Django's AnonymousUser by our own anonymous user (that has a database id)
@@ -30,3 +36,57 @@ def test_terms_conditions_as_anonymous(
         reverse("tc_accept_specific_page", kwargs=dict(slug="test-terms"))
     )
     assert_in_content(response, "some text")
+
+
+def user_queries(queries):
+    table = get_user_model()._meta.db_table
+    return [q["sql"] for q in queries.captured_queries if f'"{table}"' in q["sql"]]
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("url", [reverse("home"), reverse("ce_ui:select")])
+def test_anonymous_page_loads_do_not_look_up_the_anonymous_user(client, orcid_socialapp, url):
+    assert client.get(url).status_code == 200
+
+    with CaptureQueriesContext(connection) as queries:
+        for _ in range(3):
+            assert client.get(url).status_code == 200
+    assert user_queries(queries) == []
+
+
+@pytest.mark.django_db
+def test_every_request_gets_its_own_anonymous_user(django_assert_num_queries):
+    anonymous.get_anonymous_user()
+
+    with django_assert_num_queries(0):
+        user1, user2 = anonymous.get_anonymous_user(), anonymous.get_anonymous_user()
+        assert user1 == user2 and user1 is not user2
+        assert user1.pk == anonymous.anonymous_user_id()
+        user1.get_all_permissions()
+
+
+@pytest.mark.django_db
+def test_changes_of_the_anonymous_user_invalidate_the_cache():
+    user = anonymous.get_anonymous_user()
+    permission = Permission.objects.get(codename="can_skip_terms")
+    assert not user.has_perm(f"{permission.content_type.app_label}.{permission.codename}")
+
+    user.user_permissions.add(permission)
+    user = anonymous.get_anonymous_user()
+    assert user.has_perm(f"{permission.content_type.app_label}.{permission.codename}")
+
+    user.first_name = "Anonymous"
+    user.save()
+    assert anonymous.get_anonymous_user().first_name == "Anonymous"
+
+
+@pytest.mark.django_db
+def test_other_processes_reload_after_the_check_interval(monkeypatch):
+    user = anonymous.get_anonymous_user()
+    type(user).objects.filter(pk=user.pk).update(first_name="Changed elsewhere")
+    # Another process invalidated the cache: only the shared version changed
+    anonymous.cache.set(anonymous.VERSION_KEY, "changed elsewhere", None)
+    assert anonymous.get_anonymous_user().first_name != "Changed elsewhere"
+
+    monkeypatch.setattr(anonymous, "CHECK_INTERVAL", 0)
+    assert anonymous.get_anonymous_user().first_name == "Changed elsewhere"
@@ -0,0 +1,75 @@
+"""Tests for the prebuilt OpenAPI schema, `ce_ui.api_schema`."""
+
+import gzip
+import json
+
+import pytest
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.urls import reverse
+
+from ce_ui import api_schema
+
+
+@pytest.fixture
+def static_root(settings, tmp_path):
+    settings.STATIC_ROOT = str(tmp_path)
+    settings.STORAGES = {**settings.STORAGES, "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"}}
+    api_schema.snapshot.cache_clear()
+    yield tmp_path
+    api_schema.snapshot.cache_clear()
+
+
+@pytest.fixture
+def collected(static_root):
+    (static_root / "api").mkdir()
+    (static_root / "api" / "schema.yaml").write_text("openapi: 3.0.3\n")
+    (static_root / "api" / "schema.json").write_text('{"openapi": "3.0.3"}')
+    return static_root
+
+
+@pytest.fixture
+def generated(monkeypatch):
+    """Requests that fell back to generating the schema."""
+    requests = []
+    monkeypatch.setattr(api_schema, "_fallback", lambda request: requests.append(request) or HttpResponse("generated"))
+    return requests
+
+
+@pytest.mark.django_db
+def test_snapshot_is_served_with_etag(client, collected, generated):
+    response = client.get(reverse("schema"))
+    assert response.status_code == 200
+    assert response["Content-Type"] == "application/vnd.oai.openapi"
+    assert response.content == b"openapi: 3.0.3\n"
+
+    response = client.get(reverse("schema"), HTTP_IF_NONE_MATCH=response["ETag"])
+    assert response.status_code == 304
+    assert generated == []
+
+
+@pytest.mark.django_db
+def test_snapshot_is_served_in_the_format_asked_for(client, collected, generated):
+    response = client.get(reverse("schema"), {"format": "json"}, HTTP_ACCEPT_ENCODING="gzip, br")
+    assert response["Content-Encoding"] == "gzip"
+    assert json.loads(gzip.decompress(response.content)) == {"openapi": "3.0.3"}
+
+    etag = response["ETag"]
+    response = client.get(reverse("schema"), HTTP_ACCEPT="application/json")
+    assert response["Content-Type"] == "application/vnd.oai.openapi+json"
+    assert response["ETag"] != etag
+
+
+@pytest.mark.django_db
+def test_schema_is_generated_without_snapshot(client, static_root, generated):
+    assert client.get(reverse("schema")).content == b"generated"
+    assert len(generated) == 1
+
+
+@pytest.mark.django_db
+def test_build_writes_both_formats(tmp_path):
+    call_command("build_api_schema", root=str(tmp_path))
+
+    assert json.loads((tmp_path / "schema.json").read_text())["openapi"].startswith("3.")
+    assert (tmp_path / "schema.yaml").read_text().startswith("openapi: 3.")
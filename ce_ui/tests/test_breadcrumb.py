@@ -2,14 +2,14 @@
 
 The interesting part is `add_topography`, which links to the previous and next
 measurement of the *same* dataset so that they can be stepped through from the
-detail page.
+detail page, from the cached order of `ce_ui.measurement_order`.
 """
 
 import pytest
 from django.urls import reverse
 from topobank.testing.factories import SurfaceFactory, Topography1DFactory
 
-from ce_ui import breadcrumb
+from ce_ui import breadcrumb, measurement_order
 
 
 def titles(context):
@@ -116,3 +116,41 @@ def test_neighbours_never_come_from_another_dataset():
     assert tab["href_next"] == reverse(
         "ce_ui:topography-detail", kwargs={"pk": second.pk}
     )
+
+
+@pytest.mark.django_db
+def test_measurement_tab_shows_position_within_dataset():
+    surface = SurfaceFactory()
+    topographies = [Topography1DFactory(surface=surface) for _ in range(4)]
+    context = {}
+
+    breadcrumb.add_topography(context, topographies[2])
+
+    (tab,) = context["extra_tabs"]
+    assert (tab["index"], tab["count"]) == (3, 4)
+    assert "measurement 3 of 4" in tab["tooltip"]
+
+
+@pytest.mark.django_db
+def test_stepping_through_a_dataset_queries_its_order_once(django_assert_num_queries):
+    surface = SurfaceFactory()
+    topographies = [Topography1DFactory(surface=surface) for _ in range(5)]
+    measurement_order.invalidate(surface.pk)
+
+    with django_assert_num_queries(1):
+        for topography in topographies:
+            breadcrumb.add_topography({}, topography)
+
+
+@pytest.mark.django_db
+def test_order_follows_added_and_deleted_measurements():
+    surface = SurfaceFactory()
+    first, second = Topography1DFactory(surface=surface), Topography1DFactory(surface=surface)
+    assert measurement_order.position(first) == (1, 2, None, second.pk)
+
+    third = Topography1DFactory(surface=surface)
+    assert measurement_order.position(second) == (2, 3, first.pk, third.pk)
+
+    second.delete()
+    assert measurement_order.position(first) == (1, 2, None, third.pk)
+    assert measurement_order.position(third) == (2, 2, first.pk, None)
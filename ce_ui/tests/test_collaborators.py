@@ -0,0 +1,59 @@
+"""Tests for the collaborator check, `ce_ui.collaborators`."""
+
+import pytest
+from django.contrib.auth.models import Permission
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from topobank.authorization.models import UserPermission
+from topobank.manager.models import Surface
+from topobank.testing.factories import SurfaceFactory, UserFactory
+
+from ce_ui.collaborators import users_share_dataset
+from ce_ui.models import SurfaceVisibility
+
+
+def dataset_queries(queries):
+    """Queries on datasets or their visibility; the anonymous user may
+    need looking up in addition."""
+    tables = [f'"{model._meta.db_table}"' for model in (Surface, SurfaceVisibility)]
+    return [q["sql"] for q in queries.captured_queries if any(table in q["sql"] for table in tables)]
+
+
+@pytest.mark.django_db
+def test_check_is_one_query():
+    user1, user2 = UserFactory(), UserFactory()
+    SurfaceFactory(created_by=user1).permissions.grant_for_user(user2, "view")
+
+    with CaptureQueriesContext(connection) as queries:
+        assert users_share_dataset(user1, user2)
+    assert len(dataset_queries(queries)) == 1
+
+
+@pytest.mark.django_db
+def test_check_follows_permission_changes():
+    user1, user2 = UserFactory(), UserFactory()
+    surface = SurfaceFactory(created_by=user1)
+    assert not users_share_dataset(user1, user2)
+
+    surface.permissions.grant_for_user(user2, "view")
+    assert users_share_dataset(user1, user2)
+
+    UserPermission.objects.filter(parent=surface.permissions, user=user2).delete()
+    assert not users_share_dataset(user1, user2)
+
+
+@pytest.mark.django_db
+def test_profile_is_looked_up_once(client, handle_usage_statistics):
+    user1, user2 = UserFactory(), UserFactory()
+    skip_terms = Permission.objects.get(codename="can_skip_terms")
+    for user in (user1, user2):
+        user.user_permissions.add(skip_terms)
+    SurfaceFactory(created_by=user1).permissions.grant_for_user(user2, "view")
+    client.force_login(user1)
+    url = reverse("ce_ui:user-detail", kwargs={"username": user2.username})
+
+    with CaptureQueriesContext(connection) as queries:
+        assert client.get(url).status_code == 200
+    lookups = [q for q in queries.captured_queries if f"'{user2.username}'" in q["sql"]]
+    assert len(lookups) == 1
@@ -0,0 +1,79 @@
+"""Tests for the supported file formats page, `ce_ui.file_formats`."""
+
+import pytest
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.auth.models import Permission
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.urls import reverse
+from topobank.testing.factories import UserFactory
+
+from ce_ui import file_formats
+
+
+@pytest.fixture
+def counted_reader_infos(monkeypatch):
+    """Count the calls of topobank's `get_reader_infos`, with a fresh cache."""
+    calls = []
+
+    def get_reader_infos():
+        calls.append(None)
+        return [("Example reader", "example", "<p>An <em>example</em> format.</p>")]
+
+    monkeypatch.setattr("topobank.manager.utils.get_reader_infos", get_reader_infos)
+    monkeypatch.setattr(file_formats, "surface_topography_version", lambda: f"test-{id(calls)}")
+    file_formats.reader_infos.cache_clear()
+    yield calls
+    file_formats.reader_infos.cache_clear()
+
+
+@pytest.mark.django_db
+def test_readers_are_listed_once_per_process(client, orcid_socialapp, counted_reader_infos):
+    for _ in range(3):
+        response = client.get(reverse("file-formats"))
+        assert response.status_code == 200
+        assert b"<em>example</em>" in response.content
+
+    assert len(counted_reader_infos) == 1
+
+
+@pytest.mark.django_db
+def test_page_is_revalidated_by_etag(client, orcid_socialapp, counted_reader_infos):
+    # Sets the CSRF cookie
+    client.get(reverse("file-formats"))
+    response = client.get(reverse("file-formats"))
+    etag = response["ETag"]
+    assert "no-cache" in response["Cache-Control"]
+
+    response = client.get(reverse("file-formats"), HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 304
+    assert "private" in response["Cache-Control"]
+
+    # The page embeds a CSRF token
+    client.cookies[settings.CSRF_COOKIE_NAME] = "a" * 32
+    response = client.get(reverse("file-formats"), HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    etag = response["ETag"]
+
+    # The page shows the signed-in user
+    user = UserFactory()
+    user.user_permissions.add(Permission.objects.get(codename="can_skip_terms"))
+    client.force_login(user)
+    response = client.get(reverse("file-formats"), HTTP_IF_NONE_MATCH=etag)
+    assert response.status_code == 200
+    assert response["ETag"] != etag
+
+
+@pytest.mark.django_db
+def test_etag_changes_with_the_profile_and_messages(rf, counted_reader_infos):
+    user = UserFactory(is_staff=False)
+    request = rf.get(reverse("file-formats"))
+    request.user = user
+    request._messages = CookieStorage(request)
+    etag = file_formats.etag(request)
+
+    user.is_staff = True
+    assert file_formats.etag(request) != etag
+
+    messages.info(request, "Welcome back")
+    assert file_formats.etag(request) is None
@@ -0,0 +1,34 @@
+import pytest
+from django.core.management import call_command
+from topobank.manager.models import Surface, Topography
+
+from ce_ui.management.commands.generate_synthetic_data import \
+    SYNTHETIC_USERNAME_PREFIX
+
+
+def synthetic_surfaces():
+    return Surface.objects.filter(created_by__username__startswith=SYNTHETIC_USERNAME_PREFIX)
+
+
+@pytest.mark.django_db
+def test_generates_accessible_datasets():
+    call_command("generate_synthetic_data", users=3, surfaces=20, measurements=2, seed=1)
+
+    surfaces = synthetic_surfaces()
+    assert surfaces.count() == 20
+    assert Topography.objects.filter(surface__in=surfaces).count() >= 20
+    # Bulk creation bypasses `Surface.save`, so the command grants access itself
+    for surface in surfaces:
+        assert surface.has_permission(surface.created_by, "full")
+        assert surface.properties.count() == 3
+
+
+@pytest.mark.django_db
+def test_seed_makes_runs_reproducible_and_clear_removes_them():
+    call_command("generate_synthetic_data", users=2, surfaces=10, seed=7)
+    first = list(synthetic_surfaces().order_by("name").values_list("category", flat=True))
+
+    call_command("generate_synthetic_data", users=2, surfaces=10, seed=7, clear=True)
+    second = list(synthetic_surfaces().order_by("name").values_list("category", flat=True))
+
+    assert first == second
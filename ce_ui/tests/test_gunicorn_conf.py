@@ -0,0 +1,89 @@
+"""Tests for the hooks of the packaged gunicorn configuration."""
+
+import importlib
+import logging
+import signal
+import threading
+from types import SimpleNamespace
+
+import pytest
+from django.core.cache import caches
+from django.core.files.storage import storages
+from django.db import connections
+
+from ce_ui import gunicorn_conf
+
+MiB = 1024 * 1024
+
+
+@pytest.fixture
+def worker():
+    return SimpleNamespace(
+        pid=1234, age=1, alive=True, forked_at=0.0, log=logging.getLogger("gunicorn.error")
+    )
+
+
+def test_worker_is_recycled_above_max_rss(worker, monkeypatch, caplog):
+    monkeypatch.setattr(gunicorn_conf, "max_worker_rss", 100)
+    worker.nb_requests = 0
+
+    monkeypatch.setattr(gunicorn_conf, "rss", lambda: 99 * MiB)
+    gunicorn_conf.post_request(worker, None, {}, None)
+    assert worker.alive
+
+    monkeypatch.setattr(gunicorn_conf, "rss", lambda: 101 * MiB)
+    with caplog.at_level(logging.INFO, logger="gunicorn.error"):
+        gunicorn_conf.post_request(worker, None, {}, None)
+    assert not worker.alive
+    assert worker.nb_requests == 2
+    assert "event=worker_recycled pid=1234 rss_mib=101.0 max_rss_mib=100 requests=2" in caplog.text
+
+
+def test_recycling_can_be_turned_off(worker, monkeypatch):
+    monkeypatch.setattr(gunicorn_conf, "max_worker_rss", 0)
+    monkeypatch.setattr(gunicorn_conf, "rss", lambda: 10_000 * MiB)
+    worker.nb_requests = 0
+    gunicorn_conf.post_request(worker, None, {}, None)
+    assert worker.alive
+
+
+def test_worker_is_recycled_by_the_background_check(worker, monkeypatch):
+    # uvicorn's worker never calls `post_request`
+    monkeypatch.setattr(gunicorn_conf, "max_worker_rss", 100)
+    monkeypatch.setattr(gunicorn_conf, "rss_check_interval", 0)
+    monkeypatch.setattr(gunicorn_conf, "rss", lambda: 101 * MiB)
+    signals = []
+    monkeypatch.setattr(gunicorn_conf.os, "kill", lambda pid, sig: signals.append(sig))
+    worker.nb_requests = 0
+
+    gunicorn_conf._watch_rss(worker)
+
+    assert not worker.alive
+    assert signals == [signal.SIGTERM]
+
+
+def test_inherited_clients_are_dropped(monkeypatch):
+    # Leave the test database connection alone
+    monkeypatch.setattr(connections, "all", lambda initialized_only=False: [])
+    storage = SimpleNamespace(_connections=threading.local(), _bucket=object())
+    storage._connections.connection = object()
+    monkeypatch.setitem(storages._storages, "s3", storage)
+    cache = caches["default"]
+    monkeypatch.setattr(cache, "_client", SimpleNamespace(_clients=[object(), object()]), raising=False)
+
+    gunicorn_conf._reset_connections()
+
+    assert getattr(storage._connections, "connection", None) is None
+    assert storage._bucket is None
+    assert cache._client._clients == [None, None]
+
+
+@pytest.mark.parametrize("worker_class, preloaded", [("gevent", False), ("sync", True)])
+def test_gevent_workers_are_not_preloaded_by_default(monkeypatch, worker_class, preloaded):
+    monkeypatch.setenv("GUNICORN_WORKER_CLASS", worker_class)
+    monkeypatch.delenv("GUNICORN_PRELOAD_APP", raising=False)
+    try:
+        assert importlib.reload(gunicorn_conf).preload_app is preloaded
+    finally:
+        monkeypatch.undo()
+        importlib.reload(gunicorn_conf)
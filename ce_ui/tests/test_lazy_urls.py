@@ -0,0 +1,50 @@
+"""Tests for the deferred imports of the URL configuration, see `ce_ui.lazy`."""
+
+import json
+import subprocess
+import sys
+
+import pytest
+import topobank_contact.urls
+import topobank_publication.urls
+import topobank_statistics.urls
+from django.urls import resolve, reverse
+
+from ce_ui import urls
+
+#: Modules that importing the URL configuration must not import
+DEFERRED_MODULES = [
+    "drf_spectacular.views",
+    "notifications.urls",
+    "topobank_contact.urls",
+    "topobank_publication.urls",
+    "topobank_statistics.urls",
+]
+
+
+@pytest.mark.parametrize(
+    "prefix, module",
+    [
+        (urls.CONTACT_URL_PREFIX, topobank_contact.urls),
+        (urls.PUBLICATION_URL_PREFIX, topobank_publication.urls),
+        (urls.STATISTICS_URL_PREFIX, topobank_statistics.urls),
+    ],
+)
+def test_plugin_prefixes_agree_with_plugins(prefix, module):
+    assert prefix == module.urlprefix
+
+
+def test_url_configuration_does_not_import_deferred_modules():
+    code = (
+        "import json, sys, django; django.setup(); import ce_ui.urls; "
+        f"print(json.dumps([m for m in {DEFERRED_MODULES!r} if m in sys.modules]))"
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    ).stdout
+    assert json.loads(output) == []
+
+
+def test_lazy_routes_resolve():
+    assert resolve(reverse("swagger-ui")).func.__name__ == "SpectacularSwaggerView"
+    assert reverse("notifications:unread").startswith("/inbox/notifications/")
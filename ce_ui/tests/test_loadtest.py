@@ -0,0 +1,85 @@
+"""Tests for the traffic replay against a stand-in server."""
+
+import datetime
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+from django.utils import timezone
+
+from ce_ui.loadtest import Endpoint, percentile, profiled_weights, replay
+from ce_ui.profiling import store_sampling_rate
+from ce_ui.tests.test_partitioning import make_record
+
+
+class Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        self.send_response(500 if self.path.startswith("/fail") else 200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    thread.join()
+
+
+def test_replay_reports_throughput_latencies_and_errors(server):
+    endpoints = [Endpoint("ok", ["/ok/1", "/ok/2"], 3), Endpoint("fail", ["/fail"], 1)]
+
+    report = replay(server, endpoints, clients=4, duration=0.5, seed=1)
+
+    rows = {row["endpoint"]: row for row in report.rows()}
+    assert rows["total"]["requests"] == rows["ok"]["requests"] + rows["fail"]["requests"] > 0
+    # Roughly the weights; the exact split depends on the timing
+    assert rows["ok"]["requests"] > rows["fail"]["requests"]
+    assert rows["ok"]["error_rate"] == 0
+    assert rows["fail"]["error_rate"] == 1
+    assert 0 < rows["ok"]["p50"] <= rows["ok"]["p99"]
+    assert "requests in" in report.format()
+
+
+def test_percentile_is_nearest_rank():
+    values = list(range(1, 101))
+    assert percentile(values, 50) == 50
+    assert percentile(values, 99) == 99
+    assert percentile([3.0], 95) == 3.0
+    assert percentile([], 50) is None
+
+
+@pytest.mark.django_db
+def test_weights_follow_profiled_traffic(settings):
+    settings.REQUEST_PROFILER_SAMPLING_RATES = {"/inbox/notifications/": 0.0, "/analysis/api/": 0.01}
+    now = timezone.now()
+    for _ in range(3):
+        make_record(now)  # /ui/dataset-list/
+    sampled = make_record(now)
+    sampled.request_uri = "/analysis/api/card/series/test?subjects=e30="
+    sampled.save()
+    sampled.sampling_rate = 0.01
+    store_sampling_rate(sampled)
+    endpoints = [
+        Endpoint("dataset list", ["/ui/dataset-list/"], 1),
+        Endpoint("analysis card", ["/analysis/api/card/series/test"], 1, prefix="/analysis/api/card/"),
+        Endpoint("dataset detail", ["/ui/dataset-detail/1/"], 1),
+        Endpoint("notification poll", ["/inbox/notifications/api/unread_list/"], 2),
+    ]
+
+    profiled_weights(endpoints, now - datetime.timedelta(days=1))
+
+    # Never profiled, so it keeps its share of the default mix
+    assert endpoints[3].weight == pytest.approx(2 / 5)
+    # The sampled record stands for 100 requests
+    assert endpoints[0].weight == pytest.approx(3 / 5 * 3 / 103)
+    assert endpoints[1].weight == pytest.approx(3 / 5 * 100 / 103)
+    # Not profiled in the period, but still exercised
+    assert endpoints[2].weight > 0
@@ -0,0 +1,106 @@
+"""Tests for the daily partitions of the request profiler's table.
+
+Retention drops whole partitions instead of deleting rows. These tests check
+that expired records go with their partition, that recent ones stay, and that a
+record for which no partition existed yet is not lost.
+"""
+
+import datetime
+
+import pytest
+from django.db import connection
+from django.utils import timezone
+from request_profiler.models import ProfilingRecord
+
+from ce_ui import partitioning
+
+
+def make_record(start_ts):
+    record = ProfilingRecord(
+        start_ts=start_ts,
+        end_ts=start_ts,
+        duration=0.1,
+        http_method="GET",
+        request_uri="/ui/dataset-list/",
+        remote_addr="127.0.0.1",
+        http_user_agent="",
+        view_func_name="DataSetListView",
+        response_status_code=200,
+        response_content_length=0,
+    )
+    record.save()
+    # Django's foreign keys are checked at the end of the transaction, which a
+    # test never reaches, and Postgres refuses to drop a partition while checks
+    # on it are pending
+    with connection.cursor() as cursor:
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+    return record
+
+
+def partition_of(record):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT tableoid::regclass::text FROM {partitioning.TABLE} WHERE id = %s",
+            [record.pk],
+        )
+        return cursor.fetchone()[0]
+
+
+@pytest.fixture
+def partitions():
+    with connection.cursor() as cursor:
+        return partitioning.existing_partitions(cursor)
+
+
+@pytest.mark.django_db
+def test_table_is_partitioned_by_day(partitions, settings):
+    with connection.cursor() as cursor:
+        assert partitioning.is_partitioned(cursor)
+
+    today = partitioning.today()
+    # The migration creates the retention window and the days ahead
+    assert today in partitions
+    assert today + datetime.timedelta(days=settings.REQUEST_PROFILER_PARTITIONS_AHEAD) in partitions
+
+    record = make_record(timezone.now())
+    assert partition_of(record) == partitioning.partition_name(today)
+
+
+@pytest.mark.django_db
+def test_retention_drops_expired_partitions(partitions, settings):
+    settings.REQUEST_PROFILER_LOG_TRUNCATION_DAYS = 30
+    now = timezone.now()
+    old = make_record(now - datetime.timedelta(days=10))
+    recent = make_record(now)
+
+    # Pretend the run happens 30 days from now: only today is left in the window
+    created, dropped = partitioning.maintain_partitions(
+        partitioning.today() + datetime.timedelta(days=30)
+    )
+
+    assert partitioning.partition_name(timezone.localdate(old.start_ts)) in dropped
+    assert not ProfilingRecord.objects.filter(pk=old.pk).exists()
+    assert ProfilingRecord.objects.filter(pk=recent.pk).exists()
+    assert created
+
+
+@pytest.mark.django_db
+def test_records_without_partition_are_moved_once_it_exists(settings):
+    settings.REQUEST_PROFILER_LOG_TRUNCATION_DAYS = 0  # keep everything
+    day = partitioning.today() + datetime.timedelta(days=100)
+    start_ts = timezone.make_aware(datetime.datetime.combine(day, datetime.time(12)))
+
+    record = make_record(start_ts)
+    assert partition_of(record) == partitioning.DEFAULT_PARTITION
+
+    created, dropped = partitioning.maintain_partitions(day)
+
+    assert partitioning.partition_name(day) in created
+    assert dropped == []
+    assert partition_of(record) == partitioning.partition_name(day)
+
+
+@pytest.mark.django_db
+def test_maintenance_is_idempotent():
+    partitioning.maintain_partitions()
+    assert partitioning.maintain_partitions() == ([], [])
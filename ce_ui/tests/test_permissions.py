@@ -0,0 +1,98 @@
+"""Tests for the request-scoped memo of permission levels, `ce_ui.permissions`."""
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from topobank.authorization.models import UserPermission
+from topobank.manager.models import Surface
+from topobank.testing.factories import (SurfaceFactory, Topography1DFactory,
+                                        UserFactory)
+
+from ce_ui import permissions
+from ce_ui.permissions import PermissionMemoMiddleware
+
+
+def in_request(rf, func):
+    """Call `func` as if it were a view, with the memo of a request."""
+    return PermissionMemoMiddleware(lambda request: func())(rf.get("/"))
+
+
+def user_permission_queries(queries):
+    table = UserPermission._meta.db_table
+    return [q["sql"] for q in queries if f'"{table}"' in q["sql"]]
+
+
+@pytest.mark.django_db
+def test_repeated_checks_are_answered_from_memory(rf, django_assert_num_queries):
+    owner, other = UserFactory(), UserFactory()
+    surface = Surface.objects.select_related("permissions").get(pk=SurfaceFactory(created_by=owner).pk)
+
+    def check():
+        assert surface.has_permission(owner, "full")
+        assert not surface.has_permission(other, "view")
+        with django_assert_num_queries(0):
+            assert surface.has_permission(owner, "full")
+            assert surface.has_permission(owner, "view")
+            assert not surface.has_permission(other, "view")
+
+    in_request(rf, check)
+
+
+@pytest.mark.django_db
+def test_prefetched_permissions_are_not_queried(rf):
+    owner = UserFactory()
+    SurfaceFactory(created_by=owner)
+    SurfaceFactory(created_by=owner)
+    SurfaceFactory()
+    surfaces = list(
+        Surface.objects.select_related("permissions").prefetch_related("permissions__user_permissions__user")
+    )
+
+    def check():
+        with CaptureQueriesContext(connection) as queries:
+            permissions.prime(owner, surfaces)
+            assert sorted(s.has_permission(owner, "full") for s in surfaces) == [False, True, True]
+        assert user_permission_queries(queries.captured_queries) == []
+
+    in_request(rf, check)
+
+
+@pytest.mark.django_db
+def test_priming_resolves_many_objects_at_once(rf):
+    owner = UserFactory()
+    surfaces = [SurfaceFactory(created_by=owner) for _ in range(3)]
+    topographies = [Topography1DFactory(surface=surface) for surface in surfaces]
+
+    def check():
+        with CaptureQueriesContext(connection) as queries:
+            permissions.prime(owner, [*surfaces, *topographies])
+        assert len(user_permission_queries(queries.captured_queries)) == 1
+        with CaptureQueriesContext(connection) as queries:
+            assert all(t.has_permission(owner, "view") for t in topographies)
+        assert user_permission_queries(queries.captured_queries) == []
+
+    in_request(rf, check)
+
+
+@pytest.mark.django_db
+def test_changes_during_request_evict_memo(rf):
+    owner, other = UserFactory(), UserFactory()
+    surface = SurfaceFactory(created_by=owner)
+
+    def check():
+        assert not surface.has_permission(other, "view")
+        surface.permissions.grant_for_user(other, "view")
+        assert surface.has_permission(other, "view")
+        UserPermission.objects.filter(parent=surface.permissions, user=other).delete()
+        assert not surface.has_permission(other, "view")
+
+    in_request(rf, check)
+
+
+@pytest.mark.django_db
+def test_no_memo_outside_of_requests():
+    owner = UserFactory()
+    surface = SurfaceFactory(created_by=owner)
+    assert surface.has_permission(owner, "view")
+    surface.permissions.user_permissions.all().delete()
+    assert not surface.has_permission(owner, "view")
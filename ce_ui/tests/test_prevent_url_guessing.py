@@ -3,7 +3,7 @@ from django.contrib.auth.models import Permission
 from django.urls import reverse
 from topobank.testing.factories import SurfaceFactory
 
-from ce_ui.views import _users_share_dataset
+from ce_ui.collaborators import users_share_dataset
 
 
 @pytest.mark.django_db
@@ -24,7 +24,7 @@ def test_sharing_profile(client, django_user_model, handle_usage_statistics):
     #
     # both users don't share anything, so they can't see each others profiles
     #
-    assert not _users_share_dataset(user1, user2)
+    assert not users_share_dataset(user1, user2)
 
     response = client.get(reverse('ce_ui:user-detail', kwargs={'username': 'testuser2'}))  # other user!!
     assert response.status_code == 403  # Forbidden
@@ -33,6 +33,6 @@ def test_sharing_profile(client, django_user_model, handle_usage_statistics):
     surface = SurfaceFactory(created_by=user1)
     surface.permissions.grant_for_user(user2, "view")
 
-    assert _users_share_dataset(user1, user2)
+    assert users_share_dataset(user1, user2)
     response = client.get(reverse('ce_ui:user-detail', kwargs={'username': 'testuser2'}))
     assert response.status_code == 200  # Allowed
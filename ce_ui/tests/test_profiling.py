@@ -0,0 +1,98 @@
+"""Tests for sampling of the request profiler.
+
+Profiling every request grew the profiling table to a gigabyte. These tests
+check which requests are kept, and that a kept record carries the probability it
+was kept with, which is what lets aggregates be reweighted.
+"""
+
+import pytest
+from django.db import connection
+from request_profiler.models import ProfilingRecord
+
+from ce_ui import profiling
+
+RATES = {
+    "/watchman/": 0.0,
+    "/analysis/api/": 0.01,
+    "/analysis/api/workflow/": 0.5,
+}
+
+
+@pytest.fixture
+def sampling(settings):
+    settings.REQUEST_PROFILER_SAMPLING_RATES = RATES
+    settings.REQUEST_PROFILER_DEFAULT_SAMPLING_RATE = 0.05
+    settings.REQUEST_PROFILER_SLOW_REQUEST_THRESHOLD = 1.0
+    return settings
+
+
+def profiled_request(rf, path, elapsed, mocker):
+    """A request carrying a running profiler that reports `elapsed` seconds."""
+    request = rf.get(path)
+    request.profiler = ProfilingRecord().start()
+    mocker.patch.object(
+        ProfilingRecord, "elapsed", new_callable=mocker.PropertyMock, return_value=elapsed
+    )
+    return request
+
+
+@pytest.mark.parametrize(
+    "path,rate",
+    [
+        ("/watchman/", 0.0),
+        ("/analysis/api/card/1/", 0.01),
+        # The longest matching prefix wins
+        ("/analysis/api/workflow/roughness/", 0.5),
+        ("/ui/dataset-list/", 0.05),
+    ],
+)
+def test_rate_of_the_longest_matching_prefix(sampling, path, rate):
+    assert profiling.sampling_rate(path) == rate
+
+
+@pytest.mark.django_db
+def test_health_checks_are_never_profiled(sampling, rf, mocker):
+    mocker.patch("ce_ui.profiling.random.random", return_value=0.0)
+    # ...not even when they are slow
+    request = profiled_request(rf, "/watchman/", 10.0, mocker)
+    assert not profiling.should_profile(request)
+
+
+@pytest.mark.django_db
+def test_slow_requests_are_always_profiled(sampling, rf, mocker):
+    mocker.patch("ce_ui.profiling.random.random", return_value=0.99)
+    request = profiled_request(rf, "/analysis/api/card/1/", 2.0, mocker)
+
+    assert profiling.should_profile(request)
+    assert request.profiler.sampling_rate == 1.0
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("draw,kept", [(0.04, True), (0.06, False)])
+def test_other_requests_are_sampled(sampling, rf, mocker, draw, kept):
+    mocker.patch("ce_ui.profiling.random.random", return_value=draw)
+    request = profiled_request(rf, "/ui/dataset-list/", 0.1, mocker)
+
+    assert profiling.should_profile(request) is kept
+    if kept:
+        assert request.profiler.sampling_rate == 0.05
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("rate", [1.0, 0.05])
+def test_sampling_rate_is_stored_on_the_record(rf, rate):
+    record = ProfilingRecord().start()
+    record.process_request(rf.get("/ui/dataset-list/"))
+    record.view_func_name = "DataSetListView"
+    record.response_status_code = 200
+    record.response_content_length = 0
+    record.sampling_rate = rate
+    record.capture()
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT sampling_rate FROM request_profiler_profilingrecord WHERE id = %s",
+            [record.pk],
+        )
+        ((stored,),) = cursor.fetchall()
+    assert stored == rate
@@ -0,0 +1,169 @@
+"""
+Query budget of the pages: the number of queries must not grow with the size of
+the dataset being looked at.
+
+Every page of `ce_ui.views` is rendered for a dataset of 1, 10 and 100
+measurements, and must issue the same number of queries for each. A page that
+does not has an N+1 problem somewhere; the failure report lists the origins of
+the queries whose number grew -- the serializer field being serialized when
+they were issued, or else the line of ce_ui or topobank code that issued them.
+
+The same check up to 1000 measurements takes minutes and is marked `slow`: it
+is deselected by default (see `pytest.ini`), and CI runs it on its own with
+`-m slow`.
+
+The dataset is grown in place from one size to the next, since creating the
+measurements is what makes this test slow, and every page is requested twice
+per size: the first request warms the caches (content types, sites, presigned
+URLs), and only the second one is counted.
+"""
+
+import pytest
+from django.contrib.auth.models import Permission
+from django.urls import reverse
+from topobank.manager.utils import subjects_to_base64
+from topobank.testing.factories import (SurfaceFactory, Topography1DFactory,
+                                        UserFactory)
+
+from ce_ui import selections
+from ce_ui.tests.utils import queries_by_origin
+
+SIZES = [1, 10, 100]
+
+#: Sizes of the `slow` check
+SLOW_SIZES = SIZES + [1000]
+
+#: Registered by the repository's `conftest.py`.
+WORKFLOW = "topobank.testing.test"
+
+#: Page name and function returning its URL for the dataset (see `Dataset`).
+#: `DatasetCollectionView` is missing: a collection needs published datasets,
+#: which need the publication backend. Saving a selection is a POST and is
+#: covered by the pages that take its handle instead.
+PAGES = [
+    ("ce_ui:home", lambda d: reverse("ce_ui:home")),
+    ("ce_ui:select", lambda d: reverse("ce_ui:select")),
+    ("ce_ui:collections", lambda d: reverse("ce_ui:collections")),
+    (
+        "ce_ui:surface-detail",
+        lambda d: reverse("ce_ui:surface-detail", kwargs={"pk": d.surface.pk}),
+    ),
+    (
+        "ce_ui:topography-detail",
+        # In the middle, so there is a previous and a next measurement
+        lambda d: reverse(
+            "ce_ui:topography-detail",
+            kwargs={"pk": d.topographies[len(d.topographies) // 2].pk},
+        ),
+    ),
+    (
+        "ce_ui:dataset-publish",
+        lambda d: reverse("ce_ui:dataset-publish", kwargs={"pk": d.surface.pk}),
+    ),
+    ("ce_ui:dataset-collection-publish", lambda d: reverse("ce_ui:dataset-collection-publish")),
+    (
+        "ce_ui:results-list",
+        lambda d: f"{reverse('ce_ui:results-list')}?subjects={subjects_to_base64(d.topographies)}",
+    ),
+    (
+        "ce_ui:results-detail",
+        lambda d: f"{reverse('ce_ui:results-detail', kwargs={'slug': WORKFLOW})}"
+        f"?subjects={subjects_to_base64(d.topographies)}",
+    ),
+    (
+        "ce_ui:results-list?selection",
+        lambda d: f"{reverse('ce_ui:results-list')}?selection={d.selection()}",
+    ),
+    (
+        "ce_ui:results-detail?selection",
+        lambda d: f"{reverse('ce_ui:results-detail', kwargs={'slug': WORKFLOW})}?selection={d.selection()}",
+    ),
+    (
+        "ce_ui:selection-detail",
+        lambda d: reverse("ce_ui:selection-detail", kwargs={"handle": d.selection()}),
+    ),
+    ("manager-statistics", lambda d: reverse("manager-statistics")),
+    ("analysis-statistics", lambda d: reverse("analysis-statistics")),
+    ("ce_ui:staff-users", lambda d: reverse("ce_ui:staff-users")),
+    ("ce_ui:staff-tasks", lambda d: reverse("ce_ui:staff-tasks")),
+    ("ce_ui:staff-latency", lambda d: reverse("ce_ui:staff-latency")),
+    ("file-formats", lambda d: reverse("file-formats")),
+    ("terms", lambda d: reverse("terms")),
+    (
+        "ce_ui:user-detail",
+        lambda d: reverse("ce_ui:user-detail", kwargs={"username": d.collaborator.username}),
+    ),
+    ("ce_ui:user-redirect", lambda d: reverse("ce_ui:user-redirect")),
+    ("ce_ui:user-update", lambda d: reverse("ce_ui:user-update")),
+    ("ce_ui:account_email", lambda d: reverse("ce_ui:account_email")),
+]
+
+
+class Dataset:
+    """A dataset of the owner's, shared with a collaborator, that can grow."""
+
+    def __init__(self, owner, collaborator):
+        self.owner = owner
+        self.collaborator = collaborator
+        self.surface = SurfaceFactory(created_by=owner)
+        self.surface.grant_permission(collaborator, "view")
+        self.topographies = []
+
+    def grow_to(self, size):
+        while len(self.topographies) < size:
+            self.topographies.append(Topography1DFactory(surface=self.surface))
+
+    def selection(self):
+        """Handle of a saved selection of the measurements."""
+        return selections.save({"topography": [t.pk for t in self.topographies]})
+
+
+def report(page, counts):
+    """Explain which queries grew between the smallest and largest dataset."""
+    first, last = counts[0][1], counts[-1][1]
+    lines = [
+        f"{page} issues "
+        + ", ".join(f"{sum(c.values())} queries for {size}" for size, c in counts)
+        + " measurements. Origins of the additional queries:"
+    ]
+    for origin in sorted(last, key=lambda o: first[o] - last[o]):
+        if last[origin] > first[origin]:
+            lines.append(f"  {origin}: {first[origin]} -> {last[origin]}")
+    return "\n".join(lines)
+
+
+def check_query_budget(client, sizes):
+    """Fail with a `report` of every page whose query count grows over `sizes`."""
+    owner = UserFactory(username="query-budget", is_staff=True)
+    owner.user_permissions.add(Permission.objects.get(codename="can_skip_terms"))
+    dataset = Dataset(owner, UserFactory(username="query-budget-collaborator"))
+    client.force_login(owner)
+
+    counts = {page: [] for page, _ in PAGES}
+    for size in sizes:
+        dataset.grow_to(size)
+        for page, page_url in PAGES:
+            url = page_url(dataset)
+            client.get(url)
+            with queries_by_origin() as origins:
+                response = client.get(url)
+            assert response.status_code in (200, 302), page
+            counts[page].append((size, origins))
+
+    failures = [
+        report(page, page_counts)
+        for page, page_counts in counts.items()
+        if len({sum(c.values()) for _, c in page_counts}) > 1
+    ]
+    assert not failures, "\n\n".join(failures)
+
+
+@pytest.mark.django_db
+def test_query_count_is_constant_in_dataset_size(client, orcid_socialapp):
+    check_query_budget(client, SIZES)
+
+
+@pytest.mark.slow
+@pytest.mark.django_db
+def test_query_count_is_constant_up_to_large_datasets(client, orcid_socialapp):
+    check_query_budget(client, SLOW_SIZES)
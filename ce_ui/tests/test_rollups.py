@@ -0,0 +1,148 @@
+"""Tests for the hourly latency rollups and the sketch they are built on."""
+
+import datetime
+import random
+
+import pytest
+from django.utils import timezone
+
+from ce_ui.models import DailyLatencyRollup, LatencyRollup
+from ce_ui.profiling import store_sampling_rate
+from ce_ui.rollups import (delete_expired_rollups, latency_summary,
+                           rollup_hour, rollup_pending_hours)
+from ce_ui.sketch import DDSketch
+from ce_ui.tests.test_partitioning import make_record
+
+
+def exact_quantile(values, q):
+    values = sorted(values)
+    return values[max(0, int(q * len(values) + 0.5) - 1)]
+
+
+def test_sketch_quantiles_have_bounded_relative_error():
+    rng = random.Random(4)
+    values = [rng.lognormvariate(-3, 1) for _ in range(10000)]
+    sketch = DDSketch()
+    for value in values:
+        sketch.add(value)
+
+    assert sketch.count == len(values)
+    for q in (0.5, 0.95, 0.99):
+        exact = exact_quantile(values, q)
+        assert sketch.quantile(q) == pytest.approx(exact, rel=0.02)
+
+
+def test_merged_sketches_equal_sketch_of_all_values():
+    rng = random.Random(7)
+    values = [rng.expovariate(10) for _ in range(2000)]
+    first, second, both = DDSketch(), DDSketch(), DDSketch()
+    for i, value in enumerate(values):
+        (first if i % 2 else second).add(value)
+        both.add(value)
+
+    first.merge(DDSketch.from_dict(second.to_dict()))
+
+    for q in (0.5, 0.95, 0.99):
+        assert first.quantile(q) == both.quantile(q)
+
+
+def test_empty_sketch_has_no_quantiles():
+    assert DDSketch().quantile(0.5) is None
+
+
+def record_at(start_ts, duration, status_code=200, sampling_rate=1.0,
+              view_func_name="DataSetListView"):
+    record = make_record(start_ts)
+    record.duration = duration
+    record.response_status_code = status_code
+    record.view_func_name = view_func_name
+    record.save()
+    record.sampling_rate = sampling_rate
+    store_sampling_rate(record)
+    return record
+
+
+@pytest.mark.django_db
+def test_rollup_weights_records_by_inverse_sampling_rate():
+    hour = timezone.now().replace(minute=0, second=0, microsecond=0) - datetime.timedelta(hours=1)
+    # One slow request, always profiled, and one fast one sampled at 1 %
+    record_at(hour + datetime.timedelta(minutes=10), 2.0, status_code=500)
+    record_at(hour + datetime.timedelta(minutes=20), 0.05, sampling_rate=0.01)
+    # Outside of the hour
+    record_at(hour + datetime.timedelta(minutes=70), 1.0)
+
+    (rollup,) = rollup_hour(hour)
+
+    assert rollup.route == "DataSetListView"
+    assert rollup.num_records == 2
+    assert rollup.count == pytest.approx(101)
+    assert rollup.error_count == pytest.approx(1)
+    # The fast request stands for 100, so the slow one is not even the p99
+    assert rollup.p50 == pytest.approx(0.05, rel=0.01)
+    assert rollup.p99 == pytest.approx(0.05, rel=0.01)
+
+    # Rolling up again replaces the hour
+    rollup_hour(hour)
+    assert LatencyRollup.objects.filter(hour=hour).count() == 1
+
+
+@pytest.mark.django_db
+def test_pending_hours_resume_after_last_rollup(settings):
+    settings.REQUEST_PROFILER_LOG_TRUNCATION_DAYS = 1
+    now = timezone.now()
+    record_at(now - datetime.timedelta(hours=3), 0.1)
+    # Records older than the retention window have been deleted anyway
+    record_at(now - datetime.timedelta(days=2), 0.1)
+
+    assert rollup_pending_hours(now) == 1
+    assert LatencyRollup.objects.count() == 1
+    # Later hours are rolled up once they are complete
+    record_at(now, 0.1)
+    assert rollup_pending_hours(now) == 0
+    assert rollup_pending_hours(now + datetime.timedelta(hours=1)) == 1
+    assert LatencyRollup.objects.count() == 2
+
+
+@pytest.mark.django_db
+def test_summary_merges_hours_and_expired_rollups_are_deleted(settings):
+    settings.REQUEST_PROFILER_ROLLUP_RETENTION_DAYS = 30
+    now = timezone.now()
+    for hours_ago in (2, 3):
+        record_at(now - datetime.timedelta(hours=hours_ago), 0.1)
+        record_at(now - datetime.timedelta(hours=hours_ago), 0.2, view_func_name="HomeView")
+    rollup_pending_hours(now)
+
+    summary = latency_summary(now - datetime.timedelta(days=1), route="HomeView", method="GET")
+
+    assert {r["route"]: r["count"] for r in summary["routes"]} == {
+        "DataSetListView": 2,
+        "HomeView": 2,
+    }
+    assert [s["count"] for s in summary["series"]] == [1, 1]
+    assert summary["series"][0]["p50"] == pytest.approx(0.2, rel=0.01)
+
+    assert delete_expired_rollups(now + datetime.timedelta(days=31)) > 4
+    assert not LatencyRollup.objects.exists()
+    assert not DailyLatencyRollup.objects.exists()
+
+
+@pytest.mark.django_db
+def test_long_summaries_read_daily_rollups_of_the_busiest_routes():
+    now = timezone.now()
+    for days_ago in (2, 3):
+        record_at(now - datetime.timedelta(days=days_ago), 0.1)
+        record_at(now - datetime.timedelta(days=days_ago), 0.2, view_func_name="HomeView")
+        record_at(now - datetime.timedelta(days=days_ago), 0.3, view_func_name="HomeView")
+    rollup_pending_hours(now)
+    # The all-routes rollup of each day
+    assert DailyLatencyRollup.objects.filter(route="", method="").count() == 2
+
+    summary = latency_summary(now - datetime.timedelta(days=7), bucket=datetime.timedelta(days=1), max_routes=1)
+
+    assert [(r["route"], r["count"]) for r in summary["routes"]] == [("HomeView", 4)]
+    assert [s["count"] for s in summary["series"]] == [3, 3]
+
+    # Rolled up from the hourly rollups, if those came first
+    DailyLatencyRollup.objects.all().delete()
+    rollup_pending_hours(now)
+    assert DailyLatencyRollup.objects.count() == 6
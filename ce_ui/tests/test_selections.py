@@ -0,0 +1,150 @@
+"""Tests for saved selections of analysis subjects, `ce_ui.selections`."""
+
+import datetime
+
+import pytest
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from topobank.authorization.models import UserPermission
+from topobank.manager.models import Surface
+from topobank.manager.utils import subjects_to_base64
+from topobank.testing.factories import (SurfaceFactory, Topography1DFactory,
+                                        UserFactory)
+
+from ce_ui import selections
+from ce_ui.models import Selection, SurfaceVisibility
+from ce_ui.subjects import decode
+from ce_ui.views import _safe_subjects_from_request
+
+
+def permission_queries(queries):
+    tables = [f'"{model._meta.db_table}"' for model in (SurfaceVisibility, UserPermission)]
+    return [q["sql"] for q in queries.captured_queries if any(table in q["sql"] for table in tables)]
+
+
+@pytest.mark.django_db
+def test_same_subjects_have_the_same_handle():
+    handle = selections.save({"topography": [5, 3, 3], "surface": [2], "tag": []})
+
+    assert selections.save({"surface": [2], "topography": [3, 5]}) == handle
+    assert selections.save({"surface": [2], "topography": [3]}) != handle
+    assert len(handle) == selections.HANDLE_LENGTH
+    assert Selection.objects.get().subjects == {"surface": [2], "topography": [3, 5]}
+
+
+@pytest.mark.django_db
+@pytest.mark.parametrize("subjects", [None, [1, 2], {"surface": 1}, {"surface": ["a"]}])
+def test_malformed_subjects_are_rejected(api_client, subjects):
+    response = api_client.post(reverse("ce_ui:selection-create"), {"subjects": subjects}, format="json")
+
+    assert response.status_code == 400
+    assert not Selection.objects.exists()
+
+
+@pytest.mark.django_db
+def test_selection_api_round_trip(api_client):
+    owner = UserFactory()
+    mine, private = SurfaceFactory(created_by=owner), SurfaceFactory()
+    response = api_client.post(
+        reverse("ce_ui:selection-create"), {"subjects": {"surface": [private.pk, mine.pk]}}, format="json"
+    )
+    assert response.status_code == 201
+    handle = response.data["handle"]
+
+    # Only the subjects the caller may view
+    api_client.force_authenticate(owner)
+    response = api_client.get(reverse("ce_ui:selection-detail", kwargs={"handle": handle}))
+    assert response.status_code == 200
+    assert response.data["subjects"] == {"surface": [mine.pk]}
+
+    response = api_client.get(reverse("ce_ui:selection-detail", kwargs={"handle": "unknown"}))
+    assert response.status_code == 404
+
+
+@pytest.mark.django_db
+def test_saving_selections_is_throttled(api_client, settings):
+    settings.SELECTION_THROTTLE_RATE = "2/hour"
+    cache.clear()
+    url = reverse("ce_ui:selection-create")
+
+    for ids in ([1], [2]):
+        assert api_client.post(url, {"subjects": {"surface": ids}}, format="json").status_code == 201
+    assert api_client.post(url, {"subjects": {"surface": [3]}}, format="json").status_code == 429
+    # Per user
+    api_client.force_authenticate(UserFactory())
+    assert api_client.post(url, {"subjects": {"surface": [3]}}, format="json").status_code == 201
+
+
+@pytest.mark.django_db
+def test_unused_selections_are_deleted(settings):
+    settings.SELECTION_RETENTION_DAYS = 30
+    used, unused = selections.save({"surface": [1]}), selections.save({"surface": [2]})
+    long_ago = timezone.now() - datetime.timedelta(days=31)
+    Selection.objects.update(last_used_at=long_ago)
+    cache.clear()
+    # Loading a selection records its use
+    selections.load(used)
+
+    assert selections.delete_unused() == 1
+    assert list(Selection.objects.values_list("handle", flat=True)) == [used]
+    with pytest.raises(Selection.DoesNotExist):
+        selections.load(unused)
+
+
+@pytest.mark.django_db
+def test_resolved_subjects_are_cached_until_permissions_change(rf):
+    owner, other = UserFactory(), UserFactory()
+    surface = SurfaceFactory(created_by=owner)
+    topography = Topography1DFactory(surface=surface)
+    handle = selections.save({"surface": [surface.pk], "topography": [topography.pk]})
+
+    assert selections.resolve(handle, other) == []
+    assert selections.resolve(handle, owner) == [surface, topography]
+    with CaptureQueriesContext(connection) as queries:
+        assert selections.resolve(handle, owner) == [surface, topography]
+    assert permission_queries(queries) == []
+
+    Surface.objects.get(pk=surface.pk).permissions.grant_for_user(other, "view")
+    assert selections.resolve(handle, other) == [surface, topography]
+
+
+@pytest.mark.django_db
+def test_analysis_pages_take_the_handle(rf, client, handle_usage_statistics, orcid_socialapp):
+    user = UserFactory()
+    user.user_permissions.add(Permission.objects.get(codename="can_skip_terms"))
+    surface = SurfaceFactory(created_by=user)
+    handle = selections.save({"surface": [surface.pk]})
+
+    request = rf.get("/ui/analysis-list/", {"selection": handle})
+    request.user = user
+    assert _safe_subjects_from_request(request) == [surface]
+    request = rf.get("/ui/analysis-list/", {"selection": "unknown"})
+    request.user = user
+    assert _safe_subjects_from_request(request) == []
+
+    client.force_login(user)
+    response = client.get(reverse("ce_ui:results-list"), {"selection": handle})
+    assert response.status_code == 200
+    hrefs = [tab["href"] for tab in response.context["extra_tabs"]]
+    assert f"{reverse('ce_ui:results-list')}?selection={handle}" in hrefs
+
+
+def test_middleware_expands_the_handle_into_subjects(rf, db):
+    handle = selections.save({"surface": [4]})
+    seen = {}
+
+    def view(request):
+        seen.update(request.GET.lists())
+        return None
+
+    selections.SelectionMiddleware(view)(rf.get("/analysis/api/card/series/x", {"selection": handle}))
+    assert decode(seen["subjects"][0]) == {"surface": [4]}
+
+    seen.clear()
+    subjects = subjects_to_base64([])
+    selections.SelectionMiddleware(view)(rf.get("/", {"selection": handle, "subjects": subjects}))
+    assert seen["subjects"] == [subjects]
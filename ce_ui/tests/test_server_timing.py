@@ -0,0 +1,75 @@
+"""Tests for the `Server-Timing` header."""
+
+import re
+from types import SimpleNamespace
+
+import pytest
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connection
+from django.http import HttpResponse
+from django.template import engines
+from django.test import RequestFactory
+from rest_framework import serializers
+
+from ce_ui.server_timing import ServerTimingMiddleware
+
+
+class NameSerializer(serializers.Serializer):
+    name = serializers.CharField()
+
+
+def view(request):
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+        cursor.execute("SELECT 2")
+    cache.set("server-timing-test", 1)
+    cache.get("server-timing-test")
+    cache.get("server-timing-test-missing")
+    data = NameSerializer({"name": "test"}).data
+    return HttpResponse(engines["django"].from_string("{{ name }}").render(data))
+
+
+def get(user):
+    request = RequestFactory().get("/")
+    request.user = user
+    return ServerTimingMiddleware(view)(request)
+
+
+def metrics(response):
+    return {
+        match[0]: match[1:]
+        for match in re.findall(
+            r'(\w+);dur=([\d.]+)(?:;desc="([^"]*)")?', response["Server-Timing"]
+        )
+    }
+
+
+@pytest.mark.django_db
+def test_header_breaks_down_request(settings):
+    settings.SERVER_TIMING_FOR_STAFF = True
+    response = get(SimpleNamespace(is_staff=True))
+
+    assert response.content == b"test"
+    timings = metrics(response)
+    assert timings["sql"][1] == "2 queries"
+    assert timings["cache"][1] == "3 ops, 1 hits"
+    assert timings["storage"][1] == "0 calls"
+    assert {"serializer", "template", "total"} <= timings.keys()
+
+
+@pytest.mark.django_db
+def test_header_only_for_staff_unless_enabled(settings):
+    settings.SERVER_TIMING_ENABLED = False
+    settings.SERVER_TIMING_FOR_STAFF = True
+    assert "Server-Timing" not in get(SimpleNamespace(is_staff=False))
+
+    settings.SERVER_TIMING_ENABLED = True
+    assert "Server-Timing" in get(SimpleNamespace(is_staff=False))
+
+
+def test_middleware_removed_when_disabled(settings):
+    settings.SERVER_TIMING_ENABLED = False
+    settings.SERVER_TIMING_FOR_STAFF = False
+    with pytest.raises(MiddlewareNotUsed):
+        ServerTimingMiddleware(view)
@@ -0,0 +1,143 @@
+"""Tests for the Redis session engine with database fallback, `ce_ui.sessions`."""
+
+import pytest
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+from django.contrib.sessions.models import Session
+from django.core.cache import caches
+from django.core.management import call_command
+
+from ce_ui import sessions
+from ce_ui.sessions import SessionStore
+
+
+@pytest.fixture
+def session_cache(settings):
+    settings.SESSION_ENGINE = "ce_ui.sessions"
+    cache = caches[settings.SESSION_CACHE_ALIAS]
+    cache.clear()
+    yield cache
+    cache.clear()
+
+
+@pytest.fixture
+def cache_writes(session_cache, monkeypatch):
+    writes = []
+    set_ = session_cache.set
+
+    def set(key, *args, **kwargs):
+        writes.append(key)
+        return set_(key, *args, **kwargs)
+
+    monkeypatch.setattr(session_cache, "set", set)
+    return writes
+
+
+@pytest.fixture
+def broken_cache(session_cache, monkeypatch):
+    def fail(*args, **kwargs):
+        raise ConnectionError("Redis is down")
+
+    for method in ("get", "set", "add", "delete", "has_key"):
+        monkeypatch.setattr(session_cache, method, fail)
+
+
+@pytest.mark.django_db
+def test_sessions_are_kept_in_the_cache(session_cache, django_assert_num_queries):
+    session = SessionStore()
+    session["select_tab_state"] = {"page_size": 10}
+    with django_assert_num_queries(0):
+        session.save()
+        assert SessionStore(session.session_key)["select_tab_state"] == {"page_size": 10}
+    assert not Session.objects.exists()
+
+
+@pytest.mark.django_db
+def test_unchanged_session_is_not_written(cache_writes):
+    session = SessionStore()
+    session["select_tab_state"] = {"page_size": 10}
+    session.create()
+
+    session = SessionStore(session.session_key)
+    session["select_tab_state"] = {"page_size": 10}
+    assert session.modified
+    session.save()
+    assert cache_writes == []
+
+    session["select_tab_state"] = {"page_size": 20}
+    session.save()
+    assert len(cache_writes) == 1
+    assert SessionStore(session.session_key)["select_tab_state"] == {"page_size": 20}
+
+
+@pytest.mark.django_db
+def test_database_sessions_move_to_the_cache(session_cache, django_assert_num_queries):
+    old = DBStore()
+    old["_auth_user_id"] = "1"
+    old.create()
+
+    assert SessionStore(old.session_key)["_auth_user_id"] == "1"
+    with django_assert_num_queries(0):
+        assert SessionStore(old.session_key)["_auth_user_id"] == "1"
+
+
+@pytest.mark.django_db
+def test_falls_back_to_database(broken_cache):
+    session = SessionStore()
+    session["_auth_user_id"] = "1"
+    session.save()
+
+    assert Session.objects.filter(session_key=session.session_key).exists()
+    assert SessionStore(session.session_key)["_auth_user_id"] == "1"
+
+    # Logging out must not leave the session valid in the cache
+    with pytest.raises(ConnectionError):
+        session.delete()
+    assert not Session.objects.exists()
+
+
+@pytest.mark.django_db
+def test_cached_session_falls_back_to_database_on_update(session_cache, monkeypatch):
+    session = SessionStore()
+    session["_auth_user_id"] = "1"
+    session.create()
+
+    # The session exists only in the cache, which goes down
+    session = SessionStore(session.session_key)
+    session["_auth_user_id"] = "2"
+    monkeypatch.setattr(session_cache, "set", lambda *args, **kwargs: 1 / 0)
+    session.save()
+
+    assert DBStore(session.session_key)["_auth_user_id"] == "2"
+    # The older copy in the cache is dropped
+    assert SessionStore(session.session_key)["_auth_user_id"] == "2"
+
+
+@pytest.mark.django_db
+def test_stale_copy_is_not_read_once_the_cache_is_back(session_cache, monkeypatch):
+    session = SessionStore()
+    session["_auth_user_id"] = "1"
+    session.create()
+
+    session = SessionStore(session.session_key)
+    session["_auth_user_id"] = "2"
+    with monkeypatch.context() as m:
+        for method in ("set", "delete"):
+            m.setattr(session_cache, method, lambda *args, **kwargs: 1 / 0)
+        session.save()
+    assert sessions._stale_keys == {session._cache_key(session.session_key)}
+
+    # The cache answers again, with the copy from before the fallback
+    assert SessionStore(session.session_key)["_auth_user_id"] == "2"
+    assert sessions._stale_keys == set()
+
+
+@pytest.mark.django_db
+def test_warm_session_cache(session_cache):
+    old = DBStore()
+    old["_auth_user_id"] = "1"
+    old.create()
+
+    call_command("warm_session_cache", delete=True)
+
+    assert not Session.objects.exists()
+    assert SessionStore(old.session_key)["_auth_user_id"] == "1"
@@ -19,7 +19,9 @@ def staff_user(db):
 
 
 @pytest.mark.django_db
-@pytest.mark.parametrize("url_name", ["ce_ui:staff-users", "ce_ui:staff-tasks"])
+@pytest.mark.parametrize(
+    "url_name", ["ce_ui:staff-users", "ce_ui:staff-tasks", "ce_ui:staff-latency"]
+)
 def test_dashboard_pages_require_staff(client, url_name, user_alice, staff_user,
                                        orcid_socialapp):
     url = reverse(url_name)
@@ -50,10 +52,14 @@ def test_dashboard_pages_mount_the_right_component(client, staff_user,
     response = client.get(reverse("ce_ui:staff-tasks"))
     assert response.context["vue_component"] == "StaffTaskDashboard"
 
+    response = client.get(reverse("ce_ui:staff-latency"))
+    assert response.context["vue_component"] == "StaffLatencyDashboard"
+
 
 @pytest.mark.django_db
 @pytest.mark.parametrize(
-    "url_name", ["staff:user-list", "staff:task-list", "staff:worker"]
+    "url_name",
+    ["staff:user-list", "staff:task-list", "staff:worker", "ce_ui:staff-latency-api"],
 )
 def test_api_requires_staff(client, url_name, user_alice, staff_user):
     url = reverse(url_name)
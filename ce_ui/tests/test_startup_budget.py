@@ -0,0 +1,81 @@
+"""
+Budgets for the import time and resident memory of a web worker.
+
+A worker is booted with the test settings in a new interpreter, up to and
+including the URL configuration and the app shell template (see
+`ce_ui.startup`). The budgets are settings, `STARTUP_IMPORT_TIME_BUDGET` and
+`STARTUP_RSS_BUDGET`, which can be overridden through the environment. When
+one is exceeded, the test lists the packages and modules that took longest to
+import, which is usually where the regression is.
+"""
+
+from collections import Counter
+
+import pytest
+from django.conf import settings
+
+from ce_ui.startup import Import, parse_importtime, run
+
+MiB = 1024 * 1024
+
+
+@pytest.fixture(scope="module")
+def boot():
+    return run("--no-request", importtime=True)
+
+
+def offenders(imports, n):
+    """Report of the `n` packages and the `n` modules with the most self time."""
+    packages = Counter()
+    for i in imports:
+        packages[i.module.split(".")[0]] += i.self
+    modules = sorted(imports, key=lambda i: i.self, reverse=True)[:n]
+
+    lines = ["Packages (self time of all their modules):"]
+    lines += [f"  {t * 1000:8.1f} ms  {package}" for package, t in packages.most_common(n)]
+    lines += ["Modules (self time, cumulative time):"]
+    lines += [f"  {i.self * 1000:8.1f} ms {i.cumulative * 1000:8.1f} ms  {i.module}" for i in modules]
+    return "\n".join(lines)
+
+
+def test_parse_importtime():
+    report = """import time: self [us] | cumulative | imported package
+import time:       141 |        141 |   _io
+import time:       344 |        842 | _frozen_importlib_external
+Some warning printed in between
+import time:      1500 |       2000 |     numpy.core
+"""
+    assert parse_importtime(report) == [
+        Import("_io", 141e-6, 141e-6, 1),
+        Import("_frozen_importlib_external", 344e-6, 842e-6, 0),
+        Import("numpy.core", 1500e-6, 2000e-6, 2),
+    ]
+
+
+def test_offenders():
+    imports = [Import("numpy.core", 0.3, 0.3, 1), Import("numpy", 0.1, 0.4, 0), Import("json", 0.2, 0.2, 0)]
+    report = offenders(imports, 1).splitlines()
+    assert "numpy" in report[1] and "400.0 ms" in report[1]
+    assert report[2:] == ["Modules (self time, cumulative time):", "     300.0 ms    300.0 ms  numpy.core"]
+
+
+def test_import_time_budget(boot):
+    _, imports = boot
+    total = sum(i.self for i in imports)
+    budget = settings.STARTUP_IMPORT_TIME_BUDGET
+    assert total <= budget, (
+        f"Imports took {total:.2f} s, the budget is {budget:.2f} s.\n"
+        + offenders(imports, settings.STARTUP_BUDGET_REPORT_LENGTH)
+    )
+
+
+def test_rss_budget(boot):
+    result, imports = boot
+    rss = result["phases"]["templates"]["rss"] / MiB
+    budget = settings.STARTUP_RSS_BUDGET
+    # Memory cannot be attributed to modules after the fact; what was
+    # imported is the best lead
+    assert rss <= budget, (
+        f"Resident memory is {rss:.0f} MiB, the budget is {budget:.0f} MiB.\n"
+        + offenders(imports, settings.STARTUP_BUDGET_REPORT_LENGTH)
+    )
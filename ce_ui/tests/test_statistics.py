@@ -0,0 +1,111 @@
+"""Tests for the precomputed statistics of the home page, `ce_ui.statistics`."""
+
+import pytest
+from django.contrib.auth.models import Permission
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from topobank.manager.models import Surface, Topography
+from topobank.testing.factories import (SurfaceFactory, Topography1DFactory,
+                                        UserFactory)
+
+from ce_ui import anonymous, statistics, tasks
+
+
+@pytest.fixture
+def no_snapshot():
+    keys = [statistics.TOTALS_KEY, statistics.LAST_TOTALS_KEY, statistics.LOCK_KEY]
+    cache.delete_many(keys)
+    yield
+    cache.delete_many(keys)
+
+
+@pytest.fixture
+def library(db, no_snapshot):
+    """An owner of two datasets, one of them public, and a user with whom the other is shared."""
+    owner, collaborator = UserFactory(), UserFactory()
+    shared, public = SurfaceFactory(created_by=owner), SurfaceFactory(created_by=owner)
+    Topography1DFactory(surface=shared)
+    Topography1DFactory(surface=public)
+    Topography1DFactory(surface=public)
+    shared.permissions.grant_for_user(collaborator, "view")
+    public.permissions.grant_for_user(anonymous.get_anonymous_user(), "view")
+    return owner, collaborator
+
+
+def counting_queries(queries):
+    tables = [f'"{model._meta.db_table}"' for model in (Surface, Topography)]
+    return [q["sql"] for q in queries.captured_queries if any(table in q["sql"] for table in tables)]
+
+
+@pytest.mark.django_db
+def test_snapshot_counts_for_every_user(library):
+    owner, collaborator = library
+    tasks.refresh_statistics()
+
+    assert statistics.manager_statistics(owner) == {
+        "nb_users": 2,
+        "nb_surfaces": 2,
+        "nb_topographies": 3,
+        "nb_surfaces_of_user": 2,
+        "nb_topographies_of_user": 3,
+        "nb_surfaces_shared_with_user": 0,
+    }
+    assert statistics.for_user(collaborator)["nb_surfaces_shared_with_user"] == 2
+    # Users who are not counted at all see the public dataset
+    stranger = UserFactory()
+    assert statistics.for_user(stranger)["nb_surfaces_of_user"] == 0
+    assert statistics.for_user(stranger)["nb_surfaces_shared_with_user"] == 1
+
+
+@pytest.mark.django_db
+def test_endpoints_serve_the_snapshot(client, library):
+    owner, _ = library
+    client.force_login(owner)
+    client.get(reverse("manager-statistics"))
+
+    SurfaceFactory(created_by=owner)
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(reverse("manager-statistics"))
+    assert counting_queries(queries) == []
+    assert response.json()["nb_surfaces_of_user"] == 2
+    assert f"max-age={statistics.refresh_interval()}" in response["Cache-Control"]
+    assert "private" in response["Cache-Control"]
+
+    statistics.refresh()
+    assert client.get(reverse("manager-statistics")).json()["nb_surfaces_of_user"] == 3
+    assert client.get(reverse("analysis-statistics")).json().keys() == {"nb_analyses", "nb_analyses_of_user"}
+
+
+@pytest.mark.django_db
+def test_requests_do_not_refresh_while_another_one_does(library):
+    owner, _ = library
+    cache.add(statistics.LOCK_KEY, True)
+
+    with CaptureQueriesContext(connection) as queries:
+        assert statistics.manager_statistics(owner)["nb_surfaces"] == 0
+    assert counting_queries(queries) == []
+
+    # Once there was a snapshot, its totals are served until the next one
+    cache.delete(statistics.LOCK_KEY)
+    statistics.refresh()
+    cache.delete(statistics.TOTALS_KEY)
+    cache.add(statistics.LOCK_KEY, True)
+    with CaptureQueriesContext(connection) as queries:
+        assert statistics.manager_statistics(owner)["nb_surfaces"] == 2
+    assert counting_queries(queries) == []
+
+
+@pytest.mark.django_db
+def test_home_page_inlines_the_statistics(client, orcid_socialapp, library):
+    owner, _ = library
+    owner.user_permissions.add(Permission.objects.get(codename="can_skip_terms"))
+    client.force_login(owner)
+
+    response = client.get(reverse("home"))
+
+    assert response.status_code == 200
+    inlined = response.context["serialized_object"]
+    assert inlined["manager_statistics"]["nb_topographies_of_user"] == 3
+    assert "nb_analyses_of_user" in inlined["analysis_statistics"]
@@ -0,0 +1,92 @@
+"""Tests for the cached state of the terms and conditions, `ce_ui.terms`."""
+
+import datetime
+
+import pytest
+from django.contrib.auth.models import Permission
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.utils import timezone
+from termsandconditions.models import (TermsAndConditions,
+                                       UserTermsAndConditions)
+from topobank.testing.factories import UserFactory
+
+from ce_ui import terms
+from ce_ui.terms import TermsAndConditionsRedirectMiddleware
+
+
+@pytest.fixture
+def site_terms(db):
+    terms.forget_active_terms()
+    return TermsAndConditions.objects.create(
+        slug="site-terms", name="Site terms", version_number=1, text="Terms", date_active=timezone.now()
+    )
+
+
+def get(rf, user, path="/ui/dataset-list/"):
+    request = rf.get(path)
+    request.user = user
+    return TermsAndConditionsRedirectMiddleware(lambda request: HttpResponse("page"))(request)
+
+
+def is_redirected(response):
+    return response.status_code == 302
+
+
+@pytest.mark.django_db
+def test_accepting_terms_lets_the_user_through(rf, site_terms, django_assert_num_queries):
+    user = UserFactory()
+    assert is_redirected(get(rf, user))
+
+    UserTermsAndConditions.objects.create(user=user, terms=site_terms)
+    assert not is_redirected(get(rf, user))
+    with django_assert_num_queries(0):
+        assert not is_redirected(get(rf, user))
+
+
+@pytest.mark.django_db
+def test_steady_state_takes_no_queries(rf, site_terms, django_assert_num_queries):
+    accepting, exempt = UserFactory(), UserFactory()
+    UserTermsAndConditions.objects.create(user=accepting, terms=site_terms)
+    exempt.user_permissions.add(Permission.objects.get(codename="can_skip_terms"))
+    get(rf, accepting)
+    get(rf, exempt)
+
+    accepting, exempt = (type(user).objects.get(pk=user.pk) for user in (accepting, exempt))
+    with django_assert_num_queries(0):
+        for _ in range(3):
+            assert not is_redirected(get(rf, accepting))
+            assert not is_redirected(get(rf, exempt))
+
+
+@pytest.mark.django_db
+def test_imported_terms_must_be_accepted(rf, site_terms, tmp_path):
+    user = UserFactory()
+    UserTermsAndConditions.objects.create(user=user, terms=site_terms)
+    assert not is_redirected(get(rf, user))
+
+    terms_file = tmp_path / "terms.md"
+    terms_file.write_text("# Site terms\n\nNew terms.")
+    call_command("import_terms", "site-terms", "2.0", str(terms_file))
+
+    response = get(rf, user)
+    assert is_redirected(response)
+    assert "site-terms" in response.url
+
+
+@pytest.mark.django_db
+def test_active_terms_expire_when_the_next_version_becomes_active(site_terms, monkeypatch):
+    TermsAndConditions.objects.create(
+        slug="site-terms", name="Site terms", version_number=2, text="Terms",
+        date_active=timezone.now() + datetime.timedelta(days=1),
+    )
+    timeouts = {}
+    monkeypatch.setattr(terms.cache, "set", lambda key, value, timeout: timeouts.__setitem__(key, timeout))
+
+    assert [t.version_number for t in terms.active_terms()] == [1]
+    assert 86000 < timeouts[terms.ACTIVE_TERMS_KEY] <= 86400
+
+
+@pytest.mark.django_db
+def test_unprotected_paths_are_not_redirected(rf, site_terms):
+    assert not is_redirected(get(rf, UserFactory(), path="/terms/accept/site-terms/"))
@@ -0,0 +1,45 @@
+"""Tests for the versions of the tracked dependencies, `ce_ui.versions`."""
+
+import django
+import pytest
+from django.urls import reverse
+
+from ce_ui import versions
+
+
+def test_versions_are_resolved_once():
+    resolved = versions.tracked_versions()
+
+    assert resolved["django"]["version"] == django.__version__
+    assert resolved["numpy"]["license"] == "BSD 3-Clause"
+    # Resolved when the app was ready, from the metadata of the distributions
+    assert versions.tracked_versions.cache_info().misses == 1
+
+
+@pytest.mark.django_db
+def test_versions_are_immutable_by_fingerprint(client):
+    response = client.get(versions.url())
+
+    assert response.status_code == 200
+    assert response.json() == versions.tracked_versions()
+    assert "immutable" in response["Cache-Control"]
+
+    response = client.get(reverse("ce_ui:versions", kwargs={"fingerprint": "outdated"}))
+    assert response.status_code == 302
+    assert response.url == versions.url()
+
+
+@pytest.mark.django_db
+def test_versions_endpoint_is_revalidated_by_etag(client):
+    response = client.get(reverse("manager-versions"))
+    assert response.json() == versions.tracked_versions()
+
+    response = client.get(reverse("manager-versions"), HTTP_IF_NONE_MATCH=response["ETag"])
+    assert response.status_code == 304
+
+
+@pytest.mark.django_db
+def test_app_shell_links_to_the_versions(client, orcid_socialapp):
+    response = client.get(reverse("home"))
+
+    assert f"versionsUrl: '{versions.url()}'" in response.content.decode()
@@ -0,0 +1,110 @@
+"""Tests for the materialized visibility of datasets, `ce_ui.visibility`."""
+
+import pytest
+from django.core.management import call_command
+from topobank.authorization.models import UserPermission
+from topobank.manager.models import Surface
+from topobank.testing.factories import SurfaceFactory, UserFactory
+
+from ce_ui import anonymous, visibility
+from ce_ui.models import SurfaceVisibility
+
+
+def joined_for_user(user, permission="view"):
+    """The lookup `ce_ui.visibility` replaces."""
+    return Surface.objects.for_user.__wrapped__(Surface.objects, user, permission)
+
+
+def visible(user, permission="view"):
+    return set(Surface.objects.for_user(user, permission))
+
+
+@pytest.mark.django_db
+def test_for_user_follows_permission_changes():
+    owner, other = UserFactory(), UserFactory()
+    surface = SurfaceFactory(created_by=owner)
+    assert visible(owner, "full") == {surface}
+    assert visible(other) == set()
+
+    surface.permissions.grant_for_user(other, "view")
+    assert visible(other) == {surface}
+    assert visible(other, "edit") == set()
+
+    surface.permissions.grant_for_user(other, "edit")
+    assert visible(other, "edit") == {surface}
+
+    UserPermission.objects.filter(parent=surface.permissions, user=other).delete()
+    assert visible(other) == set()
+
+
+@pytest.mark.django_db
+def test_for_user_agrees_with_permission_joins():
+    users = [UserFactory() for _ in range(3)]
+    surfaces = [SurfaceFactory(created_by=users[i % 3]) for i in range(6)]
+    surfaces[0].permissions.grant_for_user(users[1], "view")
+    surfaces[1].permissions.grant_for_user(users[2], "edit")
+    surfaces[2].permissions.grant_for_user(users[0], "full")
+
+    for user in users:
+        for permission in ("view", "edit", "full"):
+            assert visible(user, permission) == set(joined_for_user(user, permission))
+
+
+@pytest.mark.django_db
+def test_rebuild_restores_rows():
+    owner, other = UserFactory(), UserFactory()
+    surface = SurfaceFactory(created_by=owner)
+    surface.permissions.grant_for_user(other, "view")
+    rows = set(SurfaceVisibility.objects.values_list("user_id", "surface_id", "level"))
+
+    SurfaceVisibility.objects.all().delete()
+    assert visible(other) == set()
+
+    call_command("rebuild_surface_visibility")
+    assert set(SurfaceVisibility.objects.values_list("user_id", "surface_id", "level")) == rows
+    assert visible(other) == {surface}
+
+
+@pytest.mark.django_db
+def test_overlapping_refreshes_update_existing_rows():
+    owner, other = UserFactory(), UserFactory()
+    surface = SurfaceFactory(created_by=owner)
+    surface.permissions.grant_for_user(other, "view")
+    UserPermission.objects.filter(parent=surface.permissions, user=other).update(allow="edit")
+
+    # As a refresh of the same user that committed in between would have left them
+    visibility._insert("grants.user_id = ANY(%s)", [[other.pk]])
+    assert SurfaceVisibility.objects.get(user=other, surface=surface).level == visibility.rank("edit")
+
+
+@pytest.mark.django_db
+def test_generation_changes_again_on_commit(django_capture_on_commit_callbacks):
+    owner, other = UserFactory(), UserFactory()
+    surface = SurfaceFactory(created_by=owner)
+
+    with django_capture_on_commit_callbacks() as callbacks:
+        surface.permissions.grant_for_user(other, "view")
+        # What a parallel request cached under this token, from the permissions
+        # before the commit, must not survive it
+        token = visibility.generation(other)
+    for callback in callbacks:
+        callback()
+    assert visibility.generation(other) != token
+
+
+@pytest.mark.django_db
+def test_generation_changes_for_the_users_concerned_only():
+    owner, other, bystander = UserFactory(), UserFactory(), UserFactory()
+    surface = SurfaceFactory(created_by=owner)
+    tokens = {user: visibility.generation(user) for user in (owner, other, bystander)}
+    everyone = visibility.generation()
+
+    surface.permissions.grant_for_user(other, "view")
+    assert visibility.generation(owner) != tokens[owner]
+    assert visibility.generation(other) != tokens[other]
+    assert visibility.generation(bystander) == tokens[bystander]
+    assert visibility.generation() == everyone
+
+    # Public datasets are everybody's
+    surface.permissions.grant_for_user(anonymous.get_anonymous_user(), "view")
+    assert visibility.generation(bystander) != tokens[bystander]
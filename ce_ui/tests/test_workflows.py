@@ -0,0 +1,80 @@
+"""Tests for the cached workflows of the analysis pages, `ce_ui.workflows`."""
+
+import pytest
+from django.contrib.auth.models import Group, Permission
+from django.urls import reverse
+from topobank.testing.factories import UserFactory
+
+from ce_ui import workflows
+
+#: Registered by the repository's `conftest.py`.
+WORKFLOW = "topobank.testing.test"
+
+
+@pytest.fixture
+def visibility_lookups(monkeypatch):
+    """Users the registry was asked about, with fresh caches."""
+    users = []
+    get_workflow_names = workflows.get_workflow_names
+
+    def counted(user=None):
+        if user is not None:
+            users.append(user.pk)
+        return get_workflow_names(user)
+
+    workflows.forget()
+    workflows.forget_organizations()
+    monkeypatch.setattr(workflows, "get_workflow_names", counted)
+    yield users
+    workflows.forget()
+
+
+def user_past_terms():
+    user = UserFactory()
+    user.user_permissions.add(Permission.objects.get(codename="can_skip_terms"))
+    return user
+
+
+@pytest.mark.django_db
+def test_visibility_is_looked_up_once_per_group_set(visibility_lookups):
+    user1, user2 = UserFactory(), UserFactory()
+    assert workflows.group_ids(user1) == workflows.group_ids(user2)
+
+    assert WORKFLOW in workflows.visible_names(user1)
+    assert workflows.visible_names(user2) == workflows.visible_names(user1)
+    assert visibility_lookups == [user1.pk]
+
+
+@pytest.mark.django_db
+def test_joining_a_group_changes_the_group_set(visibility_lookups, django_assert_num_queries):
+    user = UserFactory()
+    workflows.visible_names(user)
+    with django_assert_num_queries(0):
+        workflows.visible_names(user)
+
+    group = Group.objects.create(name="Some organization")
+    user.groups.add(group)
+    assert group.pk in workflows.group_ids(user)
+    workflows.visible_names(user)
+    assert visibility_lookups == [user.pk, user.pk]
+
+    group.delete()
+    assert group.pk not in workflows.group_ids(user)
+
+
+@pytest.mark.django_db
+def test_workflow_page_is_serialized_once(client, orcid_socialapp, visibility_lookups, monkeypatch):
+    serializations = []
+    serialized = workflows.serialized
+    monkeypatch.setattr(
+        workflows, "serialized",
+        lambda name, request, serialize: serialized(name, request, lambda: serializations.append(name) or serialize()),
+    )
+    client.force_login(user_past_terms())
+
+    responses = [client.get(reverse("ce_ui:results-detail", kwargs={"slug": WORKFLOW})) for _ in range(3)]
+
+    assert [response.status_code for response in responses] == [200] * 3
+    assert responses[0].context["serialized_object"] == responses[-1].context["serialized_object"]
+    assert serializations == [WORKFLOW]
+    assert len(visibility_lookups) == 1
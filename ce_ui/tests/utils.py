@@ -1,3 +1,9 @@
+import os
+import sys
+from collections import Counter
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connections
 from django.shortcuts import reverse
 from topobank_rest_api.manager.v1.views import SurfaceViewSet
 from topobank.testing.utils import ordereddicts_to_dicts
@@ -29,3 +35,52 @@ def search_surfaces(request_factory, user, expr):
     response = SurfaceViewSet.as_view()(request)
     assert response.status_code == 200
     return ordereddicts_to_dicts(response.data["results"], sorted_by="title")
+
+
+def _query_origin(frame):
+    """Describe where the query issued from `frame` comes from.
+
+    Queries issued while a DRF serializer is serializing a field are
+    attributed to that field, including the fields of the enclosing
+    serializers, e.g. ``SurfaceSerializer.topographies > TopographySerializer.
+    thumbnail``. Other queries are attributed to the innermost frame in
+    ce_ui or topobank code.
+    """
+    fields = []
+    code_location = None
+    while frame is not None:
+        code = frame.f_code
+        if code.co_name == "to_representation" and code.co_filename.endswith(
+            os.path.join("rest_framework", "serializers.py")
+        ):
+            field = frame.f_locals.get("field")
+            if field is not None:
+                serializer = frame.f_locals["self"]
+                fields.append(f"{type(serializer).__name__}.{field.field_name}")
+        elif (
+            code_location is None
+            and ("ce_ui" in code.co_filename or "topobank" in code.co_filename)
+            and os.sep + "tests" + os.sep not in code.co_filename
+        ):
+            code_location = f"{code.co_filename}:{frame.f_lineno} in {code.co_name}"
+        frame = frame.f_back
+    if fields:
+        return " > ".join(reversed(fields))
+    return code_location or "(unknown)"
+
+
+@contextmanager
+def queries_by_origin(using=DEFAULT_DB_ALIAS):
+    """Count the queries issued within the block by origin.
+
+    Yields a `collections.Counter` mapping the origin of each query (see
+    `_query_origin`) to the number of queries issued from there.
+    """
+    origins = Counter()
+
+    def wrapper(execute, sql, params, many, context):
+        origins[_query_origin(sys._getframe(1))] += 1
+        return execute(sql, params, many, context)
+
+    with connections[using].execute_wrapper(wrapper):
+        yield origins
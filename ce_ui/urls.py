@@ -1,8 +1,3 @@
-import notifications.urls
-# Plugin URLs
-import topobank_contact.urls
-import topobank_publication.urls
-import topobank_statistics.urls
 from django.conf import settings
 from django.contrib import admin
 from django.contrib.admin.views.decorators import staff_member_required
@@ -11,13 +6,19 @@ from django.contrib.staticfiles import views as static_views
 from django.urls import include, path, re_path
 from django.views import defaults as default_views
 from django.views.generic import RedirectView
-from drf_spectacular.views import SpectacularAPIView, SpectacularSwaggerView
-from topobank_rest_api.views import entry_points
 
-from . import robots, views
+from . import api_schema, robots, views
+from .lazy import lazy_include, lazy_view
 
 app_name = "ce_ui"
 
+# URL prefixes of the plugins, i.e. the `urlprefix` of their URL modules. They
+# are repeated here because reading them would mean importing the plugins,
+# which is what `lazy_include` avoids; `test_lazy_urls.py` checks they agree.
+CONTACT_URL_PREFIX = "plugins/contact/"
+PUBLICATION_URL_PREFIX = "go/"
+STATISTICS_URL_PREFIX = "plugins/statistics/"
+
 
 #
 # Top-level routes
@@ -26,22 +27,25 @@ urlpatterns = [
     #
     # Plugin URL patterns (now regular apps)
     #
-    path(
-        topobank_contact.urls.urlprefix,
-        include((topobank_contact.urls.urlpatterns, "contact"), namespace="contact")
-    ),
-    path(
-        topobank_publication.urls.urlprefix,
-        include((topobank_publication.urls.urlpatterns, "publication"), namespace="publication")
-    ),
-    path(
-        topobank_statistics.urls.urlprefix,
-        include((topobank_statistics.urls.urlpatterns, "statistics"), namespace="statistics")
-    ),
+    # Imported on first use, see `ce_ui.lazy`
+    #
+    path(CONTACT_URL_PREFIX, lazy_include("topobank_contact.urls", "contact")),
+    path(PUBLICATION_URL_PREFIX, lazy_include("topobank_publication.urls", "publication")),
+    path(STATISTICS_URL_PREFIX, lazy_include("topobank_statistics.urls", "statistics")),
     #
     # Entry points
     #
-    path("entry-points/", entry_points),
+    path("entry-points/", lazy_view("topobank_rest_api.views.entry_points")),
+    #
+    # Precomputed statistics of the home page, see `ce_ui.statistics`; they
+    # replace the statistics endpoints of topobank, which count on every request
+    #
+    re_path(r"^manager/api/statistics/?$", views.manager_statistics_api, name="manager-statistics"),
+    re_path(r"^analysis/api/statistics/?$", views.analysis_statistics_api, name="analysis-statistics"),
+    #
+    # Versions of the tracked dependencies, resolved at startup, see `ce_ui.versions`
+    #
+    path("manager/api/versions/", views.versions_api, name="manager-versions"),
     #
     # Main entry points and static apps
     #
@@ -114,7 +118,7 @@ urlpatterns = [
     # Note: plugin's may provided optimized wrapper views that take precedence
     #
     re_path(
-        "^inbox/notifications/", include(notifications.urls, namespace="notifications")
+        "^inbox/notifications/", lazy_include("notifications.urls", "notifications")
     ),
     #
     # Watchman - see package django-watchman
@@ -124,10 +128,16 @@ urlpatterns = [
     #
     # Open API
     #
-    path("api/schema/", SpectacularAPIView.as_view(), name="schema"),
+    # The schema generator is only needed by these two views, and only if
+    # the schema was not built beforehand, see `ce_ui.api_schema`
+    path(
+        "api/schema/",
+        api_schema.api_schema_view,
+        name="schema",
+    ),
     path(
         "api/schema/swagger-ui/",
-        SpectacularSwaggerView.as_view(url_name="schema"),
+        lazy_view("drf_spectacular.views.SpectacularSwaggerView", url_name="schema"),
         name="swagger-ui",
     ),
     #
@@ -254,6 +264,22 @@ ui_urlpatterns = [
         view=staff_member_required(views.StaffTaskDashboardView.as_view()),
         name="staff-tasks",
     ),
+    path(
+        "staff/latency/",
+        view=staff_member_required(views.StaffLatencyDashboardView.as_view()),
+        name="staff-latency",
+    ),
+    # Gated by DRF's `IsAdminUser`, which checks the same flag
+    path("staff/api/latency/", view=views.latency_api, name="staff-latency-api"),
+    #
+    # Saved selections of analysis subjects, see `ce_ui.selections`
+    #
+    path("api/selection/", view=views.selection_api, name="selection-create"),
+    path("api/selection/<str:handle>/", view=views.selection_detail_api, name="selection-detail"),
+    #
+    # Versions of the tracked dependencies, linked from the app shell, see `ce_ui.versions`
+    #
+    path("api/versions/<str:fingerprint>/", view=views.versions_detail_api, name="versions"),
 ]
 urlpatterns += [path("ui/", include((ui_urlpatterns, app_name)))]
 
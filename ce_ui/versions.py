@@ -0,0 +1,75 @@
+"""
+Versions of the tracked dependencies, as shown in the user menu.
+
+`TRACKED_DEPENDENCIES` lists the packages whose versions the frontend shows,
+with an expression returning the version, e.g. `numpy.__version__`.
+Evaluating the expressions imports SurfaceTopography, numpy, scipy, pandas,
+xarray and the others, and the versions cannot change while the process
+runs. `tracked_versions` resolves them once, when the app is ready (see
+`CEUIAppConfig.ready`), from the metadata of the installed distributions
+where possible, so that the packages need not be imported for it.
+
+The app shell links to the versions by a URL that contains their
+`fingerprint` (see `ce_ui.context_processors.versions_processor`), which is
+served as immutable, so that browsers fetch the versions once per deploy.
+`/manager/api/versions/` serves them under an ETag.
+"""
+
+import functools
+import hashlib
+import importlib
+import json
+from importlib.metadata import (PackageNotFoundError, packages_distributions,
+                                version)
+
+from django.conf import settings
+from django.urls import reverse
+
+
+def _version(import_name, expression, distributions):
+    for distribution in distributions.get(import_name, []):
+        try:
+            return version(distribution)
+        except PackageNotFoundError:
+            pass
+    # Not installed as a distribution, e.g. in a source tree
+    try:
+        value = importlib.import_module(import_name)
+        for attribute in expression.split(".")[1:]:
+            value = getattr(value, attribute)
+    except (ImportError, AttributeError):
+        return None
+    return str(value)
+
+
+@functools.cache
+def tracked_versions():
+    """
+    Version, license and homepage of the tracked dependencies, by import name;
+    dependencies that are not installed are left out.
+    """
+    distributions = packages_distributions()
+    versions = {}
+    for import_name, expression, license, homepage in settings.TRACKED_DEPENDENCIES:
+        resolved = _version(import_name, expression, distributions)
+        if resolved is not None:
+            versions[import_name] = {"version": resolved, "license": license, "homepage": homepage}
+    return versions
+
+
+@functools.cache
+def content():
+    """The versions as served, JSON encoded."""
+    return json.dumps(tracked_versions()).encode()
+
+
+@functools.cache
+def fingerprint():
+    """Token that identifies the versions."""
+    return hashlib.sha256(content()).hexdigest()[:16]
+
+
+@functools.cache
+def url():
+    """URL of the versions, by their fingerprint."""
+    return reverse("ce_ui:versions", kwargs={"fingerprint": fingerprint()})
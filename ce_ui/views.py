@@ -1,32 +1,43 @@
+import datetime
 import logging
 from html import unescape
 
 from allauth.account.views import EmailView
+from django.conf import settings
 from django.contrib.auth.mixins import LoginRequiredMixin
 from django.core.exceptions import PermissionDenied
-from django.db.models import Q
-from django.http import Http404
+from django.http import Http404, HttpResponse
+from django.shortcuts import redirect
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.decorators import method_decorator
+from django.utils.http import urlencode
+from django.utils.module_loading import import_string
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from django.views.generic import (DetailView, ListView, RedirectView,
                                   TemplateView, UpdateView)
+from rest_framework.decorators import (api_view, permission_classes,
+                                       throttle_classes)
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import AllowAny, IsAdminUser
+from rest_framework.response import Response
 from termsandconditions.models import TermsAndConditions
 from termsandconditions.views import (AcceptTermsView, GetTermsViewMixin,
                                       TermsView)
 from topobank.analysis.models import Workflow
-from topobank.analysis.registry import get_implementation, get_workflow_names
 from topobank.manager.models import Surface, Topography
-from topobank.manager.utils import (get_reader_infos, subjects_from_base64,
-                                    subjects_to_base64)
 from topobank_orcid.users.models import User
 from topobank_publication.models import PublicationCollection
-from topobank_publication.serializers import PublicationCollectionSerializer
-from topobank_rest_api.analysis.serializers import WorkflowDetailSerializer
-from topobank_rest_api.manager.v1.serializers import (SurfaceSerializer,
-                                                      TopographySerializer)
-from topobank_rest_api.manager.v2.serializers import SurfaceV2Serializer
 
-from ce_ui import breadcrumb
+from ce_ui import (breadcrumb, file_formats, permissions, selections,
+                   statistics, terms, versions, workflows)
+from ce_ui.collaborators import users_share_dataset
+from ce_ui.models import Selection
 from ce_ui.publication_metadata import publication_metadata
+from ce_ui.rollups import latency_summary
+from ce_ui.subjects import subjects_from_base64
 
 ORDER_BY_CHOICES = {"name": "name", "-creation_datetime": "date"}
 SHARING_STATUS_FILTER_CHOICES = {
@@ -37,6 +48,9 @@ SHARING_STATUS_FILTER_CHOICES = {
 }
 TREE_MODE_CHOICES = ["surface list", "tag tree"]
 
+#: Seconds the versions are cached by their fingerprint
+VERSIONS_MAX_AGE = 365 * 24 * 3600
+
 MAX_PAGE_SIZE = 100
 DEFAULT_PAGE_SIZE = 10
 
@@ -72,9 +86,13 @@ class AppView(TemplateView):
 class AppDetailView(DetailView):
     template_name = "app.html"
     vue_component = None
+    # Serializer class or its dotted path. The serializers import most of
+    # topobank's REST API, which a path defers until a page needs it.
     serializer_class = None
 
     def get_serializer_class(self):
+        if isinstance(self.serializer_class, str):
+            return import_string(self.serializer_class)
         return self.serializer_class
 
     def get_context_data(self, **kwargs):
@@ -82,12 +100,15 @@ class AppDetailView(DetailView):
 
         context["vue_component"] = self.vue_component
         context["extra_tabs"] = []
-        context["serialized_object"] = self.get_serializer_class()(
-            self.object, context={"request": self.request}
-        ).data
+        context["serialized_object"] = self.get_serialized_object()
 
         return context
 
+    def get_serialized_object(self):
+        return self.get_serializer_class()(
+            self.object, context={"request": self.request}
+        ).data
+
 
 class DataSetListView(AppView):
     vue_component = "DatasetList"
@@ -99,7 +120,7 @@ class DatasetDetailView(AppDetailView):
     # The v2 serializer does not inline full measurement representations (the
     # page fetches those asynchronously), so rendering this page costs a
     # handful of queries instead of ~10 per measurement.
-    serializer_class = SurfaceV2Serializer
+    serializer_class = "topobank_rest_api.manager.v2.serializers.SurfaceV2Serializer"
     # Extends app.html and adds server-rendered metadata to its head
     template_name = "dataset_detail.html"
 
@@ -127,8 +148,10 @@ class DatasetDetailView(AppDetailView):
         context = super().get_context_data(**kwargs)
 
         #
-        # Check permissions
+        # Check permissions; the serializer checks them again for every
+        # measurement, whose topographies are prefetched
         #
+        permissions.prime(self.request.user, [self.object, *self.object.topography_set.all()])
         if not self.object.has_permission(self.request.user, "view"):
             raise PermissionDenied()
 
@@ -171,7 +194,7 @@ class DatasetCollectionPublishView(AppView):
 class DatasetCollectionView(AppDetailView):
     model = PublicationCollection
     vue_component = "DatasetCollection"
-    serializer_class = PublicationCollectionSerializer
+    serializer_class = "topobank_publication.serializers.PublicationCollectionSerializer"
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -200,7 +223,13 @@ class DatasetCollectionListView(AppView):
 class DatasetPublishView(AppDetailView):
     model = Surface
     vue_component = "DatasetPublish"
-    serializer_class = SurfaceSerializer
+    serializer_class = "topobank_rest_api.manager.v1.serializers.SurfaceSerializer"
+
+    def get_queryset(self):
+        # Lets `has_permission` answer from the prefetched permissions
+        return Surface.objects.select_related("permissions").prefetch_related(
+            "permissions__user_permissions__user"
+        )
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -234,7 +263,13 @@ class DatasetPublishView(AppDetailView):
 class TopographyDetailView(AppDetailView):
     model = Topography
     vue_component = "TopographyDetail"
-    serializer_class = TopographySerializer
+    serializer_class = "topobank_rest_api.manager.v1.serializers.TopographySerializer"
+
+    def get_queryset(self):
+        # Lets `has_permission` answer from the prefetched permissions
+        return Topography.objects.select_related("permissions", "surface").prefetch_related(
+            "permissions__user_permissions__user"
+        )
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -259,11 +294,9 @@ def extra_tabs_if_single_item_selected(context, subjects):
 
     Parameters
     ----------
-    topographies: list of topographies
-        Use here the result of function `utils.selected_instances`.
-
-    surfaces: list of surfaces
-        Use here the result of function `utils.selected_instances`.
+    subjects: list of topographies and surfaces
+        Use here the result of `_safe_subjects_from_request`, which loads
+        the surface of each topography along with it.
 
     Returns
     -------
@@ -299,7 +332,7 @@ def extra_tabs_if_single_item_selected(context, subjects):
                 "tooltip": f"Properties of measurement '{topo.name}'",
             },
         )
-    elif len(surfaces) == 1 and all(t.surface == surfaces[0] for t in topographies):
+    elif len(surfaces) == 1 and all(t.surface_id == surfaces[0].pk for t in topographies):
         # exactly one surface was selected -> show also tab of surface
         surface = surfaces[0]
         breadcrumb.add_generic(
@@ -317,12 +350,21 @@ def extra_tabs_if_single_item_selected(context, subjects):
 
 
 def _safe_subjects_from_request(request):
-    """Decode the ``subjects`` GET parameter without ever raising.
+    """Decode the ``selection`` or ``subjects`` GET parameter without ever raising.
 
+    A ``selection`` handle takes precedence (see `ce_ui.selections`).
     Returns an empty list when the parameter is missing/empty or cannot be
-    decoded (e.g. malformed base64 or JSON), instead of bubbling up an
-    AttributeError / binascii.Error / JSONDecodeError as a 500 error.
+    decoded (e.g. malformed base64 or JSON, or an unknown handle), instead of
+    bubbling up an AttributeError / binascii.Error / JSONDecodeError as a 500
+    error.
     """
+    handle = request.GET.get("selection")
+    if handle:
+        try:
+            return selections.resolve(handle, request.user)
+        except Selection.DoesNotExist:
+            _log.warning("Unknown selection %r; ignoring.", handle)
+            return []
     encoded = request.GET.get("subjects")
     if not encoded:
         return []
@@ -333,37 +375,52 @@ def _safe_subjects_from_request(request):
         return []
 
 
+def _subjects_query(request, subjects):
+    """Query string selecting `subjects` in links from an analysis page: the
+    selection handle the page was requested with, else the encoded subjects."""
+    from topobank.manager.utils import subjects_to_base64
+
+    handle = request.GET.get("selection")
+    if handle:
+        return urlencode({"selection": handle})
+    return f"subjects={subjects_to_base64(subjects)}"
+
+
 class AnalysisDetailView(AppDetailView):
     vue_component = "AnalysisDetail"
-    serializer_class = WorkflowDetailSerializer
+    serializer_class = "topobank_rest_api.analysis.serializers.WorkflowDetailSerializer"
 
     def get_object(self, queryset=None):
         # ``Workflow`` is a registry-backed plain Python class, not a Django
         # model, so the default ``DetailView`` ORM lookup does not apply.
         # Resolve the workflow by its name (the URL slug) from the registry.
         name = self.kwargs.get(self.slug_url_kwarg)
-        if get_implementation(name=name) is None:
+        if name not in workflows.registered_names():
             raise Http404(f"No workflow named '{name}'.")
         return Workflow(name=name)
 
+    def get_serialized_object(self):
+        # Workflows only change on deploy, see `ce_ui.workflows`
+        return workflows.serialized(self.object.name, self.request, super().get_serialized_object)
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
         workflow = self.object
         # Check if user is allowed to use this function
-        if workflow.name not in get_workflow_names(self.request.user):
+        if workflow.name not in workflows.visible_names(self.request.user):
             raise PermissionDenied()
 
         # Decide whether to open extra tabs for surface/topography details
         subjects = _safe_subjects_from_request(self.request)
         extra_tabs_if_single_item_selected(context, subjects)
-        subjects = subjects_to_base64(subjects)
+        query = _subjects_query(self.request, subjects)
         breadcrumb.add_generic(
             context,
             {
                 "title": "Analyze",
                 "icon": "chart-area",
-                "href": f"{reverse('ce_ui:results-list')}?subjects={subjects}",
+                "href": f"{reverse('ce_ui:results-list')}?{query}",
                 "active": False,
                 "login_required": False,
                 "tooltip": "Results for selected workflow",
@@ -374,7 +431,7 @@ class AnalysisDetailView(AppDetailView):
             {
                 "title": f"{workflow.display_name}",
                 "icon": "chart-area",
-                "href": f"{self.request.path}?subjects={subjects}",
+                "href": f"{self.request.path}?{query}",
                 "active": True,
                 "login_required": False,
                 "tooltip": f"Results for workflow '{workflow.display_name}'",
@@ -402,7 +459,7 @@ class AnalysisListView(AppView):
                 "title": "Analyze",
                 "icon": "chart-area",
                 "icon-style-prefix": "fas",
-                "href": f"{reverse('ce_ui:results-list')}?subjects={self.request.GET.get('subjects')}",
+                "href": f"{reverse('ce_ui:results-list')}?{_subjects_query(self.request, subjects)}",
                 "active": True,
                 "login_required": False,
                 "tooltip": "Results for selected analysis functions",
@@ -416,6 +473,18 @@ class AnalysisListView(AppView):
 class HomeView(AppView):
     vue_component = "Home"
 
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+
+        # Inlined, so that the page needs no requests for its statistics
+        if not self.request.user.is_anonymous:
+            context["serialized_object"] = {
+                "manager_statistics": statistics.manager_statistics(self.request.user),
+                "analysis_statistics": statistics.analysis_statistics(self.request.user),
+            }
+
+        return context
+
 
 class StaffDashboardView(AppView):
     """
@@ -460,18 +529,140 @@ class StaffTaskDashboardView(StaffDashboardView):
     breadcrumb_tooltip = "Analysis tasks and Celery worker status"
 
 
+class StaffLatencyDashboardView(StaffDashboardView):
+    vue_component = "StaffLatencyDashboard"
+    breadcrumb_title = "Latency"
+    breadcrumb_icon = "gauge-high"
+    breadcrumb_tooltip = "Response times per route, from the request profiler"
+
+
+#: Time series of periods longer than this are resolved by day instead of hour
+LATENCY_HOURLY_MAX_DAYS = 7
+
+#: Routes listed by the latency dashboard, the busiest first
+LATENCY_MAX_ROUTES = 50
+
+
+@api_view(["GET"])
+@permission_classes([IsAdminUser])
+def latency_api(request):
+    """Latency rollups of the last `days` days, see `ce_ui.rollups`.
+
+    The time series covers all routes together, or the one given by the
+    `route` and `method` query parameters.
+    """
+    try:
+        days = int(request.query_params.get("days", 7))
+    except ValueError:
+        raise ValidationError({"days": "Must be an integer."})
+    if not 1 <= days <= settings.REQUEST_PROFILER_ROLLUP_RETENTION_DAYS:
+        raise ValidationError(
+            {
+                "days": f"Must be between 1 and "
+                f"{settings.REQUEST_PROFILER_ROLLUP_RETENTION_DAYS}."
+            }
+        )
+    bucket = datetime.timedelta(hours=1 if days <= LATENCY_HOURLY_MAX_DAYS else 24)
+    summary = latency_summary(
+        timezone.now() - datetime.timedelta(days=days),
+        route=request.query_params.get("route"),
+        method=request.query_params.get("method"),
+        bucket=bucket,
+        max_routes=LATENCY_MAX_ROUTES,
+    )
+    return Response({"bucket": bucket.total_seconds(), **summary})
+
+
+@api_view(["POST"])
+@permission_classes([AllowAny])
+@throttle_classes([selections.SelectionRateThrottle])
+def selection_api(request):
+    """Save the selection of subjects in the request body, see `ce_ui.selections`.
+
+    The body is `{"subjects": {"surface": [...], "topography": [...]}}`; the
+    response gives the handle to pass as the `selection` parameter instead.
+    Open to anonymous visitors, who analyse public datasets, but throttled.
+    """
+    try:
+        handle = selections.save(request.data.get("subjects"))
+    except (AttributeError, ValueError) as exc:
+        raise ValidationError({"subjects": str(exc)})
+    return Response({"handle": handle}, status=201)
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def selection_detail_api(request, handle):
+    """Subjects of a saved selection, those the user may view only."""
+    try:
+        subjects = selections.visible_ids(handle, request.user)
+    except Selection.DoesNotExist:
+        raise Http404(f"No selection '{handle}'.")
+    return Response({"handle": handle, "subjects": subjects})
+
+
+def _statistics_response(data):
+    response = Response(data)
+    # The statistics are refreshed in the background, see `ce_ui.statistics`
+    patch_cache_control(response, private=True, max_age=statistics.refresh_interval())
+    return response
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def manager_statistics_api(request):
+    """Numbers of datasets and measurements, overall and of the user."""
+    return _statistics_response(statistics.manager_statistics(request.user))
+
+
+@api_view(["GET"])
+@permission_classes([AllowAny])
+def analysis_statistics_api(request):
+    """Numbers of analyses, overall and of the user."""
+    return _statistics_response(statistics.analysis_statistics(request.user))
+
+
+def _versions_etag(request, *args, **kwargs):
+    return versions.fingerprint()
+
+
+@condition(etag_func=_versions_etag)
+@cache_control(public=True, no_cache=True)
+def versions_api(request):
+    """Versions of the tracked dependencies, see `ce_ui.versions`."""
+    return HttpResponse(versions.content(), content_type="application/json")
+
+
+def versions_detail_api(request, fingerprint):
+    """Versions of the tracked dependencies, for good under their fingerprint."""
+    if fingerprint != versions.fingerprint():
+        # Linked from a page of an earlier deploy
+        return redirect(versions.url())
+    response = HttpResponse(versions.content(), content_type="application/json")
+    patch_cache_control(response, public=True, max_age=VERSIONS_MAX_AGE, immutable=True)
+    return response
+
+
 class FileFormatsView(AppView):
     """Overview of the file formats supported for topography upload.
 
-    The list is generated dynamically from the SurfaceTopography reader
-    registry, so it stays up to date as new readers are added.
+    The list is generated from the SurfaceTopography reader registry, so it
+    stays up to date as new readers are added; it is built once per process
+    and rendered once per version, see `ce_ui.file_formats`.
     """
 
     template_name = "pages/file_formats.html"
 
+    # Outermost, so that 304 responses are private, too
+    @method_decorator(cache_control(private=True, no_cache=True))
+    @method_decorator(condition(etag_func=file_formats.etag))
+    def dispatch(self, request, *args, **kwargs):
+        # Revalidated by the ETag, see `ce_ui.file_formats.etag`
+        return super().dispatch(request, *args, **kwargs)
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context["reader_infos"] = get_reader_infos()
+        context["formats_list"] = file_formats.render_list()
         context["extra_tabs"] = [
             {
                 "icon": "file",
@@ -490,24 +681,14 @@ class TermsListView(TemplateView, GetTermsViewMixin):
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
 
-        active_terms = TermsAndConditions.get_active_terms_list()
+        active_terms = sorted(terms.active_terms(), key=lambda t: t.date_created)
 
         if not self.request.user.is_anonymous:
-            context["agreed_terms"] = TermsAndConditions.objects.filter(
-                userterms__date_accepted__isnull=False,
-                userterms__user=self.request.user,
-            ).order_by("date_created")
-
-            context["not_agreed_terms"] = active_terms.filter(
-                Q(userterms=None)
-                | (
-                    Q(userterms__date_accepted__isnull=True)
-                    & Q(userterms__user=self.request.user)
-                )
-            ).order_by("date_created")
-
+            accepted = terms.accepted_terms_ids(self.request.user)
+            context["agreed_terms"] = TermsAndConditions.objects.filter(pk__in=accepted).order_by("date_created")
+            context["not_agreed_terms"] = [t for t in active_terms if t.pk not in accepted]
         else:
-            context["active_terms"] = active_terms.order_by("date_created")
+            context["active_terms"] = active_terms
 
         breadcrumb.add_generic(
             context,
@@ -590,21 +771,6 @@ class TabbedEmailView(EmailView):
         return context
 
 
-def _users_share_dataset(user_a, user_b):
-    """Return True if both users can view at least one common surface (dataset).
-
-    Two users are considered collaborating when there is at least one surface
-    that both of them are allowed to view (via user or organization
-    permissions). No reusable ``are_collaborating`` helper exists in topobank
-    core, so we implement the check here using the authorization-aware
-    ``Surface.objects.for_user`` queryset.
-    """
-    surfaces_a = set(Surface.objects.for_user(user_a).values_list("pk", flat=True))
-    if not surfaces_a:
-        return False
-    return Surface.objects.for_user(user_b).filter(pk__in=surfaces_a).exists()
-
-
 class UserDetailView(LoginRequiredMixin, DetailView):
     model = User
     # These next two lines tell the view to index lookups by username
@@ -617,7 +783,7 @@ class UserDetailView(LoginRequiredMixin, DetailView):
         # deny access so profiles cannot be enumerated by guessing usernames.
         if request.user.is_authenticated:
             target_user = self.get_object()
-            if request.user != target_user and not _users_share_dataset(
+            if request.user.pk != target_user.pk and not users_share_dataset(
                 request.user, target_user
             ):
                 raise PermissionDenied(
@@ -625,6 +791,15 @@ class UserDetailView(LoginRequiredMixin, DetailView):
                 )
         return super().dispatch(request, *args, **kwargs)
 
+    def get_object(self, queryset=None):
+        # Looked up by `dispatch` already
+        if queryset is None and getattr(self, "_object", None) is not None:
+            return self._object
+        obj = super().get_object(queryset)
+        if queryset is None:
+            self._object = obj
+        return obj
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         breadcrumb.add_generic(
@@ -0,0 +1,214 @@
+"""
+Materialized visibility of datasets.
+
+`Surface.objects.for_user` decides which datasets a user can see by joining
+permission sets, user permissions and organization permissions, with the
+organizations' groups and the user's memberships -- on every dataset list,
+sharing-status filter and collaborator check. `SurfaceVisibility` stores the
+outcome of these joins: one row per user and dataset the user has access to,
+with the highest level of access, as a rank (see `rank`). With the index on
+(user, level, surface), `for_user` becomes an index scan over the rows of the
+user (and of the anonymous user, whose access is everybody's).
+
+The rows are kept up to date by signals (see `ce_ui.signals`): changes of
+user or organization permissions refresh the datasets of the permission set
+concerned, changes of group memberships refresh the users concerned. Every
+refresh starts a new `generation` for the users whose rows it changed, which
+invalidates the values derived from their visibility and cached under it
+(see `ce_ui.selections`); the values of other users stay cached. Only changes
+to the rows of the anonymous user, whose datasets everybody sees, and
+rebuilds start a new generation for everyone. Bulk operations send no
+signals; after those, `refresh` the affected permission
+sets or users, or rebuild the whole table with
+`manage.py rebuild_surface_visibility`. The table is built after `migrate`
+if it is empty.
+
+`install` replaces `for_user` of the dataset manager with the indexed lookup
+if `SURFACE_VISIBILITY_INDEX` is set; the original stays available as
+`for_user.__wrapped__`.
+"""
+
+import logging
+import uuid
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.utils.module_loading import import_string
+from topobank.authorization.models import PermissionSet, UserPermission
+from topobank.manager.models import Surface
+
+from . import anonymous
+from .models import SurfaceVisibility
+from .permissions import LEVELS
+
+_log = logging.getLogger(__name__)
+
+#: Cache key of the current generation of the table
+GENERATION_KEY = "visibility:generation"
+
+_installed = False
+
+
+def _user_key(user_id):
+    return f"{GENERATION_KEY}:user:{user_id}"
+
+
+def generation(user=None):
+    """
+    Token that changes whenever the table is rebuilt, or, given `user`, also
+    whenever the rows of `user` or of the anonymous user change.
+
+    Values derived from the visibility of datasets are cached under keys that
+    include the token, and so expire with every change of permissions that
+    concerns them.
+    """
+    keys = [GENERATION_KEY] if user is None else [GENERATION_KEY, _user_key(user.pk)]
+    tokens = cache.get_many(keys)
+    for key in keys:
+        if key not in tokens:
+            token = uuid.uuid4().hex
+            if not cache.add(key, token, None):
+                token = cache.get(key, token)
+            tokens[key] = token
+    return ":".join(tokens[key] for key in keys)
+
+
+def _next_generation(user_ids=None):
+    if user_ids is None:
+        cache.set(GENERATION_KEY, uuid.uuid4().hex, None)
+    else:
+        cache.set_many({_user_key(user_id): uuid.uuid4().hex for user_id in user_ids}, None)
+
+
+def _start_generation(user_ids=None):
+    """Start a new generation, for the given users or for everyone, now and
+    again once the changes are committed.
+
+    Requests running in parallel see the old permissions until the transaction
+    that changes them commits; what they cache in between, under the new
+    token, expires with the one started on commit.
+    """
+    if user_ids is not None:
+        user_ids = list(user_ids)
+        if not user_ids:
+            return
+    _next_generation(user_ids)
+    transaction.on_commit(lambda: _next_generation(user_ids))
+
+
+def rank(level):
+    """Rank of a permission level as stored in `SurfaceVisibility.level`."""
+    return LEVELS.index(level) + 1
+
+
+def _grants_sql():
+    """
+    SQL selecting (parent_id, user_id, level) for every permission granted,
+    organization permissions expanded to the members of the organization.
+    """
+    levels = " ".join(f"WHEN '{level}' THEN {rank(level)}" for level in LEVELS)
+    sql = (
+        f"SELECT parent_id, user_id, CASE allow {levels} END AS level "
+        f"FROM {UserPermission._meta.db_table}"
+    )
+    if hasattr(PermissionSet, "organization_permissions"):
+        OrganizationPermission = PermissionSet.organization_permissions.rel.related_model
+        organization_field = OrganizationPermission._meta.get_field("organization")
+        Organization = organization_field.related_model
+        memberships = get_user_model().groups.through._meta
+        sql += (
+            f" UNION ALL SELECT op.parent_id, m.user_id, CASE op.allow {levels} END "
+            f"FROM {OrganizationPermission._meta.db_table} op "
+            f"JOIN {Organization._meta.db_table} o ON o.id = op.{organization_field.column} "
+            f"JOIN {memberships.db_table} m ON m.group_id = o.{Organization._meta.get_field('group').column}"
+        )
+    return sql
+
+
+def _insert(scope_sql="", params=()):
+    """Insert the rows matching `scope_sql`, a condition on `grants` and `s`
+    (the dataset); returns the number of rows inserted or updated.
+
+    Rows that exist already, e.g. inserted by a refresh of the same users
+    running at the same time, are updated instead."""
+    where = f"WHERE {scope_sql}" if scope_sql else ""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {SurfaceVisibility._meta.db_table} (user_id, surface_id, level) "
+            f"SELECT grants.user_id, s.id, MAX(grants.level) "
+            f"FROM ({_grants_sql()}) grants JOIN {Surface._meta.db_table} s ON s.permissions_id = grants.parent_id "
+            f"{where} GROUP BY grants.user_id, s.id "
+            f"ON CONFLICT (user_id, surface_id) DO UPDATE SET level = EXCLUDED.level",
+            params,
+        )
+        return cursor.rowcount
+
+
+def rebuild():
+    """Rebuild the whole table; returns the number of rows."""
+    with transaction.atomic():
+        SurfaceVisibility.objects.all().delete()
+        nb_rows = _insert()
+    _start_generation()
+    _log.info(f"Rebuilt visibility of datasets: {nb_rows} rows.")
+    return nb_rows
+
+
+def refresh(permission_set_ids=None, user_ids=None):
+    """
+    Refresh the rows of the datasets with the given permission sets, and of
+    the given users.
+
+    Parameters
+    ----------
+    permission_set_ids : list of int, optional
+        Permission sets whose permissions changed.
+    user_ids : list of int, optional
+        Users whose group memberships changed.
+    """
+    affected = set()
+    with transaction.atomic():
+        if permission_set_ids:
+            permission_set_ids = list(permission_set_ids)
+            rows = SurfaceVisibility.objects.filter(surface__permissions_id__in=permission_set_ids)
+            # Users who lose access, and users who gain it
+            affected.update(rows.values_list("user_id", flat=True).distinct())
+            rows.delete()
+            _insert("s.permissions_id = ANY(%s)", [permission_set_ids])
+            affected.update(rows.values_list("user_id", flat=True).distinct())
+        if user_ids:
+            user_ids = list(user_ids)
+            affected.update(user_ids)
+            SurfaceVisibility.objects.filter(user_id__in=user_ids).delete()
+            _insert("grants.user_id = ANY(%s)", [user_ids])
+    # Everybody sees the datasets of the anonymous user
+    _start_generation(None if anonymous.anonymous_user_id() in affected else affected)
+
+
+def for_user(manager, user, permission="view"):
+    """Datasets `user` has at least `permission` for, from the index."""
+    anonymous_user = import_string(settings.TOPOBANK_ANONYMOUS_USER_GETTER)()
+    user_ids = [anonymous_user.pk] if user.pk is None else [user.pk, anonymous_user.pk]
+    visible = SurfaceVisibility.objects.filter(user_id__in=user_ids, level__gte=rank(permission))
+    return manager.get_queryset().filter(pk__in=visible.values("surface_id"))
+
+
+def install():
+    """Look up `Surface.objects.for_user` in the index; idempotent."""
+    global _installed
+    if _installed:
+        return
+    _installed = True
+    manager_class = type(Surface.objects)
+    original = manager_class.for_user
+
+    def indexed_for_user(self, user, permission="view"):
+        if self.model is not Surface:
+            return original(self, user, permission)
+        return for_user(self, user, permission)
+
+    indexed_for_user.__wrapped__ = original
+    indexed_for_user.__doc__ = original.__doc__
+    manager_class.for_user = indexed_for_user
@@ -0,0 +1,129 @@
+"""
+Workflows as shown on the analysis pages.
+
+The workflow registry of topobank is filled when the apps are loaded, and
+does not change until the next deploy. Still, `AnalysisDetailView` looked the
+workflow up on every request, asked the registry which workflows the user
+may run -- which depends on the plugins the organizations of the user's
+groups make available, i.e. a query and a walk over every registered
+workflow -- and serialized the workflow anew. This module keeps, per process:
+
+* the names of all registered workflows, and a `registry_version` derived
+  from them,
+* the names of the workflows visible to a set of groups, keyed by registry
+  version, `organizations_version` and the ids of the groups, and
+* the serialized details of every workflow, keyed by registry version.
+
+The groups of a user are cached in the shared cache, under the organizations
+version. Changes of organizations, groups and memberships start a new
+organizations version, or drop the groups of the users concerned (see
+`ce_ui.signals`); call `forget` after registering workflows at runtime.
+"""
+
+import functools
+import hashlib
+import uuid
+
+from django.core.cache import cache
+from topobank.analysis.registry import get_workflow_names
+
+#: Cache key of the version of organizations and groups
+ORGANIZATIONS_VERSION_KEY = "workflows:organizations"
+
+#: Seconds the groups of a user are cached
+TIMEOUT = 3600
+
+#: Group sets whose visible workflows are kept per process, at most
+MAX_GROUP_SETS = 1024
+
+#: Names of the workflows visible to a set of groups, by registry version,
+#: organizations version and group ids
+_visible = {}
+
+#: Serialized workflow details, by registry version, workflow name and origin
+_serialized = {}
+
+
+@functools.cache
+def registered_names():
+    """Names of all registered workflows."""
+    return frozenset(get_workflow_names())
+
+
+@functools.cache
+def registry_version():
+    """Token that identifies the registered workflows."""
+    token = "\n".join(sorted(registered_names()))
+    return hashlib.sha256(token.encode()).hexdigest()[:16]
+
+
+def organizations_version():
+    """Token that changes whenever organizations or groups change."""
+    token = cache.get(ORGANIZATIONS_VERSION_KEY)
+    if token is None:
+        token = uuid.uuid4().hex
+        if not cache.add(ORGANIZATIONS_VERSION_KEY, token, None):
+            token = cache.get(ORGANIZATIONS_VERSION_KEY, token)
+    return token
+
+
+def _groups_key(version, user_id):
+    return f"workflows:{version}:groups:{user_id}"
+
+
+def group_ids(user, version=None):
+    """Ids of the groups of `user`, from the cache."""
+    if user.pk is None:
+        return frozenset()
+    if version is None:
+        version = organizations_version()
+    key = _groups_key(version, user.pk)
+    ids = cache.get(key)
+    if ids is None:
+        ids = frozenset(user.groups.values_list("pk", flat=True))
+        cache.set(key, ids, TIMEOUT)
+    return ids
+
+
+def visible_names(user):
+    """Names of the workflows `user` may run."""
+    version = organizations_version()
+    key = (registry_version(), version, group_ids(user, version))
+    names = _visible.get(key)
+    if names is None:
+        names = frozenset(get_workflow_names(user))
+        if len(_visible) >= MAX_GROUP_SETS:
+            _visible.clear()
+        _visible[key] = names
+    return names
+
+
+def serialized(name, request, serialize):
+    """
+    Details of the workflow `name`, as serialized by `serialize` once per
+    process. The details may contain absolute URLs, so they are kept per
+    origin of `request`.
+    """
+    key = (registry_version(), name, request.build_absolute_uri("/"))
+    data = _serialized.get(key)
+    if data is None:
+        data = _serialized[key] = serialize()
+    return data
+
+
+def forget_user(user_id):
+    """Drop the cached groups of a user."""
+    cache.delete(_groups_key(organizations_version(), user_id))
+
+
+def forget_organizations():
+    """Start a new organizations version, in all processes."""
+    cache.set(ORGANIZATIONS_VERSION_KEY, uuid.uuid4().hex, None)
+
+
+def forget():
+    """Drop everything cached by this process, e.g. after registering workflows."""
+    registered_names.cache_clear()
+    registry_version.cache_clear()
+    _visible.clear()
+    _serialized.clear()
@@ -1,3 +1,5 @@
+import pytest
+
 pytest_plugins = ["topobank.testing.fixtures"]
 
 # Register topobank's test workflow implementations so the analysis tests can
@@ -16,3 +18,14 @@ for _implementation in (
     TopographyOnlyTestImplementation,
 ):
     register_implementation(_implementation)
+
+
+@pytest.fixture(autouse=True)
+def fresh_anonymous_user():
+    """The anonymous user is cached per process, but the database of each test
+    is rolled back; see `ce_ui.anonymous`."""
+    from ce_ui import anonymous
+
+    anonymous.invalidate()
+    yield
+    anonymous.invalidate()
@@ -9,6 +9,7 @@ import DatasetDetail from '@/pages/DatasetDetail.vue';
 import DatasetList from '@/pages/DatasetList.vue';
 import DatasetPublish from '@/pages/DatasetPublish.vue';
 import Home from '@/pages/Home.vue';
+import StaffLatencyDashboard from '@/pages/StaffLatencyDashboard.vue';
 import StaffTaskDashboard from '@/pages/StaffTaskDashboard.vue';
 import StaffUserDashboard from '@/pages/StaffUserDashboard.vue';
 import TopographyDetail from '@/pages/TopographyDetail.vue';
@@ -28,6 +29,7 @@ const pageComponents: { [name: string]: any } = {
     DatasetList: DatasetList,
     DatasetPublish: DatasetPublish,
     Home: Home,
+    StaffLatencyDashboard: StaffLatencyDashboard,
     StaffTaskDashboard: StaffTaskDashboard,
     StaffUserDashboard: StaffUserDashboard,
     TopographyDetail: TopographyDetail,
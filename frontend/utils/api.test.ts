@@ -1,6 +1,14 @@
-import {describe, expect, it} from "vitest";
+import {afterEach, describe, expect, it, vi} from "vitest";
 
-import {getIdFromUrl, subjectsFromBase64, subjectsToBase64} from "@/utils/api";
+const {mockPost} = vi.hoisted(() => ({mockPost: vi.fn()}));
+
+vi.mock("axios", () => ({
+    default: {
+        post: mockPost
+    }
+}));
+
+import {getIdFromUrl, selectionQuery, subjectsFromBase64, subjectsQuery, subjectsToBase64} from "@/utils/api";
 
 describe("subjectsToBase64 / subjectsFromBase64", () => {
     it("round-trips a subjects dictionary", () => {
@@ -13,6 +21,42 @@ describe("subjectsToBase64 / subjectsFromBase64", () => {
     });
 });
 
+describe("subjectsQuery", () => {
+    it("links by the handle of the page's selection", () => {
+        const searchParams = new URLSearchParams("selection=Ab-_9z&subjects=e30=");
+        expect(subjectsQuery({surface: [1]}, searchParams)).toBe("selection=Ab-_9z");
+    });
+
+    it("links by the encoded subjects without a selection", () => {
+        expect(subjectsQuery({surface: [1889]}, new URLSearchParams())).toBe(`subjects=${btoa('{"surface":[1889]}')}`);
+        expect(subjectsQuery({surface: [1889]})).toBe(`subjects=${btoa('{"surface":[1889]}')}`);
+    });
+});
+
+describe("selectionQuery", () => {
+    afterEach(() => {
+        mockPost.mockReset();
+    });
+
+    it("saves each selection once and requests it by its handle", async () => {
+        mockPost.mockResolvedValue({data: {handle: "Ab-_9z"}});
+
+        expect(await selectionQuery({surface: [7]})).toBe("selection=Ab-_9z");
+        expect(await selectionQuery({surface: [7]})).toBe("selection=Ab-_9z");
+        expect(mockPost).toHaveBeenCalledTimes(1);
+        expect(mockPost).toHaveBeenCalledWith("/ui/api/selection/", {subjects: {surface: [7]}});
+    });
+
+    it("falls back to the encoded subjects if the selection cannot be saved", async () => {
+        mockPost.mockRejectedValueOnce(new Error("429"));
+        mockPost.mockResolvedValueOnce({data: {handle: "Cd"}});
+
+        expect(await selectionQuery({surface: [8]})).toBe(`subjects=${btoa('{"surface":[8]}')}`);
+        // Tries again next time
+        expect(await selectionQuery({surface: [8]})).toBe("selection=Cd");
+    });
+});
+
 describe("getIdFromUrl", () => {
     it("extracts the trailing id from an API URL", () => {
         expect(getIdFromUrl("/manager/api/surface/123/")).toBe(123);
@@ -2,6 +2,8 @@
  * Helpers for talking to the topobank REST API.
  */
 
+import axios from "axios";
+
 /** Serialize a subjects dictionary (e.g. {surface: [123]}) for use in a URL. */
 export function subjectsToBase64(subjects: any): string {
     return btoa(JSON.stringify(subjects));
@@ -12,6 +14,62 @@ export function subjectsFromBase64(subjects: string): any {
     return JSON.parse(atob(subjects));
 }
 
+/**
+ * Save a subjects dictionary on the server. Resolves to the short handle of the selection, which the analysis pages
+ * and card APIs take as the `selection` parameter instead of the whole dictionary as `subjects`.
+ */
+export async function saveSelection(subjects: any): Promise<string> {
+    const response = await axios.post("/ui/api/selection/", {subjects: subjects});
+    return response.data.handle;
+}
+
+/** Subjects dictionary of a saved selection, with the subjects the user may view only. */
+export async function loadSelection(handle: string): Promise<any> {
+    const response = await axios.get(`/ui/api/selection/${encodeURIComponent(handle)}/`);
+    return response.data.subjects;
+}
+
+/** Subjects dictionary of a page, from its `selection` or `subjects` parameter (or null if it has neither). */
+export async function subjectsFromSearchParams(searchParams: URLSearchParams): Promise<any> {
+    const handle = searchParams.get("selection");
+    if (handle != null) {
+        return loadSelection(handle);
+    }
+    const subjects = searchParams.get("subjects");
+    return subjects != null ? subjectsFromBase64(subjects) : null;
+}
+
+/** Query parameter selecting `subjects` in links: the selection handle of the page, if it was opened with one. */
+export function subjectsQuery(subjects: any, searchParams?: URLSearchParams): string {
+    const handle = searchParams?.get("selection");
+    if (handle != null) {
+        return `selection=${encodeURIComponent(handle)}`;
+    }
+    return `subjects=${subjectsToBase64(subjects)}`;
+}
+
+const _selectionHandles = new Map<string, Promise<string>>();
+
+/**
+ * Query parameter selecting `subjects` in card API requests: the handle of the selection, saved once per page, which
+ * keeps the URLs short and lets the server reuse its permission checks. Falls back to the encoded subjects if the
+ * selection cannot be saved, e.g. while saving is throttled.
+ */
+export async function selectionQuery(subjects: any): Promise<string> {
+    const key = JSON.stringify(subjects);
+    let handle = _selectionHandles.get(key);
+    if (handle == null) {
+        handle = saveSelection(subjects);
+        _selectionHandles.set(key, handle);
+    }
+    try {
+        return `selection=${encodeURIComponent(await handle)}`;
+    } catch {
+        _selectionHandles.delete(key);
+        return `subjects=${subjectsToBase64(subjects)}`;
+    }
+}
+
 /** Extract the numeric object id from an API URL such as "/manager/api/surface/123/". */
 export function getIdFromUrl(url: string): number {
     const s = url.split('/');